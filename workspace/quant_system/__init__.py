@@ -10,13 +10,20 @@ from .data_fetcher import DataFetcher
 from .time_series import TimeSeriesPredictor
 from .mean_reversion import MeanReversionStrategy
 from .sentiment import SentimentAnalyzer
-from .portfolio import PortfolioOptimizer
+from .portfolio import PortfolioOptimizer, LargeScaleOptimizer
 from .var_model import VaRCalculator
 from .options import OptionsPricer
 from .multi_factor import MultiFactorModel
 from .rl_agent import RLTradingAgent
 from .risk_manager import RiskManager
 from .signal_aggregator import SignalAggregator
+from .backtest import ParameterSweep
+from .indicators import StreamingZScore, StreamingBollinger
+from .monte_carlo import MonteCarloEngine
+from .distributions import DistributionFitter
+from .stress import ScenarioLibrary, StressEngine
+from .covariance import CovarianceEstimator
+from .qp import QPSolver
 
 __version__ = "1.0.0"
 __all__ = [
@@ -30,5 +37,15 @@ __all__ = [
     "MultiFactorModel",
     "RLTradingAgent",
     "RiskManager",
-    "SignalAggregator"
+    "SignalAggregator",
+    "ParameterSweep",
+    "StreamingZScore",
+    "StreamingBollinger",
+    "MonteCarloEngine",
+    "DistributionFitter",
+    "ScenarioLibrary",
+    "StressEngine",
+    "CovarianceEstimator",
+    "LargeScaleOptimizer",
+    "QPSolver"
 ]
@@ -0,0 +1,498 @@
+"""
+回測引擎模組
+支持：向量化參數掃描（時間 × 參數組 信號/收益矩陣）、多核分塊、
+      編譯的帶遲滯持倉狀態機（進場/出場/止損/最大持倉期）、精簡回測結果
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+import logging
+import os
+
+from .drawdown import drawdown_stats
+
+logger = logging.getLogger(__name__)
+
+# 嘗試導入 Numba（編譯持倉狀態機），不可用時退化為純 Python 循環
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+
+# 各策略可掃描的參數及默認值（與策略構造函數一致）
+SWEEP_PARAMETERS = {
+    "zscore": {
+        "lookback_period": 60,
+        "entry_threshold": 2.0,
+        "exit_threshold": 0.5,
+        "holding_period": 20,
+        "stop_loss": np.inf,
+    },
+    "bollinger": {"window": 20, "num_std": 2.0},
+}
+
+
+@njit(cache=True)
+def _position_kernel(z, entry, exit, stop, max_hold):
+    """
+    單次遍歷的持倉狀態機
+
+    z: (T, K) Z-Score 矩陣，每列一個 標的 × 參數組
+    entry / exit / stop / max_hold: 每列參數 (K,)
+    """
+    n_bars, n_cols = z.shape
+    positions = np.zeros((n_bars, n_cols), dtype=np.int8)
+    pos = np.zeros(n_cols, dtype=np.int8)
+    held = np.zeros(n_cols, dtype=np.int64)
+
+    for t in range(n_bars):
+        for j in range(n_cols):
+            zt = z[t, j]
+
+            if zt != zt:
+                # NaN（窗口未滿或停牌）：維持原狀態
+                if pos[j] != 0:
+                    held[j] += 1
+            elif pos[j] == 0:
+                if zt < -entry[j]:
+                    pos[j] = 1    # 價格太低，做多
+                    held[j] = 0
+                elif zt > entry[j]:
+                    pos[j] = -1   # 價格太高，做空
+                    held[j] = 0
+            else:
+                held[j] += 1
+                if pos[j] == 1:
+                    close = zt >= -exit[j] or zt <= -stop[j]
+                else:
+                    close = zt <= exit[j] or zt >= stop[j]
+                if max_hold[j] > 0 and held[j] >= max_hold[j]:
+                    close = True
+                if close:
+                    pos[j] = 0
+
+            positions[t, j] = pos[j]
+
+    return positions
+
+
+def hysteresis_positions(
+    z: np.ndarray,
+    entry_threshold,
+    exit_threshold,
+    stop_loss=None,
+    max_holding=None
+) -> np.ndarray:
+    """
+    Z-Score 策略的帶遲滯持倉
+
+    |z| 超過 entry 進場，持有直到 z 回歸到 exit 內側、觸及 stop_loss（Z 值）
+    或持有滿 max_holding 根 K 線；z 位於 exit 與 entry 之間時保持倉位不變
+
+    Args:
+        z: 一維 (T,) 或二維 (T, K) Z-Score，列可以是多個標的 / 參數組
+        entry_threshold: 進場閾值，標量或每列 (K,)
+        exit_threshold: 出場閾值，標量或每列 (K,)
+        stop_loss: 止損 Z 值，None 表示不止損
+        max_holding: 最大持倉 K 線數，None 或 0 表示不限
+
+    Returns:
+        與 z 同形狀的 int8 持倉（1 做多, -1 做空, 0 空倉）
+    """
+    z = np.asarray(z, dtype=np.float64)
+    squeeze = z.ndim == 1
+    z2d = z.reshape(len(z), -1)
+    n_cols = z2d.shape[1]
+
+    def _per_column(value, default, dtype):
+        value = default if value is None else value
+        return np.ascontiguousarray(np.broadcast_to(np.asarray(value, dtype=dtype), (n_cols,)))
+
+    positions = _position_kernel(
+        np.ascontiguousarray(z2d),
+        _per_column(entry_threshold, None, np.float64),
+        _per_column(exit_threshold, None, np.float64),
+        _per_column(stop_loss, np.inf, np.float64),
+        _per_column(max_holding, 0, np.int64)
+    )
+
+    return positions[:, 0] if squeeze else positions
+
+
+def _rolling_moments(
+    prices: np.ndarray,
+    windows: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    對每個唯一窗口計算一次滾動均值和標準差
+
+    Returns:
+        (mean, std) 形狀均為 (T, len(windows))
+    """
+    series = pd.Series(prices)
+    mean = np.empty((len(prices), len(windows)))
+    std = np.empty((len(prices), len(windows)))
+
+    for k, window in enumerate(windows):
+        rolling = series.rolling(window=int(window))
+        mean[:, k] = rolling.mean().values
+        std[:, k] = rolling.std().values
+
+    return mean, std
+
+
+def _zscore_signals(
+    prices: np.ndarray,
+    mean: np.ndarray,
+    std: np.ndarray,
+    params: np.ndarray
+) -> np.ndarray:
+    """Z-Score 策略信號矩陣（與 MeanReversionStrategy.generate_signals 相同規則）"""
+    z = (prices[:, None] - mean) / std
+    return hysteresis_positions(
+        z, params[:, 1], params[:, 2],
+        stop_loss=params[:, 4], max_holding=params[:, 3].astype(np.int64)
+    )
+
+
+def _bollinger_signals(
+    prices: np.ndarray,
+    mean: np.ndarray,
+    std: np.ndarray,
+    params: np.ndarray
+) -> np.ndarray:
+    """布林帶策略信號矩陣（與 BollingerBandsStrategy.generate_signals 相同規則）"""
+    z = (prices[:, None] - mean) / std
+    return hysteresis_positions(z, params[:, 1], 0.0)
+
+
+def _strategy_returns(signals: np.ndarray, returns: np.ndarray) -> np.ndarray:
+    """前一根信號 × 當根收益，首行為 NaN"""
+    strategy_returns = np.empty(signals.shape)
+    strategy_returns[0] = np.nan
+    strategy_returns[1:] = signals[:-1] * returns[1:, None]
+    return strategy_returns
+
+
+def _performance_metrics(
+    signals: np.ndarray,
+    strategy_returns: np.ndarray,
+    periods_per_year: int
+) -> Dict[str, np.ndarray]:
+    """逐列計算績效指標"""
+    n_periods = len(signals)
+    r = strategy_returns[1:]
+
+    cumulative = np.cumprod(1 + np.nan_to_num(r), axis=0)
+    total_return = cumulative[-1] - 1
+    annual_return = (1 + total_return) ** (periods_per_year / n_periods) - 1
+    volatility = np.nanstd(r, axis=0, ddof=1) * np.sqrt(periods_per_year)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = np.where(volatility > 0, annual_return / volatility, 0.0)
+
+    drawdowns = drawdown_stats(r, scalars_only=True)
+
+    # 首行 diff 為 NaN，與 pandas 一樣計為一次變化
+    trades = 1 + (np.diff(signals, axis=0) != 0).sum(axis=0)
+    win_rate = (r > 0).sum(axis=0) / n_periods
+
+    return {
+        "total_return": total_return,
+        "annual_return": annual_return,
+        "volatility": volatility,
+        "sharpe_ratio": sharpe,
+        "max_drawdown": drawdowns["max_drawdown"],
+        "max_drawdown_duration": drawdowns["max_duration"],
+        "total_trades": trades,
+        "win_rate": win_rate
+    }
+
+
+def _evaluate_chunk(
+    strategy: str,
+    prices: np.ndarray,
+    params: np.ndarray,
+    periods_per_year: int,
+    keep_matrices: bool = False
+):
+    """評估一塊參數組（可在工作進程中運行）"""
+    windows, window_idx = np.unique(params[:, 0].astype(int), return_inverse=True)
+    mean, std = _rolling_moments(prices, windows)
+    mean, std = mean[:, window_idx], std[:, window_idx]
+
+    if strategy == "bollinger":
+        signals = _bollinger_signals(prices, mean, std, params)
+    else:
+        signals = _zscore_signals(prices, mean, std, params)
+
+    returns = np.empty(len(prices))
+    returns[0] = np.nan
+    returns[1:] = prices[1:] / prices[:-1] - 1
+
+    strategy_returns = _strategy_returns(signals, returns)
+    metrics = _performance_metrics(signals, strategy_returns, periods_per_year)
+
+    if keep_matrices:
+        return metrics, signals, strategy_returns
+    return metrics
+
+
+class BacktestResult(Mapping):
+    """
+    精簡回測結果
+
+    以列式數組保存持倉和收益（可選 float32），權益曲線和回撤按需計算；
+    兼容舊的字典用法 result["total_return"]，逐根明細需 detail=True 才保留
+    """
+
+    def __init__(
+        self,
+        index: pd.Index,
+        positions: np.ndarray,
+        strategy_returns: np.ndarray,
+        metrics: Dict,
+        returns: Optional[np.ndarray] = None,
+        frame: Optional[pd.DataFrame] = None,
+        dtype: type = np.float64
+    ):
+        """
+        Args:
+            index: 時間索引
+            positions: 每根 K 線的信號（下一根生效）
+            strategy_returns: 策略收益
+            metrics: 標量績效指標
+            returns: 標的收益（可選）
+            frame: 逐根明細 DataFrame（僅 detail=True 時保留）
+            dtype: 收益數組精度，np.float32 可減半內存
+        """
+        self.index = index
+        self.positions = np.asarray(positions, dtype=np.int8)
+        self.strategy_returns = np.asarray(strategy_returns, dtype=dtype)
+        self.returns = None if returns is None else np.asarray(returns, dtype=dtype)
+        self.metrics = metrics
+        self.frame = frame
+        self._equity_curve = None
+        self._drawdown = None
+
+    @property
+    def equity_curve(self) -> np.ndarray:
+        """策略淨值曲線（首次訪問時計算）"""
+        if self._equity_curve is None:
+            self._equity_curve = np.cumprod(1 + np.nan_to_num(self.strategy_returns))
+        return self._equity_curve
+
+    @property
+    def drawdown(self) -> np.ndarray:
+        """回撤序列（首次訪問時計算）"""
+        if self._drawdown is None:
+            self._drawdown = drawdown_stats(self.strategy_returns)["drawdown"]
+        return self._drawdown
+
+    def to_frame(self) -> pd.DataFrame:
+        """逐根明細；未保留明細時由列式數組臨時構造"""
+        if self.frame is not None:
+            return self.frame
+
+        columns = {"signal": self.positions}
+        if self.returns is not None:
+            columns["returns"] = self.returns
+        columns["strategy_returns"] = self.strategy_returns
+        columns["strategy_cumulative"] = self.equity_curve
+        return pd.DataFrame(columns, index=self.index)
+
+    def __getitem__(self, key: str):
+        if key == "signals":
+            if self.frame is None:
+                raise KeyError("signals (run backtest with detail=True, or use to_frame())")
+            return self.frame
+        return self.metrics[key]
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.metrics
+        if self.frame is not None:
+            yield "signals"
+
+    def __len__(self) -> int:
+        return len(self.metrics) + (self.frame is not None)
+
+    def __repr__(self) -> str:
+        summary = ", ".join(
+            f"{k}={v:.4g}" for k, v in self.metrics.items()
+            if isinstance(v, (int, float, np.number))
+        )
+        return f"BacktestResult({len(self.index)} bars, {summary})"
+
+
+def summarize_backtest(
+    index: pd.Index,
+    positions: np.ndarray,
+    returns: np.ndarray,
+    periods_per_year: int = 252,
+    frame: Optional[pd.DataFrame] = None,
+    dtype: type = np.float64
+) -> BacktestResult:
+    """由單一持倉序列和標的收益構造回測結果（指標計算與參數掃描共用）"""
+    positions = np.asarray(positions, dtype=np.int8)
+    returns = np.asarray(returns, dtype=np.float64)
+
+    strategy_returns = _strategy_returns(positions[:, None], returns)
+    metrics = {
+        name: value[0].item()
+        for name, value in _performance_metrics(
+            positions[:, None], strategy_returns, periods_per_year
+        ).items()
+    }
+
+    return BacktestResult(
+        index,
+        positions,
+        strategy_returns[:, 0],
+        metrics,
+        returns=returns,
+        frame=frame,
+        dtype=dtype
+    )
+
+
+class ParameterSweep:
+    """
+    向量化參數掃描回測
+
+    一次計算整個參數網格，每個唯一回顧期只計算一次滾動統計量，
+    輸出緊湊的績效指標表；大網格可分塊並行到多核
+    """
+
+    def __init__(
+        self,
+        strategy: str = "zscore",
+        n_jobs: Optional[int] = 1,
+        chunk_size: int = 1024,
+        periods_per_year: int = 252
+    ):
+        """
+        Args:
+            strategy: "zscore"（MeanReversionStrategy）或 "bollinger"（BollingerBandsStrategy）
+            n_jobs: 並行進程數，None 為 CPU 核數
+            chunk_size: 每塊參數組數量（控制內存占用）
+            periods_per_year: 年化周期數
+        """
+        if strategy not in SWEEP_PARAMETERS:
+            raise ValueError(f"Unknown strategy: {strategy}")
+
+        self.strategy = strategy
+        self.n_jobs = n_jobs
+        self.chunk_size = chunk_size
+        self.periods_per_year = periods_per_year
+
+    def build_grid(self, **param_grid: Sequence[float]) -> pd.DataFrame:
+        """
+        構建參數網格（笛卡爾積），未指定的參數使用策略默認值
+
+        Example:
+            >>> sweep.build_grid(lookback_period=[20, 60], entry_threshold=[1.5, 2.0])
+        """
+        defaults = SWEEP_PARAMETERS[self.strategy]
+        unknown = set(param_grid) - set(defaults)
+        if unknown:
+            raise ValueError(f"Unknown parameters for {self.strategy}: {sorted(unknown)}")
+
+        names = list(defaults)
+        values = [
+            list(np.atleast_1d(param_grid.get(name, defaults[name])))
+            for name in names
+        ]
+
+        return pd.DataFrame(list(product(*values)), columns=names)
+
+    def run(self, prices: pd.Series, **param_grid: Sequence[float]) -> pd.DataFrame:
+        """
+        掃描參數網格
+
+        Args:
+            prices: 價格序列
+            **param_grid: 參數名 -> 候選值列表
+
+        Returns:
+            每個參數組一行的績效指標表
+        """
+        grid = self.build_grid(**param_grid)
+        price_array = prices.values.astype(np.float64)
+        params = grid.values.astype(np.float64)
+
+        chunks = [
+            params[k:k + self.chunk_size]
+            for k in range(0, len(params), self.chunk_size)
+        ]
+        n_jobs = self.n_jobs or os.cpu_count() or 1
+        logger.info(f"Sweeping {len(params)} parameter sets in {len(chunks)} chunks")
+
+        if n_jobs == 1 or len(chunks) <= 1:
+            results = [
+                _evaluate_chunk(self.strategy, price_array, chunk, self.periods_per_year)
+                for chunk in chunks
+            ]
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                futures = [
+                    executor.submit(
+                        _evaluate_chunk, self.strategy, price_array, chunk, self.periods_per_year
+                    )
+                    for chunk in chunks
+                ]
+                results = [future.result() for future in futures]
+
+        for name in results[0]:
+            grid[name] = np.concatenate([r[name] for r in results])
+
+        return grid
+
+    def signal_matrix(
+        self,
+        prices: pd.Series,
+        **param_grid: Sequence[float]
+    ) -> Tuple[pd.DataFrame, np.ndarray, np.ndarray]:
+        """
+        返回完整的 (時間 × 參數組) 信號矩陣和策略收益矩陣
+
+        Returns:
+            (參數網格, signals (T, P) int8, strategy_returns (T, P))
+        """
+        grid = self.build_grid(**param_grid)
+        _, signals, strategy_returns = _evaluate_chunk(
+            self.strategy,
+            prices.values.astype(np.float64),
+            grid.values.astype(np.float64),
+            self.periods_per_year,
+            keep_matrices=True
+        )
+        return grid, signals, strategy_returns
+
+
+# 便捷函數
+def sweep_parameters(
+    prices: pd.Series,
+    strategy: str = "zscore",
+    n_jobs: int = 1,
+    **param_grid: Sequence[float]
+) -> pd.DataFrame:
+    """
+    便捷函數：參數網格掃描
+
+    Example:
+        >>> table = sweep_parameters(prices, lookback_period=range(20, 120, 5),
+        ...                          entry_threshold=[1.5, 2.0, 2.5])
+        >>> table.sort_values("sharpe_ratio", ascending=False).head()
+    """
+    return ParameterSweep(strategy=strategy, n_jobs=n_jobs).run(prices, **param_grid)
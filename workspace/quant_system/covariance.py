@@ -0,0 +1,422 @@
+"""
+協方差估計模組
+支持：樣本協方差、Ledoit-Wolf 收縮、OAS 收縮、EWMA、主成分因子模型；
+      按 (估計方法, 數據指紋, 窗口) 緩存結果，新收益行到達時秩一增量更新
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, Optional, Tuple, Union
+from collections import OrderedDict, deque
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _Moments:
+    """
+    加權一階、二階矩（West 加權 Welford 算法），支持秩一加入 / 移除觀測和整體衰減
+
+    - mean: 加權均值
+    - comoment: Σ w (x - mean)(x - mean)ᵀ
+    - fourth / weighted_sum: Σ‖x‖⁴ 和 Σ‖x‖² x（僅等權時維護，供 Ledoit-Wolf 收縮強度使用）
+    """
+
+    def __init__(self, n_assets: int, track_fourth: bool = True):
+        self.weight = 0.0
+        self.count = 0
+        self.mean = np.zeros(n_assets)
+        self.comoment = np.zeros((n_assets, n_assets))
+        self.track_fourth = track_fourth
+        self.fourth = 0.0
+        self.weighted_sum = np.zeros(n_assets)
+
+    @classmethod
+    def from_values(
+        cls,
+        values: np.ndarray,
+        weights: Optional[np.ndarray] = None
+    ) -> "_Moments":
+        """由整段數據一次性構造（與逐行 add 的結果一致）"""
+        moments = cls(values.shape[1], track_fourth=weights is None)
+        if weights is None:
+            weights = np.ones(len(values))
+
+        moments.weight = weights.sum()
+        moments.count = len(values)
+        if moments.count == 0:
+            return moments
+
+        moments.mean = weights @ values / moments.weight
+        centered = values - moments.mean
+        moments.comoment = (centered * weights[:, None]).T @ centered
+        if moments.track_fourth:
+            squared_norm = np.einsum("ij,ij->i", values, values)
+            moments.fourth = squared_norm @ squared_norm
+            moments.weighted_sum = squared_norm @ values
+        return moments
+
+    def decay(self, factor: float):
+        """所有已有觀測的權重乘以 factor（均值不變）"""
+        self.weight *= factor
+        self.comoment *= factor
+
+    def add(self, x: np.ndarray, weight: float = 1.0):
+        delta = x - self.mean
+        self.weight += weight
+        self.count += 1
+        self.mean = self.mean + delta * (weight / self.weight)
+        # w (x - mean_old)(x - mean_new)ᵀ = w (1 - w / W) δδᵀ，寫成對稱外積
+        self.comoment += (weight * (1 - weight / self.weight)) * np.outer(delta, delta)
+        if self.track_fourth:
+            squared_norm = x @ x
+            self.fourth += squared_norm ** 2
+            self.weighted_sum += squared_norm * x
+
+    def remove(self, x: np.ndarray, weight: float = 1.0):
+        remaining = self.weight - weight
+        self.count -= 1
+        if self.count == 0 or remaining <= 0:
+            self.__init__(len(x), self.track_fourth)
+            return
+
+        mean = self.mean - (x - self.mean) * (weight / remaining)
+        delta = x - mean
+        self.comoment -= (weight * (1 - weight / self.weight)) * np.outer(delta, delta)
+        self.mean = mean
+        self.weight = remaining
+        if self.track_fourth:
+            squared_norm = x @ x
+            self.fourth -= squared_norm ** 2
+            self.weighted_sum -= squared_norm * x
+
+    def centered_fourth(self) -> float:
+        """Σ‖x - mean‖⁴，由原始矩展開得到"""
+        m = self.mean
+        c = m @ m
+        gram = self.comoment + self.count * np.outer(m, m)
+        return (
+            self.fourth
+            - 4 * m @ self.weighted_sum
+            + 4 * m @ gram @ m
+            + 2 * c * np.trace(gram)
+            - 3 * self.count * c ** 2
+        )
+
+
+def _shrink(sample: np.ndarray, shrinkage: float) -> np.ndarray:
+    """向 μI 收縮，μ 為平均方差"""
+    n_assets = len(sample)
+    mu = np.trace(sample) / n_assets
+    shrunk = (1 - shrinkage) * sample
+    shrunk[np.diag_indices(n_assets)] += shrinkage * mu
+    return shrunk
+
+
+def _ledoit_wolf(moments: _Moments) -> Tuple[np.ndarray, float]:
+    """Ledoit-Wolf (2004) 收縮（有偏樣本協方差，與 sklearn 一致）"""
+    n, n_assets = moments.count, len(moments.mean)
+    sample = moments.comoment / n
+    mu = np.trace(sample) / n_assets
+    frobenius = np.sum(sample ** 2)
+
+    delta = (frobenius - 2 * mu * np.trace(sample) + n_assets * mu ** 2) / n_assets
+    beta = (moments.centered_fourth() / n - frobenius) / (n_assets * n)
+    beta = min(max(beta, 0.0), delta)
+    shrinkage = 0.0 if delta == 0 else beta / delta
+    return _shrink(sample, shrinkage), shrinkage
+
+
+def _oas(moments: _Moments) -> Tuple[np.ndarray, float]:
+    """Oracle Approximating Shrinkage（Chen et al., 2010，與 sklearn 一致）"""
+    n, n_assets = moments.count, len(moments.mean)
+    sample = moments.comoment / n
+    alpha = np.mean(sample ** 2)
+    mu_squared = (np.trace(sample) / n_assets) ** 2
+
+    numerator = alpha + mu_squared
+    denominator = (n + 1) * (alpha - mu_squared / n_assets)
+    shrinkage = 1.0 if denominator == 0 else min(numerator / denominator, 1.0)
+    return _shrink(sample, shrinkage), shrinkage
+
+
+def _factor_model(sample: np.ndarray, n_factors: int) -> Dict:
+    """主成分因子模型：Σ ≈ B F Bᵀ + diag(D)"""
+    n_factors = min(n_factors, len(sample))
+    eigvals, eigvecs = np.linalg.eigh(sample)
+    top = np.argsort(eigvals)[::-1][:n_factors]
+    loadings = eigvecs[:, top]
+    factor_cov = np.diag(np.maximum(eigvals[top], 0.0))
+    common = loadings @ factor_cov @ loadings.T
+    idiosyncratic = np.maximum(np.diag(sample) - np.diag(common), 0.0)
+    return {
+        "loadings": loadings,
+        "factor_cov": factor_cov,
+        "idiosyncratic": idiosyncratic,
+        "covariance": common + np.diag(idiosyncratic)
+    }
+
+
+def _factor_model_from_returns(values: np.ndarray, n_factors: int) -> Dict:
+    """對去均值數據做截斷 SVD 得到主成分因子模型（與 _factor_model 作用於樣本協方差的結果一致）"""
+    n = len(values)
+    if n < 2:
+        raise ValueError("At least two observations are required to estimate a covariance")
+
+    centered = values - values.mean(axis=0)
+    _, singular, vt = np.linalg.svd(centered, full_matrices=False)
+    n_factors = min(n_factors, len(singular))
+    loadings = vt[:n_factors].T
+    eigvals = singular[:n_factors] ** 2 / (n - 1)
+    variances = np.einsum("ij,ij->j", centered, centered) / (n - 1)
+    return {
+        "loadings": loadings,
+        "factor_cov": np.diag(eigvals),
+        "idiosyncratic": np.maximum(variances - (loadings ** 2) @ eigvals, 0.0)
+    }
+
+
+class CovarianceEstimator:
+    """
+    協方差估計器（可在優化器、VaR、Monte Carlo 之間共享緩存）
+
+    - estimate: 按 (方法, 數據指紋, 窗口) 緩存，相同數據重複調用直接返回
+    - fit / update: 流式狀態，每根新 bar 秩一更新 O(N²)；給定窗口時同時移除最舊一行
+
+    返回的是單期協方差（不年化）
+
+    Example:
+        >>> estimator = CovarianceEstimator("ledoit_wolf")
+        >>> cov = estimator.estimate(returns, window=252)
+        >>> estimator.fit(returns, window=252)
+        >>> cov = estimator.update(new_bar)
+    """
+
+    METHODS = ("sample", "ledoit_wolf", "oas", "ewma", "factor")
+
+    def __init__(
+        self,
+        method: str = "sample",
+        decay: float = 0.94,
+        n_factors: int = 5,
+        cache_size: int = 256
+    ):
+        """
+        Args:
+            method: 估計方法，見 METHODS
+            decay: EWMA 衰減因子 λ（RiskMetrics 日度為 0.94）
+            n_factors: 因子模型的主成分個數
+            cache_size: 最多緩存的估計結果數（LRU）
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown covariance method: {method}")
+        if not 0 < decay <= 1:
+            raise ValueError("decay must be in (0, 1]")
+
+        self.method = method
+        self.decay = decay
+        self.n_factors = n_factors
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        self.assets = None
+        self.window = None
+        self.moments = None
+        self.buffer = None
+        self.shrinkage = None
+        self.factors = None
+        self._covariance = None
+
+    @staticmethod
+    def fingerprint(values: np.ndarray) -> str:
+        """數據指紋（內容哈希 + 形狀）"""
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        digest = hashlib.blake2b(values.tobytes(), digest_size=16).hexdigest()
+        return f"{values.shape[0]}x{values.shape[1]}:{digest}"
+
+    @staticmethod
+    def _prepare(
+        returns: Union[pd.DataFrame, np.ndarray],
+        window: Optional[int]
+    ) -> Tuple[np.ndarray, Optional[list]]:
+        assets = list(returns.columns) if isinstance(returns, pd.DataFrame) else None
+        values = np.atleast_2d(np.asarray(returns, dtype=np.float64))
+        values = values[~np.isnan(values).any(axis=1)]
+        return (values[-window:] if window else values), assets
+
+    def _wrap(self, covariance: np.ndarray, assets: Optional[list]) -> Union[pd.DataFrame, np.ndarray]:
+        if assets is None:
+            return covariance
+        return pd.DataFrame(covariance, index=assets, columns=assets)
+
+    def _ewma_weights(self, n: int) -> np.ndarray:
+        return self.decay ** np.arange(n - 1, -1, -1, dtype=np.float64)
+
+    def _moments(self, values: np.ndarray) -> _Moments:
+        if self.method == "ewma":
+            return _Moments.from_values(values, self._ewma_weights(len(values)))
+        return _Moments.from_values(values)
+
+    def _finalize(self, moments: _Moments) -> Tuple[np.ndarray, Dict]:
+        """由矩得到協方差及附帶信息（收縮強度 / 因子結構）"""
+        if moments.count < 2:
+            raise ValueError("At least two observations are required to estimate a covariance")
+
+        info = {}
+        if self.method == "sample":
+            covariance = moments.comoment / (moments.count - 1)
+        elif self.method == "ledoit_wolf":
+            covariance, info["shrinkage"] = _ledoit_wolf(moments)
+        elif self.method == "oas":
+            covariance, info["shrinkage"] = _oas(moments)
+        elif self.method == "ewma":
+            covariance = moments.comoment / moments.weight
+        else:
+            info = _factor_model(moments.comoment / (moments.count - 1), self.n_factors)
+            covariance = info.pop("covariance")
+
+        # 秩一更新的舍入誤差可能破壞對稱性
+        covariance = (covariance + covariance.T) / 2
+        return covariance, info
+
+    def _memoize(self, cache_key: Tuple, compute: Callable):
+        entry = self.cache.get(cache_key)
+        if entry is not None:
+            self.cache.move_to_end(cache_key)
+            self.hits += 1
+            return entry
+
+        entry = compute()
+        self.misses += 1
+        self.cache[cache_key] = entry
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return entry
+
+    def _cached(self, returns, window) -> Tuple[np.ndarray, Dict, Optional[list]]:
+        values, assets = self._prepare(returns, window)
+        cache_key = (self.method, self.decay, self.n_factors, self.fingerprint(values))
+
+        def compute():
+            covariance, info = self._finalize(self._moments(values))
+            covariance.flags.writeable = False
+            return covariance, info
+
+        covariance, info = self._memoize(cache_key, compute)
+        return covariance, info, assets
+
+    def estimate(
+        self,
+        returns: Union[pd.DataFrame, np.ndarray],
+        window: Optional[int] = None
+    ) -> Union[pd.DataFrame, np.ndarray]:
+        """
+        估計（或從緩存讀取）協方差
+
+        Args:
+            returns: 收益率（行為時間，列為資產），含 NaN 的行被剔除
+            window: 只使用最後 window 行
+
+        Returns:
+            DataFrame 輸入時返回以資產名索引的 DataFrame，否則返回數組（只讀）
+        """
+        covariance, _, assets = self._cached(returns, window)
+        return self._wrap(covariance, assets)
+
+    def factor_form(
+        self,
+        returns: Union[pd.DataFrame, np.ndarray],
+        window: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        因子形式 (B, F, D)：Σ ≈ B F Bᵀ + diag(D)
+
+        sample / factor 方法直接對去均值數據做截斷 SVD，不構造 N×N 協方差
+        （數千資產、觀測數少於資產數時遠快於特徵分解）；其他方法對本估計器的協方差做主成分分解
+        """
+        values, _ = self._prepare(returns, window)
+        cache_key = ("factor_form", self.method, self.decay, self.n_factors, self.fingerprint(values))
+
+        def compute():
+            if self.method in ("sample", "factor"):
+                return _factor_model_from_returns(values, self.n_factors)
+            covariance, _, _ = self._cached(values, None)
+            return _factor_model(covariance, self.n_factors)
+
+        info = self._memoize(cache_key, compute)
+        return info["loadings"], info["factor_cov"], info["idiosyncratic"]
+
+    def fit(
+        self,
+        returns: Union[pd.DataFrame, np.ndarray],
+        window: Optional[int] = None
+    ) -> "CovarianceEstimator":
+        """初始化流式狀態（之後用 update 逐行更新）"""
+        values, assets = self._prepare(returns, window)
+        self.assets = assets
+        self.window = window
+        self.moments = self._moments(values)
+        self.buffer = deque(values) if window else None
+        self._covariance = None
+        return self
+
+    def update(self, bar: Union[pd.Series, np.ndarray, Dict[str, float]]) -> Union[pd.DataFrame, np.ndarray]:
+        """
+        加入一行新收益（秩一更新），給定窗口時移除最舊一行；含 NaN 的行被忽略
+
+        Returns:
+            更新後的協方差
+        """
+        if self.moments is None:
+            raise ValueError("Estimator must be fitted before update")
+
+        if isinstance(bar, (pd.Series, dict)) and self.assets is not None:
+            bar = pd.Series(bar, dtype=np.float64).reindex(self.assets).to_numpy()
+        x = np.asarray(bar, dtype=np.float64).ravel()
+        if np.isnan(x).any():
+            return self.covariance
+
+        if self.method == "ewma":
+            self.moments.decay(self.decay)
+        self.moments.add(x)
+
+        if self.window:
+            self.buffer.append(x)
+            if len(self.buffer) > self.window:
+                oldest = self.buffer.popleft()
+                weight = self.decay ** self.window if self.method == "ewma" else 1.0
+                self.moments.remove(oldest, weight)
+
+        self._covariance = None
+        return self.covariance
+
+    @property
+    def covariance(self) -> Union[pd.DataFrame, np.ndarray]:
+        """流式狀態下的當前協方差（按需計算）"""
+        if self.moments is None:
+            raise ValueError("Estimator must be fitted first")
+        if self._covariance is None:
+            covariance, info = self._finalize(self.moments)
+            self.shrinkage = info.get("shrinkage")
+            self.factors = info or None
+            self._covariance = covariance
+        return self._wrap(self._covariance, self.assets)
+
+
+# 便捷函數
+def estimate_covariance(
+    returns: Union[pd.DataFrame, np.ndarray],
+    method: str = "ledoit_wolf",
+    window: Optional[int] = None,
+    **kwargs
+) -> Union[pd.DataFrame, np.ndarray]:
+    """
+    便捷函數：估計協方差
+
+    Example:
+        >>> cov = estimate_covariance(returns, "oas", window=252) * 252
+    """
+    return CovarianceEstimator(method, **kwargs).estimate(returns, window)
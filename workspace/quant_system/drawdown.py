@@ -0,0 +1,208 @@
+"""
+回撤分析模組
+支持：最大回撤、回撤持續期、水下時間比例、當前回撤、滾動最大回撤；
+      多列一次遍歷（Numba 編譯，不可用時退化為 NumPy 向量化），可只返回標量
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, Union
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 嘗試導入 Numba（單次遍歷回撤核心），不可用時使用 NumPy / pandas 向量化實現
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+
+SCALAR_FIELDS = (
+    "max_drawdown",
+    "max_duration",
+    "time_under_water",
+    "current_drawdown",
+    "current_duration",
+)
+
+
+@njit(cache=True)
+def _drawdown_kernel(returns, window, keep_series):
+    """
+    逐列單次遍歷：淨值、高水位、回撤、持續期；window > 0 時同時維護
+    滾動窗口高水位（單調隊列）和回撤的滾動最小值（單調隊列）
+
+    淨值從第一期 1 + r_0 開始，高水位以第一期淨值初始化；NaN 收益視為 0
+    """
+    n_obs, n_cols = returns.shape
+    scalars = np.zeros((5, n_cols))
+    n_series = n_obs if keep_series else 0
+    drawdown = np.zeros((n_series, n_cols))
+    duration = np.zeros((n_series, n_cols))
+    rolling = np.full((n_obs if window > 0 else 0, n_cols), np.nan)
+
+    equity_buf = np.empty(n_obs)
+    dd_buf = np.empty(n_obs)
+    max_queue = np.empty(n_obs, dtype=np.int64)
+    min_queue = np.empty(n_obs, dtype=np.int64)
+
+    for j in range(n_cols):
+        equity = 1.0
+        peak = -np.inf
+        max_dd = 0.0
+        run = 0
+        max_run = 0
+        underwater = 0
+        max_head = 0
+        max_tail = 0
+        min_head = 0
+        min_tail = 0
+
+        for t in range(n_obs):
+            r = returns[t, j]
+            if r == r:
+                equity *= 1.0 + r
+
+            if equity >= peak:
+                peak = equity
+                run = 0
+            else:
+                run += 1
+                underwater += 1
+
+            dd = equity / peak - 1.0
+            if dd < max_dd:
+                max_dd = dd
+            if run > max_run:
+                max_run = run
+
+            if keep_series:
+                drawdown[t, j] = dd
+                duration[t, j] = run
+
+            if window > 0:
+                # 窗口內高水位：單調遞減隊列
+                equity_buf[t] = equity
+                while max_tail > max_head and equity_buf[max_queue[max_tail - 1]] <= equity:
+                    max_tail -= 1
+                max_queue[max_tail] = t
+                max_tail += 1
+                if max_queue[max_head] <= t - window:
+                    max_head += 1
+
+                # 相對窗口高水位的回撤，再取窗口內最小值：單調遞增隊列
+                dd_buf[t] = equity / equity_buf[max_queue[max_head]] - 1.0
+                while min_tail > min_head and dd_buf[min_queue[min_tail - 1]] >= dd_buf[t]:
+                    min_tail -= 1
+                min_queue[min_tail] = t
+                min_tail += 1
+                if min_queue[min_head] <= t - window:
+                    min_head += 1
+
+                if t >= window - 1:
+                    rolling[t, j] = dd_buf[min_queue[min_head]]
+
+        scalars[0, j] = max_dd
+        scalars[1, j] = max_run
+        scalars[2, j] = underwater / n_obs if n_obs > 0 else 0.0
+        scalars[3, j] = equity / peak - 1.0 if n_obs > 0 else 0.0
+        scalars[4, j] = run
+
+    return scalars, drawdown, duration, rolling
+
+
+def _drawdown_numpy(returns, window, keep_series):
+    """_drawdown_kernel 的 NumPy / pandas 向量化版本（無 Numba 時使用）"""
+    n_obs, n_cols = returns.shape
+    equity = np.cumprod(1 + np.nan_to_num(returns), axis=0)
+    peak = np.maximum.accumulate(equity, axis=0)
+    drawdown = equity / peak - 1.0
+
+    # 持續期 = 距最近一次創新高的期數
+    steps = np.arange(n_obs)[:, None]
+    last_peak = np.maximum.accumulate(np.where(drawdown >= 0, steps, 0), axis=0)
+    duration = (steps - last_peak).astype(np.float64)
+
+    scalars = np.zeros((5, n_cols))
+    if n_obs > 0:
+        scalars[0] = np.minimum(drawdown.min(axis=0), 0.0)
+        scalars[1] = duration.max(axis=0)
+        scalars[2] = (duration > 0).mean(axis=0)
+        scalars[3] = drawdown[-1]
+        scalars[4] = duration[-1]
+
+    rolling = np.full((n_obs if window > 0 else 0, n_cols), np.nan)
+    if window > 0:
+        frame = pd.DataFrame(equity)
+        rolling_dd = frame / frame.rolling(window, min_periods=1).max() - 1.0
+        rolling = rolling_dd.rolling(window).min().to_numpy()
+
+    if not keep_series:
+        drawdown = duration = np.zeros((0, n_cols))
+    return scalars, drawdown, duration, rolling
+
+
+def drawdown_stats(
+    returns: Union[pd.Series, pd.DataFrame, np.ndarray],
+    window: Optional[int] = None,
+    scalars_only: bool = False
+) -> Dict:
+    """
+    回撤分析（多列一次遍歷）
+
+    Args:
+        returns: 收益率（Series、DataFrame 或 一維 / 二維數組，列為不同組合）
+        window: 滾動最大回撤窗口，None 為不計算
+        scalars_only: 只返回標量指標，不構造逐期序列
+
+    Returns:
+        標量：max_drawdown（負數）, max_duration（期數）, time_under_water（比例）,
+              current_drawdown, current_duration
+        序列（scalars_only=False）：drawdown, duration，以及 rolling_max_drawdown（給定 window 時）
+        輸入為 Series / 一維時標量為 float，DataFrame 時為按列名索引的 Series
+    """
+    values = np.asarray(returns, dtype=np.float64)
+    one_dim = values.ndim == 1
+    if one_dim:
+        values = values[:, None]
+
+    if HAS_NUMBA:
+        # 核心按列遍歷，列優先存儲使訪問連續
+        scalars, drawdown, duration, rolling = _drawdown_kernel(
+            np.asfortranarray(values), window or 0, not scalars_only
+        )
+    else:
+        scalars, drawdown, duration, rolling = _drawdown_numpy(values, window or 0, not scalars_only)
+
+    index = returns.index if isinstance(returns, (pd.Series, pd.DataFrame)) else None
+    columns = returns.columns if isinstance(returns, pd.DataFrame) else None
+
+    def wrap_scalar(x):
+        if one_dim:
+            return x[0].item()
+        return pd.Series(x, index=columns) if columns is not None else x
+
+    def wrap_series(x):
+        if one_dim:
+            return pd.Series(x[:, 0], index=index) if index is not None else x[:, 0]
+        return pd.DataFrame(x, index=index, columns=columns) if columns is not None else x
+
+    result = {name: wrap_scalar(scalars[i]) for i, name in enumerate(SCALAR_FIELDS)}
+    if not scalars_only:
+        result["drawdown"] = wrap_series(drawdown)
+        result["duration"] = wrap_series(duration)
+        if window:
+            result["rolling_max_drawdown"] = wrap_series(rolling)
+    return result
+
+
+def max_drawdown(returns: Union[pd.Series, pd.DataFrame, np.ndarray]):
+    """最大回撤（負數）；多列輸入返回每列一個值"""
+    return drawdown_stats(returns, scalars_only=True)["max_drawdown"]
@@ -0,0 +1,206 @@
+"""
+流式技術指標模組
+支持：滾動均值/方差、Z-Score、Bollinger Bands 的 O(1) 逐根更新，按標的保存狀態
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RollingStats:
+    """
+    滾動均值與方差（環形緩衝區 + 窗口化 Welford）
+
+    每根新 K 線 O(1) 更新；窗口未滿或窗口內有 NaN 時輸出 NaN，
+    與 pandas rolling(window).mean() / .std() 一致
+    """
+
+    def __init__(self, window: int):
+        """
+        Args:
+            window: 滾動窗口長度
+        """
+        if window < 2:
+            raise ValueError("window must be at least 2")
+
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        """清空狀態"""
+        self.buffer = np.full(self.window, np.nan)
+        self.head = 0
+        self.n_seen = 0
+        self.n_valid = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def _add(self, x: float):
+        self.n_valid += 1
+        delta = x - self._mean
+        self._mean += delta / self.n_valid
+        self._m2 += delta * (x - self._mean)
+
+    def _remove(self, x: float):
+        self.n_valid -= 1
+        if self.n_valid == 0:
+            self._mean = 0.0
+            self._m2 = 0.0
+            return
+        delta = x - self._mean
+        self._mean -= delta / self.n_valid
+        self._m2 -= delta * (x - self._mean)
+
+    def update(self, x: float) -> "RollingStats":
+        """加入一個新觀測，移除窗口外最舊的觀測"""
+        old = self.buffer[self.head]
+        if self.n_seen >= self.window and old == old:
+            self._remove(old)
+
+        self.buffer[self.head] = x
+        self.head = (self.head + 1) % self.window
+        self.n_seen += 1
+
+        if x == x:
+            self._add(x)
+
+        return self
+
+    @property
+    def ready(self) -> bool:
+        """窗口已滿且無缺失值"""
+        return self.n_valid == self.window
+
+    @property
+    def mean(self) -> float:
+        return self._mean if self.ready else np.nan
+
+    @property
+    def variance(self) -> float:
+        if not self.ready:
+            return np.nan
+        return max(self._m2, 0.0) / (self.window - 1)
+
+    @property
+    def std(self) -> float:
+        return np.sqrt(self.variance)
+
+    def warm_up(self, values: pd.Series) -> "RollingStats":
+        """用歷史最後 window 個值初始化狀態（O(window)，無需重放全部歷史）"""
+        self.reset()
+        for x in np.asarray(values, dtype=np.float64)[-self.window:]:
+            self.update(x)
+        return self
+
+
+class StreamingZScore:
+    """流式 Z-Score：(x - 滾動均值) / 滾動標準差，當根價格計入窗口"""
+
+    def __init__(self, window: int):
+        self.stats = RollingStats(window)
+        self.value = np.nan
+
+    def update(self, x: float) -> float:
+        stats = self.stats.update(x)
+        std = stats.std
+        self.value = (x - stats.mean) / std if std > 0 else np.nan
+        return self.value
+
+    def warm_up(self, values: pd.Series) -> "StreamingZScore":
+        values = np.asarray(values, dtype=np.float64)
+        self.stats.warm_up(values[:-1])
+        if len(values):
+            self.update(values[-1])
+        return self
+
+    def run(self, values: pd.Series) -> pd.Series:
+        """逐根重放整段序列（結果與 pandas 批量計算一致）"""
+        self.stats.reset()
+        out = [self.update(x) for x in np.asarray(values, dtype=np.float64)]
+        index = values.index if isinstance(values, pd.Series) else None
+        return pd.Series(out, index=index)
+
+
+class StreamingBollinger:
+    """流式布林帶：中軌、上軌、下軌及 Z-Score"""
+
+    def __init__(self, window: int = 20, num_std: float = 2.0):
+        self.stats = RollingStats(window)
+        self.num_std = num_std
+        self.value = self._empty()
+
+    @staticmethod
+    def _empty() -> Dict[str, float]:
+        return {"ma": np.nan, "upper": np.nan, "lower": np.nan, "z_score": np.nan}
+
+    def update(self, x: float) -> Dict[str, float]:
+        stats = self.stats.update(x)
+        ma, std = stats.mean, stats.std
+
+        self.value = {
+            "ma": ma,
+            "upper": ma + self.num_std * std,
+            "lower": ma - self.num_std * std,
+            "z_score": (x - ma) / std if std > 0 else np.nan
+        }
+        return self.value
+
+    def warm_up(self, values: pd.Series) -> "StreamingBollinger":
+        values = np.asarray(values, dtype=np.float64)
+        self.stats.warm_up(values[:-1])
+        if len(values):
+            self.update(values[-1])
+        return self
+
+    def run(self, values: pd.Series) -> pd.DataFrame:
+        """逐根重放整段序列（結果與 pandas 批量計算一致）"""
+        self.stats.reset()
+        out = [self.update(x) for x in np.asarray(values, dtype=np.float64)]
+        index = values.index if isinstance(values, pd.Series) else None
+        return pd.DataFrame(out, index=index)
+
+
+class IndicatorBank:
+    """
+    按標的保存流式指標狀態
+
+    Example:
+        >>> bank = IndicatorBank(lambda: StreamingZScore(60))
+        >>> bank.update("AAPL", 189.3)
+    """
+
+    def __init__(self, factory: Callable[[], object]):
+        """
+        Args:
+            factory: 為新標的創建指標實例的工廠函數
+        """
+        self.factory = factory
+        self.indicators: Dict[str, object] = {}
+
+    def get(self, symbol: str):
+        if symbol not in self.indicators:
+            self.indicators[symbol] = self.factory()
+        return self.indicators[symbol]
+
+    def update(self, symbol: str, x: float):
+        """更新單個標的，返回該指標的最新值"""
+        return self.get(symbol).update(x)
+
+    def update_many(self, bar: Dict[str, float]) -> Dict[str, object]:
+        """同一時刻多個標的的新 K 線"""
+        return {symbol: self.update(symbol, x) for symbol, x in bar.items()}
+
+    def warm_up(self, prices: pd.DataFrame) -> "IndicatorBank":
+        """用寬表歷史價格初始化每個標的"""
+        for symbol in prices.columns:
+            self.get(symbol).warm_up(prices[symbol])
+        return self
+
+    def latest(self, symbol: Optional[str] = None):
+        if symbol is not None:
+            return self.indicators[symbol].value
+        return {s: ind.value for s, ind in self.indicators.items()}
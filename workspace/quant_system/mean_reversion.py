@@ -7,7 +7,12 @@ import numpy as np
 import pandas as pd
 from typing import Tuple, Dict, List, Optional
 from scipy import stats
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
 import logging
+import os
+
+from .backtest import BacktestResult, hysteresis_positions, summarize_backtest
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +23,13 @@ except ImportError:
     HAS_SKLEARN = False
 
 
+def _series_fingerprint(prices: pd.Series) -> str:
+    """序列指紋（索引與值的內容哈希 + 長度），原地修改或追加新 bar 後即改變"""
+    row_hashes = pd.util.hash_pandas_object(prices, index=True).to_numpy()
+    digest = hashlib.blake2b(row_hashes.tobytes(), digest_size=16).hexdigest()
+    return f"{len(prices)}:{digest}"
+
+
 class MeanReversionStrategy:
     """
     均值回歸交易策略
@@ -30,7 +42,8 @@ class MeanReversionStrategy:
         lookback_period: int = 60,
         entry_threshold: float = 2.0,
         exit_threshold: float = 0.5,
-        holding_period: int = 20
+        holding_period: int = 20,
+        stop_loss: Optional[float] = None
     ):
         """
         Args:
@@ -38,25 +51,29 @@ class MeanReversionStrategy:
             entry_threshold: 進場閾值（標準差倍數）
             exit_threshold: 出場閾值
             holding_period: 最大持倉天數
+            stop_loss: 止損閾值（Z-Score 絕對值），None 表示不止損
         """
         self.lookback_period = lookback_period
         self.entry_threshold = entry_threshold
         self.exit_threshold = exit_threshold
         self.holding_period = holding_period
+        self.stop_loss = stop_loss
         
         self.mean = None
         self.std = None
         self.signals = None
+        self._fitted_key = None
     
     def fit(self, prices: pd.Series):
         """根據歷史數據擬合模型參數"""
         self.mean = prices.rolling(window=self.lookback_period).mean()
         self.std = prices.rolling(window=self.lookback_period).std()
+        self._fitted_key = _series_fingerprint(prices)
         logger.info(f"Fitted Mean Reversion model: lookback={self.lookback_period}")
     
     def calculate_z_score(self, prices: pd.Series) -> pd.Series:
-        """計算 Z-Score"""
-        if self.mean is None:
+        """計算 Z-Score（價格序列內容變化時重新擬合，包括原地追加或修改）"""
+        if self.mean is None or self._fitted_key != _series_fingerprint(prices):
             self.fit(prices)
         
         z_score = (prices - self.mean) / self.std
@@ -79,65 +96,176 @@ class MeanReversionStrategy:
         signals["upper_band"] = self.mean + self.entry_threshold * self.std
         signals["lower_band"] = self.mean - self.entry_threshold * self.std
         
-        # 初始信號
-        signals["signal"] = 0
-        
-        # 進場邏輯
-        signals.loc[z_scores < -self.entry_threshold, "signal"] = 1   # 價格太低，做多
-        signals.loc[z_scores > self.entry_threshold, "signal"] = -1  # 價格太高，做空
-        
-        # 出場邏輯
-        signals.loc[abs(z_scores) < self.exit_threshold, "signal"] = 0
+        # 進場後持有直到回歸出場閾值、觸及止損或達到最大持倉天數
+        signals["signal"] = self._positions(z_scores.values)
         
         self.signals = signals
         return signals
     
+    def _positions(self, z_scores: np.ndarray) -> np.ndarray:
+        return hysteresis_positions(
+            z_scores,
+            self.entry_threshold,
+            self.exit_threshold,
+            stop_loss=self.stop_loss,
+            max_holding=self.holding_period
+        )
+    
     def backtest(
         self, 
         prices: pd.Series, 
-        initial_capital: float = 100000
-    ) -> Dict:
+        initial_capital: float = 100000,
+        detail: bool = False,
+        dtype: type = np.float64
+    ) -> BacktestResult:
         """
         回測策略
         
+        Args:
+            detail: 是否保留逐根明細 DataFrame（result["signals"]）
+            dtype: 收益數組精度，大批量回測可用 np.float32
+        
         Returns:
-            回測結果字典
+            BacktestResult（可按字典讀取績效指標）
         """
-        signals = self.generate_signals(prices)
-        signals["returns"] = prices.pct_change()
-        signals["strategy_returns"] = signals["signal"].shift(1) * signals["returns"]
+        returns = prices.pct_change().values
+        frame = None
         
-        # 計算累積收益
-        signals["cumulative_returns"] = (1 + signals["returns"]).cumprod()
-        signals["strategy_cumulative"] = (1 + signals["strategy_returns"]).cumprod()
+        if detail:
+            frame = self.generate_signals(prices)
+            positions = frame["signal"].values
+        else:
+            positions = self._positions(self.calculate_z_score(prices).values)
         
-        # 計算持倉
-        signals["position"] = signals["signal"].shift(1).fillna(0)
+        result = summarize_backtest(prices.index, positions, returns, frame=frame, dtype=dtype)
         
-        # 績效指標
-        total_return = signals["strategy_cumulative"].iloc[-1] - 1
-        annual_return = (1 + total_return) ** (252 / len(prices)) - 1
-        volatility = signals["strategy_returns"].std() * np.sqrt(252)
-        sharpe = annual_return / volatility if volatility > 0 else 0
-        
-        # 最大回撤
-        rolling_max = signals["strategy_cumulative"].cummax()
-        drawdown = (signals["strategy_cumulative"] - rolling_max) / rolling_max
-        max_drawdown = drawdown.min()
-        
-        # 交易次數
-        trades = (signals["signal"].diff() != 0).sum()
+        if detail:
+            frame["returns"] = returns
+            frame["strategy_returns"] = result.strategy_returns
+            frame["cumulative_returns"] = (1 + frame["returns"]).cumprod()
+            frame["strategy_cumulative"] = (1 + frame["strategy_returns"]).cumprod()
+            frame["position"] = frame["signal"].shift(1).fillna(0)
         
+        return result
+
+
+class KalmanHedgeRatio:
+    """
+    卡爾曼濾波動態對沖比率
+
+    觀測方程: y_t = beta_t * x_t + alpha_t + e_t
+    狀態方程: (beta, alpha) 隨機遊走
+    每個新觀測 O(1) 更新，狀態在調用之間保留，適用於實時行情
+    """
+
+    def __init__(
+        self,
+        delta: float = 1e-4,
+        observation_var: float = 1e-3,
+        entry_threshold: float = 2.0,
+        exit_threshold: float = 0.0,
+        initial_cov: float = 1.0
+    ):
+        """
+        Args:
+            delta: 狀態轉移噪聲參數（越大對沖比率變化越快）
+            observation_var: 觀測噪聲方差
+            entry_threshold: 進場 Z-Score 閾值
+            exit_threshold: 出場 Z-Score 閾值
+            initial_cov: 初始狀態協方差（對角）
+        """
+        self.delta = delta
+        self.observation_var = observation_var
+        self.entry_threshold = entry_threshold
+        self.exit_threshold = exit_threshold
+        self.initial_cov = initial_cov
+        self.reset()
+
+    def reset(self):
+        """重置濾波狀態"""
+        self.beta = 0.0
+        self.alpha = 0.0
+        # 狀態協方差 [[p00, p01], [p01, p11]]
+        self.p00 = self.initial_cov
+        self.p01 = 0.0
+        self.p11 = self.initial_cov
+        self.spread = np.nan
+        self.spread_std = np.nan
+        self.z_score = np.nan
+        self.position = 0
+        self.n_observations = 0
+
+    def update(self, y: float, x: float) -> Dict:
+        """
+        輸入一根新 K 線（y = 資產1 價格, x = 資產2 價格），更新狀態
+
+        Returns:
+            當前對沖比率、價差、Z-Score 和信號
+        """
+        # 預測：狀態協方差加上轉移噪聲
+        w = self.delta / (1 - self.delta)
+        r00 = self.p00 + w
+        r01 = self.p01
+        r11 = self.p11 + w
+
+        # 預測誤差（即價差）及其方差
+        spread = y - (self.beta * x + self.alpha)
+        rf0 = r00 * x + r01
+        rf1 = r01 * x + r11
+        q = x * rf0 + rf1 + self.observation_var
+
+        # 更新
+        k0 = rf0 / q
+        k1 = rf1 / q
+        self.beta += k0 * spread
+        self.alpha += k1 * spread
+        self.p00 = r00 - k0 * rf0
+        self.p01 = r01 - k0 * rf1
+        self.p11 = r11 - k1 * rf1
+
+        self.spread = spread
+        self.spread_std = np.sqrt(q)
+        self.z_score = spread / self.spread_std
+        self.n_observations += 1
+
+        # 信號：進場後持有直到回歸出場閾值
+        z = self.z_score
+        if self.position == 0:
+            if z > self.entry_threshold:
+                self.position = -1  # 價差太高，做空
+            elif z < -self.entry_threshold:
+                self.position = 1   # 價差太低，做多
+        elif self.position == 1 and z >= -self.exit_threshold:
+            self.position = 0
+        elif self.position == -1 and z <= self.exit_threshold:
+            self.position = 0
+
         return {
-            "total_return": total_return,
-            "annual_return": annual_return,
-            "volatility": volatility,
-            "sharpe_ratio": sharpe,
-            "max_drawdown": max_drawdown,
-            "total_trades": trades,
-            "win_rate": (signals["strategy_returns"] > 0).mean(),
-            "signals": signals
+            "hedge_ratio": self.beta,
+            "intercept": self.alpha,
+            "spread": self.spread,
+            "spread_std": self.spread_std,
+            "z_score": self.z_score,
+            "signal": self.position
+        }
+
+    def filter_arrays(self, price1: np.ndarray, price2: np.ndarray) -> Dict[str, np.ndarray]:
+        """對整段歷史逐根更新，結果寫入預分配數組（不構造逐根記錄）"""
+        n = len(price1)
+        out = {
+            name: np.empty(n)
+            for name in ("hedge_ratio", "intercept", "spread", "spread_std", "z_score")
         }
+        out["signal"] = np.empty(n, dtype=np.int64)
+        for i, (y, x) in enumerate(zip(price1, price2)):
+            state = self.update(y, x)
+            for name, values in out.items():
+                values[i] = state[name]
+        return out
+
+    def filter(self, price1: pd.Series, price2: pd.Series) -> pd.DataFrame:
+        """對整段歷史逐根更新（結果與實時逐根調用 update 一致）"""
+        return pd.DataFrame(self.filter_arrays(price1.values, price2.values), index=price1.index)
 
 
 class PairsTradingStrategy:
@@ -150,12 +278,34 @@ class PairsTradingStrategy:
         self,
         hedge_ratio_lookback: int = 60,
         entry_threshold: float = 2.0,
-        exit_threshold: float = 0.0
+        exit_threshold: float = 0.0,
+        hedge_method: str = "rolling",
+        kalman_delta: float = 1e-4,
+        kalman_observation_var: float = 1e-3
     ):
+        """
+        Args:
+            hedge_ratio_lookback: 滾動回歸窗口
+            entry_threshold: 進場閾值
+            exit_threshold: 出場閾值
+            hedge_method: "rolling"（滾動 Ridge 回歸）或 "kalman"（卡爾曼濾波）
+            kalman_delta: 卡爾曼狀態轉移噪聲參數
+            kalman_observation_var: 卡爾曼觀測噪聲方差
+        """
         self.hedge_ratio_lookback = hedge_ratio_lookback
         self.entry_threshold = entry_threshold
         self.exit_threshold = exit_threshold
+        self.hedge_method = hedge_method
         self.hedge_ratio = None
+        self.kalman = None
+        
+        if hedge_method == "kalman":
+            self.kalman = KalmanHedgeRatio(
+                delta=kalman_delta,
+                observation_var=kalman_observation_var,
+                entry_threshold=entry_threshold,
+                exit_threshold=exit_threshold
+            )
         
     def find_cointegration(
         self, 
@@ -183,7 +333,11 @@ class PairsTradingStrategy:
         price1: pd.Series, 
         price2: pd.Series
     ) -> pd.Series:
-        """計算對沖比率（滾動）"""
+        """計算對沖比率（滾動或卡爾曼）"""
+        if self.kalman is not None:
+            self.kalman.reset()
+            return self.kalman.filter(price1, price2)["hedge_ratio"]
+        
         if not HAS_SKLEARN:
             # 簡單比率
             return price1 / price2
@@ -201,69 +355,514 @@ class PairsTradingStrategy:
         
         return hedge_ratios.fillna(method="bfill")
     
-    def generate_signals(
-        self, 
-        price1: pd.Series, 
-        price2: pd.Series
-    ) -> pd.DataFrame:
-        """生成配對交易信號"""
-        # 計算對沖比率
+    def _signal_arrays(self, price1: pd.Series, price2: pd.Series) -> Dict[str, np.ndarray]:
+        """對沖比率、價差、Z-Score 和信號數組（卡爾曼模式下濾波器狀態保留供 update 繼續使用）"""
+        if self.kalman is not None:
+            self.kalman.reset()
+            filtered = self.kalman.filter_arrays(price1.values, price2.values)
+            self.hedge_ratio = pd.Series(filtered["hedge_ratio"], index=price1.index)
+            return {name: filtered[name] for name in ("hedge_ratio", "spread", "z_score", "signal")}
+        
+        # 計算對沖比率與價差（Spread）
         self.hedge_ratio = self.calculate_hedge_ratio(price1, price2)
-        
-        # 計算價差（Spread）
-        spread = price1 - self.hedge_ratio * price2
+        hedge = self.hedge_ratio.to_numpy(dtype=np.float64)
+        spread = price1.to_numpy(dtype=np.float64) - hedge * price2.to_numpy(dtype=np.float64)
         
         # Z-Score
-        spread_mean = spread.rolling(window=self.hedge_ratio_lookback).mean()
-        spread_std = spread.rolling(window=self.hedge_ratio_lookback).std()
-        z_score = (spread - spread_mean) / spread_std
+        spread_mean, spread_std = _rolling_mean_std(spread[:, None], self.hedge_ratio_lookback)
+        z_score = (spread - spread_mean[:, 0]) / spread_std[:, 0]
+        
+        # 進場信號，再出場
+        signal = np.zeros(len(spread), dtype=np.int64)
+        signal[z_score > self.entry_threshold] = -1  # 價差太高，做空
+        signal[z_score < -self.entry_threshold] = 1   # 價差太低，做多
+        signal[np.abs(z_score) < self.exit_threshold] = 0
         
+        return {"hedge_ratio": hedge, "spread": spread, "z_score": z_score, "signal": signal}
+    
+    def _signal_frame(self, price1: pd.Series, price2: pd.Series, arrays: Dict[str, np.ndarray]) -> pd.DataFrame:
         signals = pd.DataFrame(index=price1.index)
         signals["price1"] = price1
         signals["price2"] = price2
-        signals["spread"] = spread
-        signals["z_score"] = z_score
-        
-        # 進場信號
-        signals["signal"] = 0
-        signals.loc[z_score > self.entry_threshold, "signal"] = -1  # 價差太高，做空
-        signals.loc[z_score < -self.entry_threshold, "signal"] = 1   # 價差太低，做多
+        if self.kalman is not None:
+            signals["hedge_ratio"] = arrays["hedge_ratio"]
+        signals["spread"] = arrays["spread"]
+        signals["z_score"] = arrays["z_score"]
+        signals["signal"] = arrays["signal"]
+        return signals
+    
+    def generate_signals(
+        self, 
+        price1: pd.Series, 
+        price2: pd.Series
+    ) -> pd.DataFrame:
+        """生成配對交易信號"""
+        return self._signal_frame(price1, price2, self._signal_arrays(price1, price2))
+    
+    def update(self, price1: float, price2: float) -> Dict:
+        """
+        實時模式：輸入一根新 K 線，O(1) 更新並返回當前價差、Z-Score 與信號
         
-        # 出場
-        signals.loc[abs(z_score) < self.exit_threshold, "signal"] = 0
+        需要 hedge_method="kalman"
+        """
+        if self.kalman is None:
+            raise ValueError("Incremental updates require hedge_method='kalman'")
         
-        return signals
+        return self.kalman.update(price1, price2)
     
     def backtest(
         self,
         price1: pd.Series,
         price2: pd.Series,
-        initial_capital: float = 100000
-    ) -> Dict:
-        """配對交易回測"""
-        signals = self.generate_signals(price1, price2)
+        initial_capital: float = 100000,
+        detail: bool = False,
+        dtype: type = np.float64
+    ) -> BacktestResult:
+        """
+        配對交易回測
+        
+        Args:
+            detail: 是否保留逐根明細 DataFrame（result["signals"]）；False 時全程只用數組
+            dtype: 收益數組精度
+        """
+        arrays = self._signal_arrays(price1, price2)
         
         # 計算收益
-        ret1 = price1.pct_change()
-        ret2 = price2.pct_change()
+        ret1 = price1.pct_change().to_numpy(dtype=np.float64)
+        ret2 = price2.pct_change().to_numpy(dtype=np.float64)
         
-        # 組合收益（考慮對沖）
-        position = signals["signal"].shift(1).fillna(0)
-        hedge = self.hedge_ratio.shift(1).fillna(1)
+        # 組合收益（考慮對沖），持倉和對沖比率滯後一期
+        position = np.concatenate([[0.0], arrays["signal"][:-1]])
+        hedge = np.concatenate([[np.nan], arrays["hedge_ratio"][:-1]])
+        hedge[np.isnan(hedge)] = 1.0
         
         # 資產1 收益 + 資產2 對沖收益
         strategy_returns = position * ret1 - position * hedge * ret2
         
-        signals["strategy_returns"] = strategy_returns
-        signals["cumulative"] = (1 + strategy_returns).cumprod()
-        
-        total_return = signals["cumulative"].iloc[-1] - 1
+        frame = None
+        if detail:
+            frame = self._signal_frame(price1, price2, arrays)
+            frame["strategy_returns"] = strategy_returns
+            frame["cumulative"] = (1 + frame["strategy_returns"]).cumprod()
         
-        return {
-            "total_return": total_return,
-            "cointegration": self.find_cointegration(price1, price2),
-            "signals": signals
+        metrics = {
+            "total_return": np.prod(1 + np.nan_to_num(strategy_returns)) - 1,
+            "cointegration": self.find_cointegration(price1, price2)
         }
+        
+        return BacktestResult(
+            price1.index,
+            arrays["signal"],
+            strategy_returns,
+            metrics,
+            frame=frame,
+            dtype=dtype
+        )
+
+
+# 配對篩選的工作進程共享數據（由 initializer 設置，避免每個任務重複序列化價格矩陣）
+_SCREEN_PRICES = None
+
+
+def _init_screen_worker(prices: np.ndarray):
+    global _SCREEN_PRICES
+    _SCREEN_PRICES = prices
+
+
+def _half_life(spread: np.ndarray) -> float:
+    """AR(1) 估計價差回歸半衰期"""
+    lagged = spread[:-1] - spread[:-1].mean()
+    delta = np.diff(spread)
+    denom = np.dot(lagged, lagged)
+    if denom <= 0:
+        return np.inf
+    lam = np.dot(lagged, delta - delta.mean()) / denom
+    return -np.log(2) / lam if lam < 0 else np.inf
+
+
+def _screen_pair_chunk(
+    pairs: np.ndarray,
+    prescreen_pvalue: float,
+    significance: float,
+    maxlag: Optional[int],
+    autolag: Optional[str]
+) -> List[Dict]:
+    """
+    對一批候選配對做兩階段協整檢驗
+
+    第一階段：向量化 Engle-Granger（無滯後 DF 統計量），快速淘汰
+    第二階段：對倖存者做完整的 statsmodels coint 檢驗
+    """
+    from statsmodels.tsa.stattools import coint
+    from statsmodels.tsa.adfvalues import mackinnonp
+
+    prices = _SCREEN_PRICES
+    y = prices[:, pairs[:, 0]]
+    x = prices[:, pairs[:, 1]]
+
+    # 逐列 OLS: y = a + b * x
+    x_dm = x - x.mean(axis=0)
+    y_dm = y - y.mean(axis=0)
+    beta = (x_dm * y_dm).sum(axis=0) / (x_dm ** 2).sum(axis=0)
+    resid = y_dm - beta * x_dm
+
+    # Dickey-Fuller: Δe_t = ρ e_{t-1} + ε
+    lagged = resid[:-1]
+    delta = np.diff(resid, axis=0)
+    sxx = (lagged ** 2).sum(axis=0)
+    rho = (lagged * delta).sum(axis=0) / sxx
+    sse = ((delta - rho * lagged) ** 2).sum(axis=0)
+    se = np.sqrt(sse / (len(delta) - 1) / sxx)
+    df_stat = rho / se
+
+    results = []
+    for k in range(len(pairs)):
+        if mackinnonp(df_stat[k], regression="c", N=2) > prescreen_pvalue:
+            continue
+
+        i, j = pairs[k]
+        score, pvalue, _ = coint(
+            prices[:, i], prices[:, j], maxlag=maxlag, autolag=autolag
+        )
+        if pvalue >= significance:
+            continue
+
+        results.append({
+            "asset1": int(i),
+            "asset2": int(j),
+            "hedge_ratio": beta[k],
+            "coint_score": score,
+            "p_value": pvalue,
+            "half_life": _half_life(resid[:, k])
+        })
+
+    return results
+
+
+class PairsScreener:
+    """
+    全市場配對篩選引擎
+
+    1. 向量化相關係數 / 距離矩陣預篩選候選配對
+    2. 進程池並行協整檢驗（含提前淘汰）
+    3. 輸出按 p 值排序的配對表（對沖比率、半衰期）
+    """
+
+    def __init__(
+        self,
+        method: str = "correlation",
+        min_correlation: float = 0.8,
+        max_candidates: Optional[int] = 5000,
+        significance: float = 0.05,
+        prescreen_pvalue: float = 0.5,
+        max_half_life: Optional[float] = None,
+        maxlag: Optional[int] = None,
+        autolag: Optional[str] = "aic",
+        n_jobs: Optional[int] = None,
+        chunk_size: int = 256,
+        log_prices: bool = False
+    ):
+        """
+        Args:
+            method: 預篩選方法 "correlation"（對數價格相關）或 "distance"（標準化價格距離）
+            min_correlation: correlation 方法的最低相關係數
+            max_candidates: 進入協整檢驗的最大候選數（按預篩選分數排序）
+            significance: 協整檢驗顯著性水平
+            prescreen_pvalue: 快速 DF 檢驗的淘汰閾值（寬鬆於 significance）
+            max_half_life: 最大半衰期（天），None 表示不限
+            maxlag: ADF 最大滯後階數（傳給 coint）
+            autolag: 滯後階數選擇準則，None 則固定使用 maxlag（更快）
+            n_jobs: 進程數，None 為 CPU 核數，1 為單進程
+            chunk_size: 每個任務的配對數
+            log_prices: 協整回歸是否使用對數價格。默認 False 與 PairsTradingStrategy 一致，
+                        在價格水平上回歸和檢驗，hedge_ratio 可直接用於策略、p 值與 find_cointegration 相同；
+                        True 時輸出列為 log_hedge_ratio（對數彈性，不能直接作為策略的對沖比率）。
+                        相關係數預篩選始終使用對數價格
+        """
+        self.method = method
+        self.min_correlation = min_correlation
+        self.max_candidates = max_candidates
+        self.significance = significance
+        self.prescreen_pvalue = prescreen_pvalue
+        self.max_half_life = max_half_life
+        self.maxlag = maxlag
+        self.autolag = autolag
+        self.n_jobs = n_jobs
+        self.chunk_size = chunk_size
+        self.log_prices = log_prices
+
+    def prefilter(self, log_prices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        向量化預篩選
+
+        Returns:
+            (候選配對索引 (m, 2), 預篩選分數)
+        """
+        n_assets = log_prices.shape[1]
+        rows, cols = np.triu_indices(n_assets, k=1)
+
+        if self.method == "distance":
+            # Gatev 距離法：標準化價格的平方距離和（越小越好）
+            normalized = np.exp(log_prices - log_prices[0])
+            sq_norms = (normalized ** 2).sum(axis=0)
+            dist = sq_norms[:, None] + sq_norms[None, :] - 2 * normalized.T @ normalized
+            scores = dist[rows, cols]
+            order = np.argsort(scores)
+        else:
+            corr = np.corrcoef(log_prices, rowvar=False)
+            scores = corr[rows, cols]
+            keep = scores >= self.min_correlation
+            rows, cols, scores = rows[keep], cols[keep], scores[keep]
+            order = np.argsort(-scores)
+
+        if self.max_candidates is not None:
+            order = order[:self.max_candidates]
+
+        pairs = np.column_stack([rows[order], cols[order]])
+        return pairs, scores[order]
+
+    def screen(self, prices: pd.DataFrame) -> pd.DataFrame:
+        """
+        篩選協整配對
+
+        Args:
+            prices: 寬表價格 (時間 × 資產)
+
+        Returns:
+            DataFrame: asset1, asset2, score, hedge_ratio（log_prices 時為 log_hedge_ratio）,
+                       coint_score, p_value, half_life
+        """
+        complete = prices.dropna(axis=1, how="any")
+        if complete.shape[1] < prices.shape[1]:
+            logger.warning(
+                f"Dropped {prices.shape[1] - complete.shape[1]} assets with missing prices"
+            )
+
+        columns = complete.columns
+        levels = complete.values.astype(np.float64)
+        log_prices = np.log(levels)
+        test_prices = log_prices if self.log_prices else levels
+
+        pairs, scores = self.prefilter(log_prices)
+        logger.info(f"Prefilter kept {len(pairs)} candidate pairs from {len(columns)} assets")
+
+        score_map = {(int(i), int(j)): s for (i, j), s in zip(pairs, scores)}
+        chunks = [
+            pairs[k:k + self.chunk_size]
+            for k in range(0, len(pairs), self.chunk_size)
+        ]
+
+        n_jobs = self.n_jobs or os.cpu_count() or 1
+        test_args = (self.prescreen_pvalue, self.significance, self.maxlag, self.autolag)
+        results = []
+
+        if n_jobs == 1 or len(chunks) <= 1:
+            _init_screen_worker(test_prices)
+            for chunk in chunks:
+                results.extend(_screen_pair_chunk(chunk, *test_args))
+        else:
+            with ProcessPoolExecutor(
+                max_workers=n_jobs,
+                initializer=_init_screen_worker,
+                initargs=(test_prices,)
+            ) as executor:
+                futures = [
+                    executor.submit(_screen_pair_chunk, chunk, *test_args)
+                    for chunk in chunks
+                ]
+                for future in futures:
+                    results.extend(future.result())
+
+        table = pd.DataFrame(
+            results,
+            columns=["asset1", "asset2", "hedge_ratio", "coint_score", "p_value", "half_life"]
+        )
+
+        if self.max_half_life is not None:
+            table = table[table["half_life"] <= self.max_half_life]
+
+        table.insert(2, "score", [score_map[(i, j)] for i, j in zip(table["asset1"], table["asset2"])])
+        table["asset1"] = columns[table["asset1"].values]
+        table["asset2"] = columns[table["asset2"].values]
+        if self.log_prices:
+            table = table.rename(columns={"hedge_ratio": "log_hedge_ratio"})
+
+        return table.sort_values(["p_value", "half_life"]).reset_index(drop=True)
+
+
+def _rolling_mean_std(values: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    沿時間軸對所有列同時計算滾動均值和標準差（累積和，O(T·N)）
+
+    窗口未滿或窗口內有 NaN 時為 NaN，與 pandas rolling 一致
+    """
+    n_rows, n_cols = values.shape
+    mean = np.full((n_rows, n_cols), np.nan)
+    std = np.full((n_rows, n_cols), np.nan)
+    if n_rows < window:
+        return mean, std
+
+    missing = np.isnan(values)
+    # 減去列均值以降低平方和的消去誤差
+    center = np.nanmean(values, axis=0) if missing.any() else values.mean(axis=0)
+    x = np.where(missing, 0.0, values - center)
+
+    def window_sum(a):
+        cs = np.cumsum(a, axis=0)
+        out = cs[window - 1:].copy()
+        out[1:] -= cs[:-window]
+        return out
+
+    s1 = window_sum(x)
+    s2 = window_sum(x * x)
+    n_missing = window_sum(missing.astype(np.int64))
+
+    m = s1 / window
+    var = np.maximum(s2 - s1 * m, 0.0) / (window - 1)
+    valid = n_missing == 0
+
+    mean[window - 1:] = np.where(valid, m + center, np.nan)
+    std[window - 1:] = np.where(valid, np.sqrt(var), np.nan)
+    return mean, std
+
+
+class PanelMeanReversion:
+    """
+    面板均值回歸
+
+    對寬表價格（時間 × 標的）一次性向量化計算滾動統計量、Z-Score 和持倉信號，
+    規則與 MeanReversionStrategy 相同；只需最新狀態時不構造逐根 DataFrame
+
+    交易日曆不同的標的（如 7 天交易的加密貨幣與股票）在外連接面板中會有缺失，
+    按缺失模式把列分組，每組只在其有效行上計算（等價於逐標的 dropna），
+    再放回面板；缺失行的 Z-Score 為 NaN，持倉沿用上一有效行
+    """
+
+    def __init__(
+        self,
+        lookback_period: int = 60,
+        entry_threshold: float = 2.0,
+        exit_threshold: float = 0.5,
+        holding_period: int = 20,
+        stop_loss: Optional[float] = None
+    ):
+        """
+        Args:
+            lookback_period: 計算均值的回顧期
+            entry_threshold: 進場閾值（標準差倍數）
+            exit_threshold: 出場閾值
+            holding_period: 最大持倉天數
+            stop_loss: 止損閾值（Z-Score 絕對值），None 表示不止損
+        """
+        self.lookback_period = lookback_period
+        self.entry_threshold = entry_threshold
+        self.exit_threshold = exit_threshold
+        self.holding_period = holding_period
+        self.stop_loss = stop_loss
+
+    @staticmethod
+    def _column_groups(values: np.ndarray) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """按缺失模式分組：[(有效行掩碼, 列下標), ...]；無缺失時只有一組"""
+        valid = ~np.isnan(values)
+        if valid.all():
+            return [(valid[:, 0], np.arange(values.shape[1]))]
+
+        groups = {}
+        for j in range(values.shape[1]):
+            groups.setdefault(valid[:, j].tobytes(), []).append(j)
+        return [(valid[:, cols[0]], np.asarray(cols)) for cols in groups.values()]
+
+    def _positions(self, z: np.ndarray) -> np.ndarray:
+        return hysteresis_positions(
+            z,
+            self.entry_threshold,
+            self.exit_threshold,
+            stop_loss=self.stop_loss,
+            max_holding=self.holding_period
+        )
+
+    def _compute(
+        self,
+        prices: pd.DataFrame,
+        positions: bool = True
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        """全部標的的滾動均值、標準差、Z-Score 和持倉 (T, N)，逐組在有效行上計算"""
+        values = prices.values.astype(np.float64)
+        mean = np.full(values.shape, np.nan)
+        std = np.full(values.shape, np.nan)
+        held = np.zeros(values.shape, dtype=np.int8) if positions else None
+
+        for rows, cols in self._column_groups(values):
+            sub = values[rows][:, cols]
+            sub_mean, sub_std = _rolling_mean_std(sub, self.lookback_period)
+            mean[np.ix_(rows, cols)] = sub_mean
+            std[np.ix_(rows, cols)] = sub_std
+            if positions:
+                sub_positions = self._positions((sub - sub_mean) / sub_std)
+                # 缺失行沿用上一有效行的持倉
+                seen = np.cumsum(rows)
+                if len(sub):
+                    held[:, cols] = np.where((seen > 0)[:, None], sub_positions[np.maximum(seen - 1, 0)], 0)
+
+        return mean, std, (values - mean) / std, held
+
+    def z_scores(self, prices: pd.DataFrame) -> pd.DataFrame:
+        """Z-Score 面板"""
+        _, _, z, _ = self._compute(prices, positions=False)
+        return pd.DataFrame(z, index=prices.index, columns=prices.columns)
+
+    def generate_signals(self, prices: pd.DataFrame) -> pd.DataFrame:
+        """持倉信號面板：1 (long), -1 (short), 0 (neutral)"""
+        _, _, _, held = self._compute(prices)
+        return pd.DataFrame(held, index=prices.index, columns=prices.columns)
+
+    def latest(self, prices: pd.DataFrame, stateful: bool = True) -> pd.DataFrame:
+        """
+        每個標的的最新狀態
+
+        Args:
+            prices: 寬表價格
+            stateful: True 則遍歷歷史得到帶遲滯的持倉（與 generate_signals 最後一行一致）；
+                      False 只計算最後一個窗口，信號僅由當前 Z-Score 決定
+
+        Returns:
+            DataFrame（index 為標的）: price, mean, std, z_score, signal，
+            均取各標的最後一個有效行
+        """
+        values = prices.values.astype(np.float64)
+        n_cols = values.shape[1]
+        valid = ~np.isnan(values)
+        last_row = np.where(valid.any(axis=0), len(values) - 1 - np.argmax(valid[::-1], axis=0), 0)
+        columns = np.arange(n_cols)
+        last_price = values[last_row, columns]
+
+        if stateful:
+            mean, std, _, held = self._compute(prices)
+            mean, std = mean[last_row, columns], std[last_row, columns]
+            signal = held[-1]
+        else:
+            mean = np.full(n_cols, np.nan)
+            std = np.full(n_cols, np.nan)
+            for rows, cols in self._column_groups(values):
+                window = values[rows][-self.lookback_period:, cols]
+                if len(window) == self.lookback_period:
+                    mean[cols] = window.mean(axis=0)
+                    std[cols] = window.std(axis=0, ddof=1)
+            z_last = (last_price - mean) / std
+            signal = np.zeros(n_cols, dtype=np.int8)
+            signal[z_last < -self.entry_threshold] = 1
+            signal[z_last > self.entry_threshold] = -1
+
+        return pd.DataFrame(
+            {
+                "price": last_price,
+                "mean": mean,
+                "std": std,
+                "z_score": (last_price - mean) / std,
+                "signal": signal
+            },
+            index=prices.columns
+        )
 
 
 class BollingerBandsStrategy:
@@ -291,11 +890,9 @@ class BollingerBandsStrategy:
         signals["upper"] = upper
         signals["lower"] = lower
         
-        # 信號
-        signals["signal"] = 0
-        signals.loc[prices < lower, "signal"] = 1   # 超賣，做多
-        signals.loc[prices > upper, "signal"] = -1  # 超買，做空
-        signals.loc[(prices > ma) & (signals["signal"].shift(1) == 1), "signal"] = 0  # 回到均線，平倉
+        # 信號：跌破下軌做多、突破上軌做空，持有直到回到均線
+        z_scores = (prices - ma) / std
+        signals["signal"] = hysteresis_positions(z_scores.values, self.num_std, 0.0)
         
         return signals
 
@@ -343,3 +940,13 @@ def run_mean_reversion(
         "max_drawdown": result["max_drawdown"],
         "total_trades": result["total_trades"]
     }
+
+
+def screen_pairs(prices: pd.DataFrame, **kwargs) -> pd.DataFrame:
+    """
+    便捷函數：全市場配對篩選
+
+    Example:
+        >>> pairs = screen_pairs(price_panel, min_correlation=0.9)
+    """
+    return PairsScreener(**kwargs).screen(prices)
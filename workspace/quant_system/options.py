@@ -1,16 +1,73 @@
 """
 期權定價模組
-支持：Black-Scholes, Binomial, Greeks 計算
+支持：Black-Scholes（含向量化批量定價）, Binomial, Greeks 計算
 """
 
 import numpy as np
 import pandas as pd
-from typing import Dict, Optional, Tuple
+from typing import Dict, Optional, Tuple, Union
 from scipy.stats import norm
+from scipy.special import ndtr
 import logging
 
 logger = logging.getLogger(__name__)
 
+ArrayLike = Union[float, np.ndarray]
+
+
+def black_scholes_batch(
+    S: ArrayLike,
+    K: ArrayLike,
+    T: ArrayLike,
+    r: ArrayLike,
+    sigma: ArrayLike,
+    is_call: ArrayLike,
+    greeks: bool = False
+) -> Dict[str, np.ndarray]:
+    """
+    向量化 Black-Scholes
+
+    所有參數按 NumPy 廣播規則組合，如 (持倉, 1) 的合約參數與 (持倉, 情境) 的
+    標的價格、波動率一次求值；到期（T <= 0）時取內在價值
+
+    Args:
+        is_call: True 為 Call，False 為 Put（可為布爾數組）
+        greeks: 是否同時返回 delta, gamma, vega, theta
+
+    Returns:
+        {"price": ...}，greeks=True 時另含各 Greeks
+    """
+    S, K, T, sigma = (np.asarray(x, dtype=np.float64) for x in (S, K, T, sigma))
+    is_call = np.asarray(is_call, dtype=bool)
+
+    expired = T <= 0
+    tau = np.where(expired, 1e-12, T)
+    sqrt_tau = np.sqrt(tau)
+    vol_sqrt = sigma * sqrt_tau
+
+    d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * tau) / vol_sqrt
+    d2 = d1 - vol_sqrt
+    discount = K * np.exp(-r * tau)
+
+    call = S * ndtr(d1) - discount * ndtr(d2)
+    # Put-Call 平價
+    price = np.where(is_call, call, call - S + discount)
+    intrinsic = np.where(is_call, np.maximum(S - K, 0.0), np.maximum(K - S, 0.0))
+    result = {"price": np.where(expired, intrinsic, price)}
+
+    if greeks:
+        pdf = np.exp(-0.5 * d1 ** 2) / np.sqrt(2 * np.pi)
+        call_delta = ndtr(d1)
+        result["delta"] = np.where(is_call, call_delta, call_delta - 1)
+        result["gamma"] = pdf / (S * vol_sqrt)
+        result["vega"] = S * pdf * sqrt_tau
+        result["theta"] = (
+            -S * pdf * sigma / (2 * sqrt_tau)
+            - r * discount * np.where(is_call, ndtr(d2), -ndtr(-d2))
+        )
+
+    return result
+
 
 class OptionsPricer:
     """
@@ -61,8 +118,12 @@ class OptionsPricer:
         # Greeks
         gamma = norm.pdf(d1) / (S * sigma * np.sqrt(T))
         vega = S * norm.pdf(d1) * np.sqrt(T)
-        theta = (-S * norm.pdf(d1) * sigma / (2 * np.sqrt(T)) 
-                 - r * K * np.exp(-r * T) * norm.cdf(d2 if option_type == "call" else -d2))
+        if option_type.lower() == "call":
+            theta = (-S * norm.pdf(d1) * sigma / (2 * np.sqrt(T))
+                     - r * K * np.exp(-r * T) * norm.cdf(d2))
+        else:
+            theta = (-S * norm.pdf(d1) * sigma / (2 * np.sqrt(T))
+                     + r * K * np.exp(-r * T) * norm.cdf(-d2))
         
         return {
             "price": price,
@@ -75,6 +136,25 @@ class OptionsPricer:
             "d2": d2
         }
     
+    def black_scholes_batch(
+        self,
+        S: ArrayLike,
+        K: ArrayLike,
+        T: ArrayLike,
+        r: ArrayLike,
+        sigma: ArrayLike,
+        option_type: Union[str, np.ndarray] = "call",
+        greeks: bool = True
+    ) -> Dict[str, np.ndarray]:
+        """
+        批量 Black-Scholes（數組輸入，見 black_scholes_batch）
+        
+        Args:
+            option_type: "call" / "put" 或逐個合約的類型數組
+        """
+        is_call = np.char.lower(np.asarray(option_type, dtype=str)) == "call"
+        return black_scholes_batch(S, K, T, r, sigma, is_call, greeks)
+    
     def binomial(
         self,
         S: float,
@@ -1,43 +1,437 @@
 """
 投資組合格化模組
-支持：現代投資組合理論 (MPT)、Black-Litterman、風險平價
+支持：現代投資組合理論 (MPT)、Black-Litterman、風險平價 / 風險預算、
+      數千資產的因子形式 QP（箱體 / 分組 / 換手約束）、均值-CVaR 線性規劃
 """
 
 import numpy as np
 import pandas as pd
-from typing import Dict, List, Optional, Tuple
-from scipy.optimize import minimize
+from typing import Dict, List, Optional, Tuple, Union
+from scipy import sparse
+from scipy.linalg import cho_factor, cho_solve
+from scipy.optimize import linprog, minimize
 import logging
+import time
+
+from .covariance import CovarianceEstimator
+from .qp import QPSolver, factor_portfolio_qp
 
 logger = logging.getLogger(__name__)
 
+# 嘗試導入 Numba（風險預算坐標下降核心），不可用時直接使用阻尼牛頓法
 try:
-    from sklearn.covariance import LedoitWolf
-    HAS_SKLEARN = True
+    from numba import njit
+    HAS_NUMBA = True
 except ImportError:
-    HAS_SKLEARN = False
+    HAS_NUMBA = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+
+def _risk_parity_objective(weights: np.ndarray, cov: np.ndarray) -> float:
+    """風險平價目標：各資產風險貢獻與均分目標的平方偏差和"""
+    marginal = cov @ weights
+    vol = np.sqrt(weights @ marginal)
+    risk_contrib = weights * marginal / vol
+    return np.sum((risk_contrib - vol / len(weights)) ** 2)
+
+
+def _risk_parity_gradient(weights: np.ndarray, cov: np.ndarray) -> np.ndarray:
+    """
+    風險平價目標的解析梯度
+    
+    m = Σw, σ = sqrt(wᵀm), rc = w∘m / σ, d = rc - σ/n：
+    ∇ = 2 [d∘m/σ + Σ(d∘w)/σ - (dᵀ(w∘m)) m/σ³ - (Σd) m/(nσ)]
+    """
+    marginal = cov @ weights
+    vol = np.sqrt(weights @ marginal)
+    n = len(weights)
+    deviation = weights * marginal / vol - vol / n
+    
+    return 2 * (
+        deviation * marginal / vol
+        + cov @ (deviation * weights) / vol
+        - (deviation @ (weights * marginal)) * marginal / vol ** 3
+        - deviation.sum() * marginal / (n * vol)
+    )
+
+
+@njit(cache=True)
+def _risk_budget_ccd(cov, budgets, x, tol, max_cycles):
+    """
+    循環坐標下降：逐個資產對 x_i 精確最小化
+    ½σ_ii x_i² + c_i x_i - b_i log x_i（c_i = Σ_{j≠i} σ_ij x_j），
+    即 x_i = (-c_i + sqrt(c_i² + 4σ_ii b_i)) / (2σ_ii)，Σx 隨之做 O(N) 增量更新
+    """
+    n = len(budgets)
+    marginal = cov @ x
+    for cycle in range(max_cycles):
+        for i in range(n):
+            c = marginal[i] - cov[i, i] * x[i]
+            x_i = (-c + np.sqrt(c * c + 4 * cov[i, i] * budgets[i])) / (2 * cov[i, i])
+            step = x_i - x[i]
+            if step != 0.0:
+                for j in range(n):
+                    marginal[j] += step * cov[i, j]
+                x[i] = x_i
+        
+        error = 0.0
+        for i in range(n):
+            error = max(error, abs(x[i] * marginal[i] - budgets[i]) / budgets[i])
+        if error < tol:
+            return x, cycle + 1
+    return x, max_cycles
+
+
+def _risk_budget_newton(cov, budgets, x, tol, max_iter):
+    """
+    阻尼牛頓法（坐標下降未收斂時精修，無 Numba 時直接使用）：∇ = Σx - b/x，H = Σ + diag(b/x²)；
+    目標自和諧，牛頓減量 λ > 0.25 時步長取 1/(1+λ)，保證 x 始終為正
+    """
+    for iteration in range(max_iter):
+        marginal = cov @ x
+        if np.max(np.abs(x * marginal - budgets) / budgets) < tol:
+            return x, iteration
+        gradient = marginal - budgets / x
+        step = cho_solve(cho_factor(cov + np.diag(budgets / x ** 2)), gradient)
+        decrement = np.sqrt(gradient @ step)
+        x = x - step / (1 + decrement) if decrement > 0.25 else x - step
+    return x, max_iter
+
+
+def _risk_budget_weights(
+    cov: np.ndarray,
+    budgets: Optional[np.ndarray] = None,
+    init: Optional[np.ndarray] = None,
+    tol: float = 1e-10,
+    max_iter: int = 1000,
+    ccd_cycles: int = 100
+) -> Tuple[np.ndarray, Dict]:
+    """
+    風險預算組合（Spinu 凸形式）：min ½xᵀΣx - Σ b_i log x_i, x > 0
+    
+    最優點滿足 x_i(Σx)_i = b_i，歸一化 w = x / Σx 後風險貢獻占比即 b / Σb；
+    問題嚴格凸，任意正初值都收斂，上一期權重作熱啟動時通常只需幾輪
+    
+    坐標下降每輪 O(N²)，樣本協方差上十餘輪即收斂，但因子結構（資產高度相關）時線性收斂極慢；
+    有限輪數內未達到 tol 時以牛頓法精修（二次收斂，每步 O(N³)），仍未收斂則記錄警告
+    
+    Args:
+        cov: 協方差矩陣
+        budgets: 風險預算（正數，自動歸一化），None 為等風險貢獻
+        init: 熱啟動權重（正數），None 時從反波動率權重開始
+        tol: 收斂門檻 max |x_i(Σx)_i - b_i| / b_i
+        max_iter: 牛頓法迭代次數上限（不超過 100）
+        ccd_cycles: 坐標下降輪數上限（需要 Numba）
+    
+    Returns:
+        (權重, {"iterations", "newton_iterations", "converged", "error"})
+    """
+    cov = np.ascontiguousarray(cov, dtype=np.float64)
+    n = len(cov)
+    budgets = np.ones(n) if budgets is None else np.asarray(budgets, dtype=np.float64)
+    if budgets.shape != (n,) or not np.all(budgets > 0):
+        raise ValueError("Risk budgets must be positive, one per asset")
+    budgets = budgets / budgets.sum()
+    
+    if init is None or np.any(np.asarray(init) <= 0):
+        x = budgets / np.sqrt(np.diag(cov))
+    else:
+        x = np.asarray(init, dtype=np.float64).copy()
+    # 最優點滿足 xᵀΣx = Σb = 1，先把初值縮放到該尺度
+    x *= 1 / np.sqrt(x @ cov @ x)
+    
+    def relative_error(x):
+        return np.max(np.abs(x * (cov @ x) - budgets) / budgets)
+    
+    cycles, newton_iterations = 0, 0
+    if HAS_NUMBA:
+        x, cycles = _risk_budget_ccd(cov, budgets, x, tol, min(ccd_cycles, max_iter))
+    error = relative_error(x)
+    if not error < tol:
+        x, newton_iterations = _risk_budget_newton(cov, budgets, x, tol, min(max_iter, 100))
+        error = relative_error(x)
+    
+    converged = bool(error < tol)
+    if not converged:
+        logger.warning(f"Risk budgeting did not converge: relative risk contribution error {error:.2e}")
+    
+    info = {
+        "iterations": cycles + newton_iterations,
+        "newton_iterations": newton_iterations,
+        "converged": converged,
+        "error": float(error)
+    }
+    return x / x.sum(), info
+
+
+def _budget_constraint() -> Dict:
+    """權重和為 1 的等式約束（含雅可比）"""
+    return {
+        "type": "eq",
+        "fun": lambda w: np.sum(w) - 1,
+        "jac": lambda w: np.ones_like(w)
+    }
+
+
+def _minimize_on_simplex(objective, gradient, n: int, args: Tuple = ()) -> np.ndarray:
+    """
+    在單純形（w >= 0, Σw = 1）上最小化
+    
+    令 w = y / Σy（y >= 0），等式約束被消去，只剩簡單邊界，可用 L-BFGS-B：
+    ∇_y = (∇_w - (∇_wᵀw)) / Σy。每次迭代 O(N²)（一次 Σw），而 SLSQP 為 O(N³)
+    """
+    def value_and_gradient(y):
+        total = y.sum()
+        w = y / total
+        grad = gradient(w, *args)
+        return objective(w, *args), (grad - grad @ w) / total
+    
+    result = minimize(
+        value_and_gradient,
+        np.ones(n) / n,
+        jac=True,
+        method="L-BFGS-B",
+        bounds=[(0, None)] * n,
+        options={"maxiter": 1000}
+    )
+    return result.x / result.x.sum()
+
+
+class CriticalLineAlgorithm:
+    """
+    臨界線算法（Markowitz CLA）
+    
+    求解 min ½wᵀΣw - λwᵀμ, s.t. Σw = 1, lb <= w <= ub 在所有 λ >= 0 上的解路徑：
+    從最高收益組合出發，λ 遞減，每個轉折點只有一個資產進出自由集，
+    兩個轉折點之間權重隨 λ（亦即隨預期收益）線性變化，故整條有效前沿可精確插值
+    
+    候選「釋放」的受限資產用分塊求逆（Schur 補）一次性向量化計算，不逐個求逆
+    """
+    
+    def __init__(
+        self,
+        mean: np.ndarray,
+        covariance: np.ndarray,
+        lower: Optional[np.ndarray] = None,
+        upper: Optional[np.ndarray] = None,
+        tol: float = 1e-10
+    ):
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.covariance = np.asarray(covariance, dtype=np.float64)
+        n = len(self.mean)
+        self.lower = np.zeros(n) if lower is None else np.asarray(lower, dtype=np.float64)
+        self.upper = np.ones(n) if upper is None else np.asarray(upper, dtype=np.float64)
+        self.tol = tol
+        self.weights: List[np.ndarray] = []
+        self.lambdas: List[float] = []
+        
+        if self.lower.sum() > 1 + tol or self.upper.sum() < 1 - tol:
+            raise ValueError("Bounds are infeasible for fully invested weights")
+    
+    def _initial(self) -> Tuple[List[int], np.ndarray]:
+        """最高收益的可行組合：按收益從高到低把資產填到上界，直到權重和為 1"""
+        w = self.lower.copy()
+        order = np.argsort(self.mean)[::-1]
+        for i in order:
+            w[i] = self.upper[i]
+            if w.sum() >= 1:
+                w[i] -= w.sum() - 1
+                return [i], w
+        return [order[-1]], w
+    
+    def _terms(self, free: List[int], w: np.ndarray) -> Dict:
+        """自由集上的公共項"""
+        bounded = np.setdiff1d(np.arange(len(w)), free)
+        cov_inv = np.linalg.inv(self.covariance[np.ix_(free, free)])
+        a_ones = cov_inv.sum(axis=1)
+        a_mean = cov_inv @ self.mean[free]
+        # Σ_FB w_B
+        carry = self.covariance[np.ix_(free, bounded)] @ w[bounded]
+        a_carry = cov_inv @ carry
+        return {
+            "bounded": bounded,
+            "cov_inv": cov_inv,
+            "a_ones": a_ones,
+            "a_mean": a_mean,
+            "a_carry": a_carry,
+            "c1": a_ones.sum(),
+            "c3": a_mean.sum(),
+            "w_bounded": w[bounded].sum()
+        }
+    
+    @staticmethod
+    def _lambda(c1, c3, c2_i, c4_i, l1, l2, l3_i, b_i):
+        """資產 i 觸及（或離開）b_i 時的 λ（向量化）"""
+        c = -c1 * c2_i + c3 * c4_i
+        with np.errstate(divide="ignore", invalid="ignore"):
+            lam = ((1 - l1 + l2) * c4_i - c1 * (b_i + l3_i)) / c
+        return np.where(c == 0, np.nan, lam), c
+    
+    def _weights(self, terms: Dict, free: List[int], w: np.ndarray, lam: float) -> np.ndarray:
+        g = (-lam * terms["c3"] + 1 - terms["w_bounded"] + terms["a_carry"].sum()) / terms["c1"]
+        w = w.copy()
+        w[free] = -terms["a_carry"] + g * terms["a_ones"] + lam * terms["a_mean"]
+        return w
+    
+    def solve(self) -> "CriticalLineAlgorithm":
+        """計算全部轉折點（權重及 λ），λ 從大到小，最後一個為最小方差組合"""
+        free, w = self._initial()
+        self.weights, self.lambdas = [w.copy()], [np.inf]
+        cov = self.covariance
+        
+        while True:
+            t = self._terms(free, w)
+            current = self.lambdas[-1]
+            
+            # a) 一個自由資產觸及邊界
+            lam_in = -np.inf
+            if len(free) > 1:
+                # 按 c 的符號決定觸及上界還是下界（Bailey & López de Prado, 2013）
+                c = -t["c1"] * t["a_mean"] + t["c3"] * t["a_ones"]
+                bound = np.where(c > 0, self.upper[free], self.lower[free])
+                lam, _ = self._lambda(
+                    t["c1"], t["c3"], t["a_mean"], t["a_ones"],
+                    t["w_bounded"], t["a_carry"].sum(), t["a_carry"], bound
+                )
+                lam = np.where(lam < current - self.tol, lam, np.nan)
+                if np.isfinite(lam).any():
+                    k = np.nanargmax(lam)
+                    lam_in, i_in, bound_in = lam[k], free[k], bound[k]
+            
+            # b) 一個受限資產進入自由集（對所有候選用 Schur 補一次算出）
+            lam_out = -np.inf
+            bounded = t["bounded"]
+            if len(bounded):
+                s = cov[np.ix_(free, bounded)]
+                u = t["cov_inv"] @ s
+                k_schur = np.diag(cov)[bounded] - (s * u).sum(axis=0)
+                u_ones = u.sum(axis=0)
+                w_i = w[bounded]
+                
+                def bordered(v_free_dot_u, v_i, ones_dot_a_v):
+                    # 新自由集 F ∪ {i} 下：(M⁻¹v)_i 及 1ᵀM⁻¹v
+                    last = (v_i - v_free_dot_u) / k_schur
+                    total = ones_dot_a_v + (u_ones - 1) * (v_free_dot_u - v_i) / k_schur
+                    return last, total
+                
+                mean_f = self.mean[free]
+                c2_i, c3_new = bordered(mean_f @ u, self.mean[bounded], t["c3"])
+                c4_i, c1_new = bordered(u_ones, np.ones(len(bounded)), t["c1"])
+                
+                # Σ_{F',B'} w_B'：從 B 中移除 i 本身的貢獻
+                carry_full = cov[:, bounded] @ w[bounded]
+                v_free = carry_full[free][:, None] - s * w_i
+                v_i = carry_full[bounded] - np.diag(cov)[bounded] * w_i
+                l3_i, l2 = bordered(
+                    (v_free * u).sum(axis=0), v_i,
+                    (t["a_ones"][:, None] * v_free).sum(axis=0)
+                )
+                lam, _ = self._lambda(
+                    c1_new, c3_new, c2_i, c4_i, t["w_bounded"] - w_i, l2, l3_i, w_i
+                )
+                lam = np.where(lam < current - self.tol, lam, np.nan)
+                if np.isfinite(lam).any():
+                    k = np.nanargmax(lam)
+                    lam_out, i_out = lam[k], bounded[k]
+            
+            if max(lam_in, lam_out) <= 0:
+                # 最小方差組合（λ = 0）
+                lam = 0.0
+            elif lam_in > lam_out:
+                lam = lam_in
+                free.remove(i_in)
+                w[i_in] = bound_in
+            else:
+                lam = lam_out
+                free.append(i_out)
+            
+            w = self._weights(self._terms(free, w), free, w, lam)
+            self.weights.append(w.copy())
+            self.lambdas.append(lam)
+            if lam == 0.0:
+                break
+        
+        self._purge()
+        return self
+    
+    def _purge(self):
+        """去除數值誤差造成的不可行轉折點，以及收益不單調（凸包外）的點"""
+        keep_w, keep_l = [], []
+        for w, lam in zip(self.weights, self.lambdas):
+            feasible = (
+                abs(w.sum() - 1) <= 1e-8
+                and np.all(w >= self.lower - 1e-8)
+                and np.all(w <= self.upper + 1e-8)
+            )
+            if feasible:
+                keep_w.append(np.clip(w, self.lower, self.upper))
+                keep_l.append(lam)
+        
+        returns = np.array([w @ self.mean for w in keep_w])
+        monotone = [i for i in range(len(keep_w)) if not np.any(returns[i + 1:] > returns[i] + 1e-12)]
+        self.weights = [keep_w[i] for i in monotone]
+        self.lambdas = [keep_l[i] for i in monotone]
+    
+    def frontier(self, n_points: int = 50) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        在最小方差組合與最高收益組合之間等間隔取 n_points 個預期收益，
+        在相鄰轉折點之間線性插值權重
+        
+        Returns:
+            (波動率, 預期收益, 權重 n_points × N)
+        """
+        if not self.weights:
+            self.solve()
+        
+        turning = np.array(self.weights[::-1])  # 收益從低到高
+        turning_returns = turning @ self.mean
+        targets = np.linspace(turning_returns[0], turning_returns[-1], n_points)
+        
+        segment = np.clip(np.searchsorted(turning_returns, targets) - 1, 0, max(len(turning) - 2, 0))
+        if len(turning) == 1:
+            weights = np.repeat(turning, n_points, axis=0)
+        else:
+            lo, hi = turning_returns[segment], turning_returns[segment + 1]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                frac = np.where(hi > lo, (targets - lo) / (hi - lo), 0.0)
+            weights = (1 - frac)[:, None] * turning[segment] + frac[:, None] * turning[segment + 1]
+        
+        vols = np.sqrt(np.einsum("ij,jk,ik->i", weights, self.covariance, weights))
+        return vols, weights @ self.mean, weights
 
 
 class PortfolioOptimizer:
     """
     投資組合優化器
+    
+    年化均值和協方差在 fit 時預計算為 NumPy 數組，
+    所有目標函數和約束均提供解析梯度（SLSQP 不再有限差分）
     """
     
     def __init__(
         self,
         risk_free_rate: float = 0.02,
-        optimization_method: str = "max_sharpe"
+        optimization_method: str = "max_sharpe",
+        covariance_estimator: Optional[CovarianceEstimator] = None
     ):
         """
         Args:
             risk_free_rate: 無風險利率
             optimization_method: "max_sharpe", "min_volatility", "max_return", "risk_parity"
+            covariance_estimator: 協方差估計器（默認樣本協方差，可在多個組件間共享緩存）
         """
         self.risk_free_rate = risk_free_rate
         self.optimization_method = optimization_method
+        self.covariance_estimator = covariance_estimator or CovarianceEstimator()
         self.weights = None
         self.returns = None
         self.covariance = None
+        self.mean_returns = None
+        self.cov_matrix = None
     
     def fit(
         self,
@@ -49,6 +443,7 @@ class PortfolioOptimizer:
         
         Args:
             returns: 資產收益率 DataFrame
+            constraints: min_weight, max_weight, long_only；risk_parity 還可給 risk_budgets（逐資產風險預算）
         
         Returns:
             最優權重數組
@@ -56,8 +451,10 @@ class PortfolioOptimizer:
         self.returns = returns
         n_assets = len(returns.columns)
         
-        # 估計協方差矩陣
-        self.covariance = returns.cov()
+        # 估計協方差矩陣，並預計算年化的 NumPy 數組供目標函數使用
+        self.covariance = self.covariance_estimator.estimate(returns)
+        self.mean_returns = returns.mean().to_numpy(dtype=np.float64) * 252
+        self.cov_matrix = self.covariance.to_numpy(dtype=np.float64) * 252
         
         # 初始化權重
         init_weights = np.array([1.0 / n_assets] * n_assets)
@@ -72,25 +469,40 @@ class PortfolioOptimizer:
         if constraints.get("long_only", True):
             bounds = tuple((0, 1) for _ in range(n_assets))
         
-        # 優化目標
+        # 優化目標及其梯度
         if self.optimization_method == "max_sharpe":
-            objective = self._sharpe_ratio
+            objective, gradient = self._sharpe_ratio, self._sharpe_ratio_gradient
         elif self.optimization_method == "min_volatility":
-            objective = self._portfolio_volatility
+            objective, gradient = self._portfolio_volatility, self._portfolio_volatility_gradient
         elif self.optimization_method == "max_return":
             objective = lambda w: -self._portfolio_return(w)
+            gradient = lambda w: -self.mean_returns
         elif self.optimization_method == "risk_parity":
-            objective = self._risk_parity_objective
+            objective, gradient = self._risk_parity_objective, self._risk_parity_gradient
         else:
-            objective = self._sharpe_ratio
+            objective, gradient = self._sharpe_ratio, self._sharpe_ratio_gradient
+        
+        # 風險平價在單純形上有唯一內點解，直接解 Spinu 凸問題，以上一次的權重熱啟動
+        if self.optimization_method == "risk_parity" and all(b == (0, 1) for b in bounds):
+            budgets = constraints.get("risk_budgets")
+            if isinstance(budgets, (dict, pd.Series)):
+                budgets = pd.Series(budgets, dtype=np.float64).reindex(returns.columns).to_numpy()
+            previous = self.weights if self.weights is not None and len(self.weights) == n_assets else None
+            self.weights, _ = _risk_budget_weights(self.cov_matrix, budgets, previous)
+            return self.weights
+        
+        # 優化：純多頭（邊界 [0, 1]）即單純形，用重參數化的 L-BFGS-B；其他邊界用 SLSQP
+        if all(b == (0, 1) for b in bounds):
+            self.weights = _minimize_on_simplex(objective, gradient, n_assets)
+            return self.weights
         
-        # 優化
         result = minimize(
             objective,
             init_weights,
+            jac=gradient,
             method="SLSQP",
             bounds=bounds,
-            constraints={"type": "eq", "fun": lambda w: np.sum(w) - 1}
+            constraints=_budget_constraint()
         )
         
         self.weights = result.x
@@ -98,13 +510,16 @@ class PortfolioOptimizer:
     
     def _portfolio_return(self, weights: np.ndarray) -> float:
         """計算組合預期收益"""
-        return np.dot(weights, self.returns.mean() * 252)
+        return weights @ self.mean_returns
     
     def _portfolio_volatility(self, weights: np.ndarray) -> float:
         """計算組合波動率"""
-        return np.sqrt(
-            np.dot(weights, np.dot(self.covariance * 252, weights))
-        )
+        return np.sqrt(weights @ self.cov_matrix @ weights)
+    
+    def _portfolio_volatility_gradient(self, weights: np.ndarray) -> np.ndarray:
+        """∂σ/∂w = Σw / σ"""
+        marginal = self.cov_matrix @ weights
+        return marginal / np.sqrt(weights @ marginal)
     
     def _sharpe_ratio(self, weights: np.ndarray) -> float:
         """夏普比率（負值，用於最小化）"""
@@ -117,15 +532,23 @@ class PortfolioOptimizer:
         sharpe = (p_return - self.risk_free_rate) / p_vol
         return -sharpe  # 最小化負值 = 最大化夏普
     
-    def _risk_parity_objective(self, weights: np.ndarray) -> float:
-        """風險平價目標"""
-        port_vol = self._portfolio_volatility(weights)
-        marginal_contrib = np.dot(self.covariance * 252, weights)
-        risk_contrib = weights * marginal_contrib / port_vol
+    def _sharpe_ratio_gradient(self, weights: np.ndarray) -> np.ndarray:
+        """負夏普比率的梯度：-(μσ - (wᵀμ - r_f) Σw/σ) / σ²"""
+        marginal = self.cov_matrix @ weights
+        p_vol = np.sqrt(weights @ marginal)
         
-        target_risk = port_vol / len(weights)
+        if p_vol == 0:
+            return np.zeros_like(weights)
         
-        return np.sum((risk_contrib - target_risk) ** 2)
+        excess = self._portfolio_return(weights) - self.risk_free_rate
+        return -(self.mean_returns * p_vol - excess * marginal / p_vol) / p_vol ** 2
+    
+    def _risk_parity_objective(self, weights: np.ndarray) -> float:
+        """風險平價目標"""
+        return _risk_parity_objective(weights, self.cov_matrix)
+    
+    def _risk_parity_gradient(self, weights: np.ndarray) -> np.ndarray:
+        return _risk_parity_gradient(weights, self.cov_matrix)
     
     def get_portfolio_metrics(self) -> Dict:
         """計算組合指標"""
@@ -145,35 +568,266 @@ class PortfolioOptimizer:
     
     def efficient_frontier(
         self,
-        n_points: int = 50
-    ) -> Tuple[np.ndarray, np.ndarray]:
-        """計算有效前沿"""
-        returns_range = np.linspace(
-            self.returns.mean().min() * 252,
-            self.returns.mean().max() * 252,
-            n_points
-        )
+        n_points: int = 50,
+        return_weights: bool = False,
+        method: str = "cla"
+    ) -> Tuple[np.ndarray, ...]:
+        """
+        計算有效前沿（最小方差組合到最高收益組合之間等收益間隔的 n_points 個點）
+        
+        Args:
+            n_points: 前沿點數
+            return_weights: 同時返回每個點的權重（n_points × N）
+            method: "cla"（臨界線算法，精確解路徑）或 "slsqp"（逐點求解，每點以相鄰點熱啟動）
         
-        frontier_vols = []
-        frontier_rets = []
+        Returns:
+            (波動率, 預期收益) 或 (波動率, 預期收益, 權重)
+        """
+        if self.mean_returns is None:
+            raise ValueError("Optimizer must be fitted before computing the frontier")
+        
+        if method == "cla":
+            vols, rets, weights = CriticalLineAlgorithm(self.mean_returns, self.cov_matrix).frontier(n_points)
+        elif method == "slsqp":
+            vols, rets, weights = self._frontier_slsqp(n_points)
+        else:
+            raise ValueError(f"Unknown frontier method: {method}")
+        
+        if return_weights:
+            return vols, rets, weights
+        return vols, rets
+    
+    def _frontier_slsqp(self, n_points: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """逐點 SLSQP：從最高收益端向下，每點以上一個解熱啟動"""
+        n = len(self.mean_returns)
+        min_vol = _minimize_on_simplex(self._portfolio_volatility, self._portfolio_volatility_gradient, n)
+        returns_range = np.linspace(self._portfolio_return(min_vol), self.mean_returns.max(), n_points)
+        
+        w = np.zeros(n)
+        w[np.argmax(self.mean_returns)] = 1.0
+        frontier_vols, frontier_rets, frontier_weights = [], [], []
         
-        for target_ret in returns_range:
+        for target_ret in returns_range[::-1]:
             result = minimize(
                 self._portfolio_volatility,
-                np.ones(len(self.returns.columns)) / len(self.returns.columns),
+                w,
+                jac=self._portfolio_volatility_gradient,
                 method="SLSQP",
-                bounds=tuple((0, 1) for _ in self.returns.columns),
+                bounds=tuple((0, 1) for _ in range(n)),
                 constraints=[
-                    {"type": "eq", "fun": lambda w: np.sum(w) - 1},
-                    {"type": "eq", "fun": lambda w: self._portfolio_return(w) - target_ret}
+                    _budget_constraint(),
+                    {
+                        "type": "eq",
+                        "fun": lambda w, target=target_ret: self._portfolio_return(w) - target,
+                        "jac": lambda w: self.mean_returns
+                    }
                 ]
             )
             
             if result.success:
+                w = result.x
                 frontier_vols.append(result.fun)
                 frontier_rets.append(target_ret)
+                frontier_weights.append(w)
+        
+        return (
+            np.array(frontier_vols[::-1]),
+            np.array(frontier_rets[::-1]),
+            np.array(frontier_weights[::-1]).reshape(-1, n)
+        )
+
+
+class LargeScaleOptimizer(PortfolioOptimizer):
+    """
+    大規模組合優化（數千資產）
+    
+    協方差取因子形式 B F Bᵀ + D（默認由協方差估計器做主成分分解，也可傳入風險模型），
+    問題交給 QPSolver（內置 ADMM 或 OSQP），全程不構造 N×N 協方差；
+    支持箱體、分組、換手約束，權重與指標接口同 PortfolioOptimizer
+    
+    - min_volatility: min wᵀΣw
+    - mean_variance: min ½γ wᵀΣw - μᵀw
+    - max_sharpe: 最優點滿足 min ½wᵀΣw - λμᵀw 的最優性條件且 λ = σ²/(μᵀw - r_f)，
+                  對 λ 做不動點迭代，每步只改線性項（不重新分解）並熱啟動
+    
+    Example:
+        >>> optimizer = LargeScaleOptimizer(optimization_method="max_sharpe")
+        >>> weights = optimizer.fit(returns, {"max_weight": 0.02, "max_turnover": 0.2,
+        ...                                   "previous_weights": current})
+    """
+    
+    METHODS = ("max_sharpe", "min_volatility", "mean_variance")
+    
+    def __init__(
+        self,
+        risk_free_rate: float = 0.02,
+        optimization_method: str = "max_sharpe",
+        covariance_estimator: Optional[CovarianceEstimator] = None,
+        risk_aversion: float = 1.0,
+        n_factors: int = 20,
+        backend: str = "auto",
+        **solver_kwargs
+    ):
+        """
+        Args:
+            risk_aversion: mean_variance 的風險厭惡係數 γ
+            n_factors: 由估計器做主成分分解時的因子數
+            backend: QPSolver 後端，"auto" / "admm" / "osqp"
+            **solver_kwargs: 傳給 QPSolver 的容差等參數
+        """
+        if optimization_method not in self.METHODS:
+            raise ValueError(f"Unsupported large-scale objective: {optimization_method}")
+        
+        super().__init__(
+            risk_free_rate,
+            optimization_method,
+            covariance_estimator or CovarianceEstimator("factor", n_factors=n_factors)
+        )
+        self.risk_aversion = risk_aversion
+        self.n_factors = n_factors
+        self.backend = backend
+        self.solver_kwargs = solver_kwargs
+        self.scaled_loadings = None
+        self.specific_var = None
+        self.solve_info = None
+    
+    def _vector(self, value, default: float) -> np.ndarray:
+        """標量、數組或 {資產: 值} 轉為按列順序的向量"""
+        columns = self.returns.columns
+        if value is None:
+            return np.full(len(columns), default)
+        if isinstance(value, (dict, pd.Series)):
+            return pd.Series(value, dtype=np.float64).reindex(columns).fillna(default).to_numpy()
+        return np.broadcast_to(np.asarray(value, dtype=np.float64), (len(columns),)).copy()
+    
+    def fit(
+        self,
+        returns: pd.DataFrame,
+        constraints: Optional[Dict] = None,
+        factor_model: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+    ) -> np.ndarray:
+        """
+        擬合最優權重
+        
+        Args:
+            returns: 資產收益率 DataFrame
+            constraints: min_weight / max_weight（標量、數組或 {資產: 值}）, long_only,
+                         groups {名稱: (資產列表, 下限, 上限)}, previous_weights, max_turnover（Σ|w - w₀|）
+            factor_model: 日度 (B, F, D) 風險模型，None 時由協方差估計器得到
+        
+        Returns:
+            最優權重數組
+        """
+        self.returns = returns
+        constraints = constraints or {}
+        columns = returns.columns
+        
+        loadings, factor_cov, specific_var = (
+            factor_model if factor_model is not None
+            else self.covariance_estimator.factor_form(returns)
+        )
+        factor_cov = np.atleast_2d(factor_cov) * 252
+        self.specific_var = np.asarray(specific_var, dtype=np.float64) * 252
+        self.mean_returns = returns.mean().to_numpy(dtype=np.float64) * 252
+        self.scaled_loadings = np.asarray(loadings, dtype=np.float64) @ np.linalg.cholesky(
+            factor_cov + 1e-12 * np.eye(len(factor_cov))
+        )
+        self.covariance = None
+        self.cov_matrix = None
+        
+        lower = self._vector(constraints.get("min_weight"), 0.0)
+        upper = self._vector(constraints.get("max_weight"), 1.0)
+        if constraints.get("long_only", True):
+            lower = np.maximum(lower, 0.0)
+        
+        groups = [
+            (np.flatnonzero(columns.isin(members)), group_lower, group_upper)
+            for members, group_lower, group_upper in constraints.get("groups", {}).values()
+        ]
+        previous = constraints.get("previous_weights")
+        
+        problem = factor_portfolio_qp(
+            self.mean_returns,
+            self.scaled_loadings,
+            np.eye(self.scaled_loadings.shape[1]),
+            self.specific_var,
+            risk_aversion=self.risk_aversion if self.optimization_method == "mean_variance" else 1.0,
+            lower=lower,
+            upper=upper,
+            groups=groups,
+            previous_weights=None if previous is None else self._vector(previous, 0.0),
+            max_turnover=constraints.get("max_turnover")
+        )
+        if self.optimization_method == "min_volatility":
+            problem["q"] = np.zeros_like(problem["q"])
+        
+        solver = QPSolver(self.backend, **self.solver_kwargs).setup(
+            problem["P"], problem["q"], problem["A"], problem["l"], problem["u"]
+        )
+        if self.optimization_method == "max_sharpe":
+            start = previous if previous is not None else np.full(len(columns), 1 / len(columns))
+            result = self._max_sharpe(solver, problem["q"], self._vector(start, 0.0))
+        else:
+            result = self._checked(solver.solve())
+        
+        self.solve_info = {key: result[key] for key in ("status", "polished", "iterations", "solve_time")}
+        self.weights = result["x"][:len(columns)]
+        return self.weights
+    
+    @staticmethod
+    def _checked(result: Dict) -> Dict:
+        """QP 未求解成功時報錯（不可行或未收斂的解不作為權重）"""
+        status = result["status"]
+        if status == "primal infeasible":
+            raise ValueError("Portfolio constraints are infeasible (e.g. group bounds vs. turnover cap)")
+        if status != "solved":
+            raise ValueError(f"Large-scale optimization failed: {status}")
+        return result
+    
+    def _max_sharpe(
+        self,
+        solver: QPSolver,
+        q_mean: np.ndarray,
+        start: np.ndarray,
+        max_iter: int = 20,
+        tol: float = 1e-3
+    ) -> Dict:
+        """λ 不動點迭代，初值取起始權重的 σ²/超額收益"""
+        n = len(start)
+        
+        def excess_and_variance(w):
+            return self._portfolio_return(w) - self.risk_free_rate, self._portfolio_volatility(w) ** 2
+        
+        excess, variance = excess_and_variance(start)
+        lam = variance / excess if excess > 0 else 1.0
+        iterations, solve_time = 0, 0.0
         
-        return np.array(frontier_vols), np.array(frontier_rets)
+        for _ in range(max_iter):
+            result = self._checked(solver.update_q(lam * q_mean).solve())
+            iterations += result["iterations"]
+            solve_time += result["solve_time"]
+            
+            excess, variance = excess_and_variance(result["x"][:n])
+            if excess <= 0:
+                raise ValueError("No feasible portfolio with positive excess return")
+            
+            new_lam = variance / excess
+            if abs(new_lam - lam) <= tol * lam:
+                break
+            lam = new_lam
+        
+        return {**result, "iterations": iterations, "solve_time": solve_time}
+    
+    def _portfolio_volatility(self, weights: np.ndarray) -> float:
+        """因子形式：σ² = ‖Lᵀw‖² + Σ D w²"""
+        exposure = self.scaled_loadings.T @ weights
+        return np.sqrt(exposure @ exposure + self.specific_var @ weights ** 2)
+    
+    def efficient_frontier(self, *args, **kwargs) -> Tuple[np.ndarray, ...]:
+        """有效前沿（需要稠密協方差，按因子形式展開一次）"""
+        if self.cov_matrix is None:
+            self.cov_matrix = self.scaled_loadings @ self.scaled_loadings.T + np.diag(self.specific_var)
+        return super().efficient_frontier(*args, **kwargs)
 
 
 class BlackLitterman:
@@ -257,83 +911,178 @@ class BlackLitterman:
 
 
 class RiskParity:
-    """風險平價策略"""
+    """
+    風險平價 / 風險預算策略
     
-    def __init__(self):
+    求解 Spinu 凸形式 min ½xᵀΣx - Σ b_i log x_i（有 Numba 時先循環坐標下降，未收斂再以阻尼牛頓法精修），
+    收斂到 max |x_i(Σx)_i - b_i| / b_i < tol，solve_info["converged"] 標記是否達到；對相同資產重複擬合時自動以上一次權重熱啟動
+    
+    Example:
+        >>> rp = RiskParity(risk_budgets={"SPY": 0.5, "TLT": 0.3, "GLD": 0.2})
+        >>> weights = rp.fit(returns)
+    """
+    
+    def __init__(
+        self,
+        covariance_estimator: Optional[CovarianceEstimator] = None,
+        risk_budgets: Optional[Union[Dict[str, float], pd.Series, np.ndarray]] = None,
+        tol: float = 1e-10
+    ):
+        """
+        Args:
+            covariance_estimator: 協方差估計器（默認樣本協方差）
+            risk_budgets: 風險預算（{資產: 預算}、Series 或數組，自動歸一化），None 為等風險貢獻
+            tol: 收斂門檻
+        """
+        self.covariance_estimator = covariance_estimator or CovarianceEstimator()
+        self.risk_budgets = risk_budgets
+        self.tol = tol
         self.weights = None
+        self.assets = None
+        self.solve_info = None
     
-    def fit(self, returns: pd.DataFrame) -> np.ndarray:
-        """擬合風險平價權重"""
-        cov = returns.cov() * 252
+    def fit(
+        self,
+        returns: pd.DataFrame,
+        risk_budgets: Optional[Union[Dict[str, float], pd.Series, np.ndarray]] = None,
+        previous_weights: Optional[Union[pd.Series, np.ndarray]] = None
+    ) -> np.ndarray:
+        """
+        擬合風險預算權重
         
-        def risk_parity_objective(w, cov):
-            vol = np.sqrt(np.dot(w, np.dot(cov, w)))
-            risk_contrib = w * np.dot(cov, w) / vol
-            target = vol / len(w)
-            return np.sum((risk_contrib - target) ** 2)
+        Args:
+            returns: 資產收益率 DataFrame
+            risk_budgets: 覆蓋構造時的風險預算
+            previous_weights: 熱啟動權重，None 時沿用上一次擬合的結果（資產相同時）
         
-        n = len(returns.columns)
-        init = np.ones(n) / n
+        Returns:
+            權重數組
+        """
+        cov = np.asarray(self.covariance_estimator.estimate(returns), dtype=np.float64) * 252
+        columns = list(returns.columns)
         
-        result = minimize(
-            risk_parity_objective,
-            init,
-            args=(cov,),
-            method="SLSQP",
-            bounds=tuple((0, 1) for _ in range(n)),
-            constraints={"type": "eq", "fun": lambda w: np.sum(w) - 1}
-        )
+        budgets = risk_budgets if risk_budgets is not None else self.risk_budgets
+        if isinstance(budgets, (dict, pd.Series)):
+            budgets = pd.Series(budgets, dtype=np.float64).reindex(columns).to_numpy()
         
- = result.x
-        self.weights        return self.weights
+        if isinstance(previous_weights, pd.Series):
+            previous_weights = previous_weights.reindex(columns).to_numpy()
+        elif previous_weights is None and self.assets == columns:
+            previous_weights = self.weights
+        
+        start = time.perf_counter()
+        self.weights, info = _risk_budget_weights(cov, budgets, previous_weights, self.tol)
+        self.assets = columns
+        self.solve_info = {**info, "solve_time": time.perf_counter() - start}
+        return self.weights
 
 
 class MeanVarianceCVaR:
-    """均值-CVaR 優化"""
+    """
+    均值-CVaR 優化（Rockafellar-Uryasev 線性規劃）
+    
+    原問題（T 個等權情境，c = 1/((1-α)T)）：
+        min ζ + c Σ u_t
+        s.t. u_t >= -r_tᵀw - ζ, u_t >= 0, Σw = 1, (μᵀw = 目標收益), l <= w <= h
     
-    def __init__(self, cvar_alpha: float = 0.95):
+    原問題有 T 行約束，單純形基的規模隨情境數增長；實際求解其對偶（只有 N + 1 行）：
+        max ν + τη + lᵀa - hᵀb
+        s.t. Rᵀp + ν1 + ημ + a - b = 0, Σp = 1, 0 <= p <= c, a, b >= 0
+    權重和 VaR（ζ）取自對偶問題等式約束的乘子，目標值即 CVaR；
+    約束矩陣稀疏存儲，交給 HiGHS 求解，數萬情境 × 數百資產可直接求解
+    """
+    
+    def __init__(self, cvar_alpha: float = 0.95, method: str = "highs-ipm"):
         """
         Args:
             cvar_alpha: 置信水平
+            method: linprog 的 HiGHS 方法："highs-ipm"（內點法，大規模時最快）, "highs-ds"（對偶單純形）, "highs"（自動選擇）
         """
         self.cvar_alpha = cvar_alpha
+        self.method = method
         self.weights = None
-    
-    def _cvar(self, weights: np.ndarray, returns: np.ndarray) -> float:
-        """計算 CVaR"""
-        port_returns = returns @ weights
-        var_threshold = np.percentile(port_returns, (1 - self.cvar_alpha) * 100)
-        cvar = -np.mean(port_returns[port_returns <= var_threshold])
-        return cvar
+        self.var = None
+        self.cvar = None
+        self.solve_info = None
     
     def fit(
         self,
         returns: pd.DataFrame,
-        target_return: Optional[float] = None
+        target_return: Optional[float] = None,
+        constraints: Optional[Dict] = None
     ) -> np.ndarray:
-        """擬合"""
-        n = len(returns.columns)
-        ret_array = returns.values
+        """
+        擬合最小 CVaR 權重
+        
+        Args:
+            returns: 情境收益率（行為情境，列為資產）
+            target_return: 目標收益（每期，與 returns 同頻率），None 為不約束
+            constraints: min_weight / max_weight（標量或逐資產數組）, long_only
         
-        init = np.ones(n) / n
+        Returns:
+            最優權重數組
+        """
+        constraints = constraints or {}
+        ret_array = returns.to_numpy(dtype=np.float64)
+        n_scenarios, n = ret_array.shape
         
-        constraints = [{"type": "eq", "fun": lambda w: np.sum(w) - 1}]
+        lower = np.broadcast_to(np.asarray(constraints.get("min_weight", 0.0), dtype=np.float64), (n,))
+        upper = np.broadcast_to(np.asarray(constraints.get("max_weight", 1.0), dtype=np.float64), (n,))
+        if constraints.get("long_only", True):
+            lower = np.maximum(lower, 0.0)
+        has_lower = np.isfinite(lower)
+        has_upper = np.isfinite(upper)
+        identity = sparse.identity(n, format="csr")
+        
+        # 對偶變量 [p, ν, (η), a, b]，linprog 求最小化，目標取負
+        columns = [sparse.csr_matrix(ret_array.T), sparse.csr_matrix(np.ones((n, 1)))]
+        cost = [np.zeros(n_scenarios), [-1.0]]
+        upper_bounds = [np.full(n_scenarios, 1 / ((1 - self.cvar_alpha) * n_scenarios)), [np.inf]]
+        lower_bounds = [np.zeros(n_scenarios), [-np.inf]]
         
         if target_return is not None:
-            constraints.append({
-                "type": "eq",
-                "fun": lambda w: returns.mean() @ w - target_return
-            })
+            columns.append(sparse.csr_matrix(ret_array.mean(axis=0)[:, None]))
+            cost.append([-target_return])
+            upper_bounds.append([np.inf])
+            lower_bounds.append([-np.inf])
         
-        result = minimize(
-            lambda w: self._cvar(w, ret_array),
-            init,
-            method="SLSQP",
-            bounds=tuple((0, 1) for _ in range(n)),
-            constraints=constraints
+        columns += [identity[:, has_lower], -identity[:, has_upper]]
+        cost += [-lower[has_lower], upper[has_upper]]
+        n_bound_vars = has_lower.sum() + has_upper.sum()
+        upper_bounds.append(np.full(n_bound_vars, np.inf))
+        lower_bounds.append(np.zeros(n_bound_vars))
+        
+        weight_rows = sparse.hstack(columns, format="csr")
+        simplex_row = sparse.hstack([
+            sparse.csr_matrix(np.ones((1, n_scenarios))),
+            sparse.csr_matrix((1, weight_rows.shape[1] - n_scenarios))
+        ], format="csr")
+        
+        start = time.perf_counter()
+        result = linprog(
+            np.concatenate(cost),
+            A_eq=sparse.vstack([weight_rows, simplex_row], format="csr"),
+            b_eq=np.concatenate([np.zeros(n), [1.0]]),
+            bounds=np.column_stack([np.concatenate(lower_bounds), np.concatenate(upper_bounds)]),
+            method=self.method
         )
+        solve_time = time.perf_counter() - start
         
-        self.weights = result.x
+        # 對偶無界即原問題不可行
+        if result.status == 3:
+            raise ValueError("CVaR problem is infeasible for the given target return and weight bounds")
+        if not result.success:
+            raise ValueError(f"CVaR optimization failed: {result.message}")
+        
+        multipliers = -result.eqlin.marginals
+        self.weights = multipliers[:n]
+        self.var = multipliers[n]
+        self.cvar = -result.fun
+        self.solve_info = {
+            "status": result.message,
+            "iterations": result.nit,
+            "solve_time": solve_time
+        }
         return self.weights
 
 
@@ -0,0 +1,579 @@
+"""
+凸二次規劃模組
+支持：ADMM 求解器（OSQP 算法：稀疏分解 + 稠密行低秩修正、Ruiz 均衡、自適應 ρ、有效集精修、熱啟動）、
+      可選 OSQP 後端、因子形式協方差（B F Bᵀ + D）的組合優化問題構造
+      （箱體、分組、換手約束）
+"""
+
+import numpy as np
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+from scipy import sparse
+from scipy.linalg import lu_factor, lu_solve
+from scipy.sparse.linalg import splu
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# 嘗試導入 OSQP，不可用時使用內置 ADMM 實現
+try:
+    import osqp
+    HAS_OSQP = True
+except ImportError:
+    HAS_OSQP = False
+
+
+class QPSolver:
+    """
+    凸二次規劃：min ½xᵀPx + qᵀx  s.t.  l <= Ax <= u
+
+    內置實現為 OSQP 的 ADMM 迭代：
+    - 約簡系統 P + σI + AᵀRA 只在 ρ 顯著變化時重新分解，稠密約束行（因子、預算、分組）
+      以 Woodbury 低秩修正處理，避免 N×N 稠密填充
+    - Ruiz 均衡縮放，殘差按原問題尺度判斷收斂
+    - update_q 只改線性項（不重新分解），配合熱啟動可快速求解一族問題
+
+    Example:
+        >>> solver = QPSolver().setup(P, q, A, l, u)
+        >>> result = solver.solve()
+        >>> result = solver.update_q(q2).solve()
+    """
+
+    BACKENDS = ("auto", "admm", "osqp")
+
+    def __init__(
+        self,
+        backend: str = "auto",
+        eps_abs: float = 1e-5,
+        eps_rel: float = 1e-5,
+        max_iter: int = 10000,
+        rho: float = 100.0,
+        sigma: float = 1e-6,
+        alpha: float = 1.6,
+        scaling: int = 10,
+        adaptive_rho_interval: int = 100,
+        polish: bool = True,
+        polish_refine_iter: int = 3,
+        polish_max_iter: int = 10,
+        polish_retries: int = 2,
+        dense_row_threshold: int = 32,
+        eps_prim_inf: float = 1e-4,
+        eps_dual_inf: float = 1e-4
+    ):
+        """
+        Args:
+            backend: "admm"（內置）, "osqp"（需要 osqp 包）, "auto"（有 osqp 時用 osqp）
+            eps_abs / eps_rel: 原始、對偶殘差的絕對 / 相對容差
+            max_iter: 最大迭代次數
+            rho: ADMM 懲罰參數初值
+            sigma: x 方向的正則化
+            alpha: 鬆弛參數
+            scaling: Ruiz 均衡迭代次數，0 為不縮放
+            adaptive_rho_interval: 每多少次迭代檢查一次是否調整 ρ
+            polish: 收斂後按有效約束集精修解
+            polish_refine_iter: 精修時的迭代精化次數
+            polish_max_iter: 精修的有效集迭代上限
+            polish_retries: 精修失敗後收緊容差（每次 ×0.1）重試的次數
+            dense_row_threshold: 非零元多於此值的約束行以低秩修正處理，不進入稀疏分解
+            eps_prim_inf / eps_dual_inf: 原始、對偶不可行證書的容差
+        """
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown QP backend: {backend}")
+        if backend == "osqp" and not HAS_OSQP:
+            raise ValueError("osqp is not installed")
+
+        self.backend = "osqp" if backend == "auto" and HAS_OSQP else backend
+        if self.backend == "auto":
+            self.backend = "admm"
+        self.eps_abs = eps_abs
+        self.eps_rel = eps_rel
+        self.max_iter = max_iter
+        self.rho = rho
+        self.sigma = sigma
+        self.alpha = alpha
+        self.scaling = scaling
+        self.adaptive_rho_interval = adaptive_rho_interval
+        self.polish = polish
+        self.polish_refine_iter = polish_refine_iter
+        self.polish_max_iter = polish_max_iter
+        self.polish_retries = polish_retries
+        self.dense_row_threshold = dense_row_threshold
+        self.eps_prim_inf = eps_prim_inf
+        self.eps_dual_inf = eps_dual_inf
+
+        self.x = None
+        self.z = None
+        self.y = None
+
+    def _equilibrate(self, P: sparse.csc_matrix, q: np.ndarray, A: sparse.csc_matrix):
+        """Ruiz 均衡：P̄ = c·DPD, q̄ = c·Dq, Ā = EAD"""
+        n, m = P.shape[0], A.shape[0]
+        D, E, c = np.ones(n), np.ones(m), 1.0
+
+        def clip(norms):
+            norms = np.where(norms < 1e-4, 1.0, norms)
+            return np.minimum(norms, 1e4)
+
+        for _ in range(self.scaling):
+            col_P = np.abs(P).max(axis=0).toarray().ravel() if P.nnz else np.zeros(n)
+            col_A = np.abs(A).max(axis=0).toarray().ravel() if A.nnz else np.zeros(n)
+            row_A = np.abs(A).max(axis=1).toarray().ravel() if A.nnz else np.zeros(m)
+            d = 1 / np.sqrt(clip(np.maximum(col_P, col_A)))
+            e = 1 / np.sqrt(clip(row_A))
+            P = sparse.diags(d) @ P @ sparse.diags(d)
+            A = sparse.diags(e) @ A @ sparse.diags(d)
+            q = d * q
+            D, E = D * d, E * e
+
+            # 目標函數整體縮放（‖q‖ 先單獨截斷：q = 0 時取 1，不讓 P 的小列範數把 c 放大）
+            mean_col = np.abs(P).max(axis=0).toarray().mean() if P.nnz else 0.0
+            q_norm = float(clip(np.abs(q).max(initial=0.0)))
+            scale = 1 / float(clip(max(mean_col, q_norm)))
+            P, q, c = P * scale, q * scale, c * scale
+
+        return P.tocsc(), q, A.tocsc(), D, E, c
+
+    def setup(
+        self,
+        P: sparse.spmatrix,
+        q: np.ndarray,
+        A: sparse.spmatrix,
+        l: np.ndarray,
+        u: np.ndarray
+    ) -> "QPSolver":
+        """設定問題（P 只取上三角或完整對稱矩陣均可，內部使用完整矩陣）"""
+        P = sparse.csc_matrix(P, dtype=np.float64)
+        A = sparse.csc_matrix(A, dtype=np.float64)
+        self.n, self.m = P.shape[0], A.shape[0]
+        self.P, self.A = P, A
+        self.q = np.asarray(q, dtype=np.float64)
+        self.l = np.asarray(l, dtype=np.float64)
+        self.u = np.asarray(u, dtype=np.float64)
+        self.x = self.z = self.y = None
+
+        if self.backend == "osqp":
+            self._osqp = osqp.OSQP()
+            self._osqp.setup(
+                sparse.triu(P, format="csc"), self.q, A, self.l, self.u,
+                eps_abs=self.eps_abs, eps_rel=self.eps_rel, max_iter=self.max_iter,
+                rho=self.rho, sigma=self.sigma, alpha=self.alpha, polish=self.polish, verbose=False
+            )
+            return self
+
+        self.P_s, self.q_s, self.A_s, self.D, self.E, self.c = (
+            self._equilibrate(P, self.q, A) if self.scaling else
+            (P, self.q.copy(), A, np.ones(self.n), np.ones(self.m), 1.0)
+        )
+        self.l_s = np.where(np.isfinite(self.l), self.l * self.E, -np.inf)
+        self.u_s = np.where(np.isfinite(self.u), self.u * self.E, np.inf)
+        self.dense_rows = np.diff(self.A_s.tocsr().indptr) > self.dense_row_threshold
+        self._factorize(self.rho)
+        return self
+
+    def _rho_vector(self, rho: float) -> np.ndarray:
+        """等式約束的 ρ 放大 1000 倍，無界約束取極小值（與 OSQP 一致）"""
+        rho_vec = np.full(self.m, float(rho))
+        rho_vec[self.u_s - self.l_s < 1e-8] = rho * 1e3
+        rho_vec[np.isinf(self.l_s) & np.isinf(self.u_s)] = 1e-6
+        return rho_vec
+
+    def _reduced_solver(self, rho_vec: np.ndarray, regularization: float) -> Callable:
+        """
+        分解約簡系統 M = P + εI + AᵀRA（R = diag(ρ)，ρ = 0 的行不參與），返回 M⁻¹ 的求解函數
+
+        稠密行（因子、預算、分組等，非零元多於 dense_row_threshold）不進入稀疏分解，
+        以 Woodbury 低秩修正處理：稀疏部分通常是（塊）對角的，分解和回代都是 O(N)
+        """
+        dense = self.dense_rows & (rho_vec > 0)
+        rows = ~self.dense_rows & (rho_vec > 0)
+        A_sparse = self.A_s[rows]
+        M = (
+            self.P_s
+            + regularization * sparse.identity(self.n)
+            + A_sparse.T @ sparse.diags(rho_vec[rows]) @ A_sparse
+        )
+        factor = splu(M.tocsc(), permc_spec="MMD_AT_PLUS_A")
+
+        A_dense = self.A_s[dense]
+        if not A_dense.shape[0]:
+            return factor.solve
+
+        woodbury = factor.solve(A_dense.T.toarray())
+        capacitance = lu_factor(np.diag(1 / rho_vec[dense]) + A_dense @ woodbury)
+
+        def solve(rhs: np.ndarray) -> np.ndarray:
+            solution = factor.solve(rhs)
+            return solution - woodbury @ lu_solve(capacitance, A_dense @ solution)
+
+        return solve
+
+    def _factorize(self, rho: float):
+        self.rho_value = rho
+        self.rho_vec = self._rho_vector(rho)
+        self._solve_reduced = self._reduced_solver(self.rho_vec, self.sigma)
+
+    def update_q(self, q: np.ndarray) -> "QPSolver":
+        """只更新線性項（保留分解與上一次的解作為熱啟動）"""
+        self.q = np.asarray(q, dtype=np.float64)
+        if self.backend == "osqp":
+            self._osqp.update(q=self.q)
+        else:
+            self.q_s = self.c * self.D * self.q
+        return self
+
+    def warm_start(self, x: np.ndarray, y: Optional[np.ndarray] = None) -> "QPSolver":
+        """以給定的原始（及對偶）變量熱啟動"""
+        x = np.asarray(x, dtype=np.float64)
+        y = np.zeros(self.m) if y is None else np.asarray(y, dtype=np.float64)
+        if self.backend == "osqp":
+            self._osqp.warm_start(x=x, y=y)
+        else:
+            self.x = x / self.D
+            self.z = self.A_s @ self.x
+            self.y = self.c * y / self.E
+        return self
+
+    def _residuals(self, x, z, y) -> Dict:
+        """原問題尺度下的原始 / 對偶殘差及計算收斂門檻、自適應 ρ 所需的範數"""
+        Ax = self.A_s @ x
+        Px = self.P_s @ x
+        Aty = self.A_s.T @ y
+        inv_E, inv_D = 1 / self.E, 1 / self.D
+
+        def norm(v):
+            return np.abs(v).max(initial=0.0)
+
+        return {
+            "prim": norm(inv_E * (Ax - z)),
+            "prim_scale": max(norm(inv_E * Ax), norm(inv_E * z)),
+            "dual": norm(inv_D * (Px + self.q_s + Aty)) / self.c,
+            "dual_scale": max(norm(inv_D * Px), norm(inv_D * Aty), norm(inv_D * self.q_s)) / self.c
+        }
+
+    def _primal_infeasible(self, delta_y: np.ndarray) -> bool:
+        """
+        原始不可行證書（OSQP）：δy 投影到 [l, u] 回收錐的極錐後滿足
+        ‖Aᵀδy‖ ≈ 0 且 uᵀmax(δy, 0) + lᵀmin(δy, 0) < 0
+        """
+        delta_y = np.where(np.isinf(self.u_s), np.minimum(delta_y, 0.0), delta_y)
+        delta_y = np.where(np.isinf(self.l_s), np.maximum(delta_y, 0.0), delta_y)
+        norm = np.abs(self.E * delta_y).max(initial=0.0)
+        if norm < 1e-30:
+            return False
+
+        tol = self.eps_prim_inf * norm
+        support = (
+            np.where(delta_y > 0, self.u_s, 0.0) @ np.maximum(delta_y, 0.0)
+            + np.where(delta_y < 0, self.l_s, 0.0) @ np.minimum(delta_y, 0.0)
+        )
+        return support < -tol and np.abs((self.A_s.T @ delta_y) / self.D).max(initial=0.0) < tol
+
+    def _dual_infeasible(self, delta_x: np.ndarray) -> bool:
+        """
+        對偶不可行（目標無界）證書：Pδx ≈ 0、qᵀδx < 0 且 Aδx 在 [l, u] 的回收錐內
+        """
+        norm = np.abs(self.D * delta_x).max(initial=0.0)
+        if norm < 1e-30:
+            return False
+
+        tol = self.eps_dual_inf * norm
+        if self.q_s @ delta_x >= -self.c * tol:
+            return False
+        if np.abs((self.P_s @ delta_x) / self.D).max(initial=0.0) >= self.c * tol:
+            return False
+
+        A_delta = (self.A_s @ delta_x) / self.E
+        return bool(
+            np.all(A_delta[np.isfinite(self.u_s)] <= tol)
+            and np.all(A_delta[np.isfinite(self.l_s)] >= -tol)
+        )
+
+    def _solve_active(self, lower: np.ndarray, upper: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        給定有效約束集求解等式約束 QP：正則化 KKT [[P + δI, Aᵀ], [A, -δI]] 消去乘子後
+        即約簡系統（有效行 ρ = 1/δ），再對精確 KKT 做迭代精化
+        """
+        active = lower | upper
+        A_active = self.A_s[active]
+        bound = np.where(lower, self.l_s, self.u_s)[active]
+
+        delta = 1e-7
+        solve = self._reduced_solver(np.where(active, 1 / delta, 0.0), delta)
+
+        x = np.zeros(self.n)
+        y_active = np.zeros(A_active.shape[0])
+        for _ in range(1 + self.polish_refine_iter):
+            r_dual = -self.q_s - self.P_s @ x - A_active.T @ y_active
+            r_prim = bound - A_active @ x
+            dx = solve(r_dual + A_active.T @ r_prim / delta)
+            x += dx
+            y_active += (A_active @ dx - r_prim) / delta
+
+        y = np.zeros(self.m)
+        y[active] = y_active
+        return x, y
+
+    def _polish(self, x, z, y, res: Dict) -> Tuple[np.ndarray, np.ndarray, bool]:
+        """
+        精修：以 ADMM 解猜測有效約束集，再做原始-對偶有效集迭代
+        （違反的約束加入、乘子符號錯誤的約束移出，直到有效集不變），
+        有效集收斂且殘差不差於 ADMM 解時採用
+
+        ADMM 的約束殘差在所有有效約束上累積，資產數多時目標值誤差遠大於容差，精修後為機器精度
+        """
+        equality = self.u_s - self.l_s < 1e-8
+        lower = (z - self.l_s < -y) | equality
+        upper = (self.u_s - z < y) & ~lower
+
+        for _ in range(self.polish_max_iter):
+            try:
+                x_polished, y_polished = self._solve_active(lower, upper)
+            except RuntimeError:
+                return x, y, False
+
+            Ax = self.A_s @ x_polished
+            next_lower = (-y_polished + (self.l_s - Ax) > 0) | equality
+            next_upper = (y_polished + (Ax - self.u_s) > 0) & ~next_lower
+            if np.array_equal(next_lower, lower) and np.array_equal(next_upper, upper):
+                break
+            lower, upper = next_lower, next_upper
+        else:
+            return x, y, False
+
+        z_polished = np.clip(self.A_s @ x_polished, self.l_s, self.u_s)
+        polished = self._residuals(x_polished, z_polished, y_polished)
+        if (
+            polished["prim"] <= max(res["prim"], self.eps_abs)
+            and polished["dual"] <= max(res["dual"], self.eps_abs)
+        ):
+            return x_polished, y_polished, True
+        return x, y, False
+
+    def solve(self) -> Dict:
+        """
+        求解（從上一次的解熱啟動）
+
+        Returns:
+            {"x", "y", "status", "polished", "iterations", "objective", "solve_time"}，
+            status 為 "solved" / "primal infeasible" / "dual infeasible" / "max_iter_reached"
+            （osqp 後端為其自身的狀態字符串）
+        """
+        start = time.perf_counter()
+
+        if self.backend == "osqp":
+            result = self._osqp.solve()
+            return {
+                "x": result.x,
+                "y": result.y,
+                "status": result.info.status,
+                "polished": result.info.status_polish == 1,
+                "iterations": result.info.iter,
+                "objective": result.info.obj_val,
+                "solve_time": time.perf_counter() - start
+            }
+
+        x = np.zeros(self.n) if self.x is None else self.x
+        z = np.zeros(self.m) if self.z is None else self.z
+        y = np.zeros(self.m) if self.y is None else self.y
+        eps_abs, eps_rel = self.eps_abs, self.eps_rel
+        iterations, polished = 0, False
+
+        # 精修失敗（有效集猜測不準）時收緊容差繼續迭代，再次精修
+        for _ in range(1 + self.polish_retries * self.polish):
+            x, z, y, res, status, n_iter = self._admm(x, z, y, eps_abs, eps_rel, self.max_iter - iterations)
+            iterations += n_iter
+            if not self.polish or status != "solved":
+                break
+            x_polished, y_polished, polished = self._polish(x, z, y, res)
+            if polished:
+                break
+            eps_abs, eps_rel = eps_abs / 10, eps_rel / 10
+
+        if status == "max_iter_reached":
+            logger.warning(f"QP did not converge in {self.max_iter} iterations")
+
+        self.x, self.z, self.y = x, z, y
+        if polished:
+            x, y = x_polished, y_polished
+
+        x_orig = self.D * x
+        return {
+            "x": x_orig,
+            "y": self.E * y / self.c,
+            "status": status,
+            "polished": polished,
+            "iterations": iterations,
+            "objective": 0.5 * x_orig @ (self.P @ x_orig) + self.q @ x_orig,
+            "solve_time": time.perf_counter() - start
+        }
+
+    def _admm(self, x, z, y, eps_abs: float, eps_rel: float, max_iter: int) -> Tuple:
+        """ADMM 迭代直到原始、對偶殘差低於容差，或相鄰迭代差給出不可行證書"""
+        alpha, sigma = self.alpha, self.sigma
+        status, res, iteration = "max_iter_reached", None, 0
+
+        for iteration in range(1, max_iter + 1):
+            x_prev, y_prev = x, y
+            x_tilde = self._solve_reduced(sigma * x - self.q_s + self.A_s.T @ (self.rho_vec * z - y))
+            z_tilde = self.A_s @ x_tilde
+
+            x = alpha * x_tilde + (1 - alpha) * x
+            z_relaxed = alpha * z_tilde + (1 - alpha) * z
+            z_new = np.clip(z_relaxed + y / self.rho_vec, self.l_s, self.u_s)
+            y = y + self.rho_vec * (z_relaxed - z_new)
+            z = z_new
+
+            if iteration % 10 and iteration != max_iter:
+                continue
+
+            res = self._residuals(x, z, y)
+            if (
+                res["prim"] <= eps_abs + eps_rel * res["prim_scale"]
+                and res["dual"] <= eps_abs + eps_rel * res["dual_scale"]
+            ):
+                status = "solved"
+                break
+            if self._primal_infeasible(y - y_prev):
+                status = "primal infeasible"
+                break
+            if self._dual_infeasible(x - x_prev):
+                status = "dual infeasible"
+                break
+
+            # 自適應 ρ：平衡相對原始、對偶殘差，變化超過 5 倍才重新分解
+            if iteration % self.adaptive_rho_interval == 0 and res["prim"] > 0 and res["dual"] > 0:
+                ratio = np.sqrt(
+                    (res["prim"] / max(res["prim_scale"], 1e-12))
+                    / (res["dual"] / max(res["dual_scale"], 1e-12))
+                )
+                rho = float(np.clip(self.rho_value * ratio, 1e-6, 1e6))
+                if rho > 5 * self.rho_value or rho < self.rho_value / 5:
+                    self._factorize(rho)
+
+        return x, z, y, res, status, iteration
+
+
+def _as_vector(value: Union[float, Sequence[float], np.ndarray], n: int) -> np.ndarray:
+    return np.broadcast_to(np.asarray(value, dtype=np.float64), (n,)).copy()
+
+
+def factor_portfolio_qp(
+    mean: np.ndarray,
+    loadings: np.ndarray,
+    factor_cov: np.ndarray,
+    specific_var: np.ndarray,
+    risk_aversion: float = 1.0,
+    lower: Union[float, np.ndarray] = 0.0,
+    upper: Union[float, np.ndarray] = 1.0,
+    groups: Optional[List[Tuple[np.ndarray, float, float]]] = None,
+    previous_weights: Optional[np.ndarray] = None,
+    max_turnover: Optional[float] = None
+) -> Dict:
+    """
+    構造因子形式的均值-方差組合問題（不生成 N×N 協方差）
+
+        min ½γ (yᵀy + wᵀDw) - μᵀw
+        s.t. y = Lᵀw（L = B·chol(F)）, Σw = 1, lower <= w <= upper,
+             分組 lo_g <= Σ_{i∈g} w_i <= hi_g,
+             換手 Σ|w - w₀| <= τ（輔助變量 d >= |w - w₀|）
+
+    Args:
+        mean: 預期收益 (N,)
+        loadings: 因子暴露 B (N, K)
+        factor_cov: 因子協方差 F (K, K)
+        specific_var: 特異方差 D (N,)
+        risk_aversion: 風險厭惡係數 γ
+        groups: [(成員布爾掩碼或下標, 下限, 上限), ...]
+        previous_weights: 當前權重 w₀
+        max_turnover: 單邊換手上限 τ（Σ|w - w₀|）
+
+    Returns:
+        {"P", "q", "A", "l", "u", "n_assets", "n_factors"}，變量順序為 [w, y, d]
+    """
+    mean = np.asarray(mean, dtype=np.float64)
+    n = len(mean)
+    factor_cov = np.atleast_2d(np.asarray(factor_cov, dtype=np.float64))
+    k = factor_cov.shape[0]
+
+    # 因子協方差開方後並入暴露，使 y 的二次項為單位矩陣
+    jitter = 1e-12 * max(np.trace(factor_cov) / max(k, 1), 1e-12)
+    chol = np.linalg.cholesky(factor_cov + jitter * np.eye(k)) if k else np.zeros((0, 0))
+    scaled_loadings = np.asarray(loadings, dtype=np.float64).reshape(n, k) @ chol
+
+    turnover = previous_weights is not None and max_turnover is not None
+    n_aux = n if turnover else 0
+    n_vars = n + k + n_aux
+
+    P = sparse.diags(
+        np.concatenate([
+            risk_aversion * _as_vector(specific_var, n),
+            np.full(k, risk_aversion),
+            np.zeros(n_aux)
+        ])
+    )
+    q = np.concatenate([-mean, np.zeros(k + n_aux)])
+
+    identity = sparse.identity(n)
+    rows = [
+        # y - Lᵀw = 0
+        sparse.hstack([-sparse.csr_matrix(scaled_loadings.T), sparse.identity(k), sparse.csr_matrix((k, n_aux))]),
+        # Σw = 1
+        sparse.hstack([sparse.csr_matrix(np.ones((1, n))), sparse.csr_matrix((1, k + n_aux))]),
+        # 箱體
+        sparse.hstack([identity, sparse.csr_matrix((n, k + n_aux))])
+    ]
+    lower_bounds = [np.zeros(k), [1.0], _as_vector(lower, n)]
+    upper_bounds = [np.zeros(k), [1.0], _as_vector(upper, n)]
+
+    for members, group_lower, group_upper in groups or []:
+        mask = np.zeros(n)
+        mask[np.asarray(members)] = 1.0
+        rows.append(sparse.hstack([sparse.csr_matrix(mask), sparse.csr_matrix((1, k + n_aux))]))
+        lower_bounds.append([group_lower])
+        upper_bounds.append([group_upper])
+
+    if turnover:
+        previous = _as_vector(previous_weights, n)
+        zeros_k = sparse.csr_matrix((n, k))
+        rows += [
+            # w - d <= w₀,  w + d >= w₀（兩者相加即 d >= 0，不另加約束以免有效集退化）
+            sparse.hstack([identity, zeros_k, -identity]),
+            sparse.hstack([identity, zeros_k, identity]),
+            # Σd <= τ
+            sparse.hstack([sparse.csr_matrix((1, n + k)), sparse.csr_matrix(np.ones((1, n)))])
+        ]
+        lower_bounds += [np.full(n, -np.inf), previous, [0.0]]
+        upper_bounds += [previous, np.full(n, np.inf), [max_turnover]]
+
+    return {
+        "P": P.tocsc(),
+        "q": q,
+        "A": sparse.vstack(rows, format="csc"),
+        "l": np.concatenate(lower_bounds),
+        "u": np.concatenate(upper_bounds),
+        "n_assets": n,
+        "n_factors": k
+    }
+
+
+# 便捷函數
+def solve_factor_portfolio(
+    mean: np.ndarray,
+    loadings: np.ndarray,
+    factor_cov: np.ndarray,
+    specific_var: np.ndarray,
+    risk_aversion: float = 1.0,
+    backend: str = "auto",
+    **constraints
+) -> Dict:
+    """
+    便捷函數：求解因子形式的均值-方差組合
+
+    Example:
+        >>> result = solve_factor_portfolio(mu, B, F, D, risk_aversion=5, upper=0.02)
+        >>> result["weights"]
+    """
+    problem = factor_portfolio_qp(mean, loadings, factor_cov, specific_var, risk_aversion, **constraints)
+    result = QPSolver(backend).setup(problem["P"], problem["q"], problem["A"], problem["l"], problem["u"]).solve()
+    result["weights"] = result["x"][:problem["n_assets"]]
+    return result
@@ -3,6 +3,10 @@ Risk Manager - 風險管理器
 從 var_model 導入
 """
 
-from .var_model import VaRCalculator, RiskManager
+from .var_model import (
+    VaRCalculator, RiskManager, VaRBacktester, VaRDecomposition, OptionPortfolioVaR
+)
 
-__all__ = ["VaRCalculator", "RiskManager"]
+__all__ = [
+    "VaRCalculator", "RiskManager", "VaRBacktester", "VaRDecomposition", "OptionPortfolioVaR"
+]
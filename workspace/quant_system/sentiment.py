@@ -10,6 +10,8 @@ from collections import Counter
 import logging
 import re
 
+from .backtest import BacktestResult
+
 logger = logging.getLogger(__name__)
 
 # 嘗試導入 NLP 庫
@@ -310,22 +312,41 @@ class SentimentStrategy:
         self,
         prices: pd.Series,
         news_data: List[Dict],
-        initial_capital: float = 100000
-    ) -> Dict:
-        """回測"""
+        initial_capital: float = 100000,
+        detail: bool = False,
+        dtype: type = np.float64
+    ) -> BacktestResult:
+        """
+        回測
+        
+        Args:
+            detail: 是否保留逐根明細 DataFrame（result["signals"]）
+            dtype: 收益數組精度
+        """
         signals = self.generate_signals(prices, news_data)
         
-        signals["returns"] = prices.pct_change()
-        signals["strategy_returns"] = signals["signal"].shift(1) * signals["returns"]
-        signals["cumulative"] = (1 + signals["strategy_returns"]).cumprod()
+        returns = prices.pct_change()
+        strategy_returns = signals["signal"].shift(1) * returns
         
-        total_return = signals["cumulative"].iloc[-1] - 1
+        if detail:
+            signals["returns"] = returns
+            signals["strategy_returns"] = strategy_returns
+            signals["cumulative"] = (1 + strategy_returns).cumprod()
         
-        return {
-            "total_return": total_return,
-            "sentiment": signals["sentiment"].iloc[-1],
-            "signals": signals
+        metrics = {
+            "total_return": np.prod(1 + strategy_returns.fillna(0).values) - 1,
+            "sentiment": signals["sentiment"].iloc[-1]
         }
+        
+        return BacktestResult(
+            prices.index,
+            signals["signal"].values,
+            strategy_returns.values,
+            metrics,
+            returns=returns.values,
+            frame=signals if detail else None,
+            dtype=dtype
+        )
 
 
 # 便捷函數
@@ -63,7 +63,7 @@ class SignalAggregator:
         # 延遲導入，避免循環依賴
         from .data_fetcher import DataFetcher
         from .time_series import TimeSeriesPredictor
-        from .mean_reversion import MeanReversionStrategy
+        from .mean_reversion import MeanReversionStrategy, PanelMeanReversion
         from .sentiment import SentimentAnalyzer
         from .portfolio import PortfolioOptimizer
         from .var_model import RiskManager
@@ -73,6 +73,7 @@ class SignalAggregator:
         self.data_fetcher = DataFetcher()
         self.time_series = TimeSeriesPredictor()
         self.mean_reversion = MeanReversionStrategy()
+        self.mean_reversion_panel = PanelMeanReversion()
         self.sentiment = SentimentAnalyzer()
         self.portfolio = PortfolioOptimizer()
         self.risk_manager = RiskManager()
@@ -140,20 +141,24 @@ class SignalAggregator:
         
         signals = {}
         
-        for symbol in self.symbols:
-            if symbol in self.returns.columns:
-                returns = self.returns[symbol].dropna()
-                
-                strategy = MeanReversionStrategy()
-                result = strategy.backtest(returns)
-                
-                # 最後一個信號
-                last_signal = result["signals"]["signal"].iloc[-1]
-                
-                signals[symbol] = {
-                    "signal": int(last_signal),
-                    "z_score": result["signals"]["z_score"].iloc[-1]
-                }
+        # 價格面板（時間 × 標的），一次計算所有標的
+        prices = pd.DataFrame({
+            symbol: self.price_data[symbol]["Close"]
+            for symbol in self.symbols
+            if symbol in self.price_data and len(self.price_data[symbol]) > 0
+        })
+        
+        if prices.empty:
+            self.signals["mean_reversion"] = signals
+            return signals
+        
+        latest = self.mean_reversion_panel.latest(prices)
+        
+        for symbol, row in latest.iterrows():
+            signals[symbol] = {
+                "signal": int(row["signal"]),
+                "z_score": row["z_score"]
+            }
         
         self.signals["mean_reversion"] = signals
         return signals
@@ -0,0 +1,237 @@
+"""
+壓力測試模組
+支持：可複用情境庫（歷史窗口、因子衝擊、逐資產衝擊向量、標準差衝擊）、
+      （情境 × 組合）損失矩陣一次矩陣乘法求值
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Sequence, Union
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ScenarioLibrary:
+    """
+    壓力情境庫
+
+    每個情境是一個逐資產的收益衝擊向量，所有情境堆疊為 (情境 × 資產) 矩陣；
+    情境中未涉及的資產衝擊為 0
+
+    Example:
+        >>> library = ScenarioLibrary(returns.columns)
+        >>> library.add_historical("GFC", returns, "2008-09-01", "2008-11-30")
+        >>> library.add_factor_shock("mkt -20%", {"mkt": -0.20}, exposures)
+    """
+
+    def __init__(self, assets: Sequence[str]):
+        """
+        Args:
+            assets: 資產列表（決定衝擊向量的列順序）
+        """
+        self.assets = list(assets)
+        self.names: List[str] = []
+        self.kinds: List[str] = []
+        self._rows: List[np.ndarray] = []
+        self._matrix = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _vector(self, shocks: Union[Dict[str, float], pd.Series, np.ndarray]) -> np.ndarray:
+        if isinstance(shocks, np.ndarray):
+            if shocks.shape != (len(self.assets),):
+                raise ValueError(f"Expected {len(self.assets)} shocks, got shape {shocks.shape}")
+            return shocks.astype(np.float64)
+
+        shocks = pd.Series(shocks, dtype=np.float64)
+        return shocks.reindex(self.assets).fillna(0.0).to_numpy()
+
+    def _append(self, names: List[str], kind: str, rows: np.ndarray) -> "ScenarioLibrary":
+        rows = np.nan_to_num(np.atleast_2d(rows))
+        self.names.extend(names)
+        self.kinds.extend([kind] * len(names))
+        self._rows.append(rows)
+        self._matrix = None
+        return self
+
+    def add_shock(
+        self,
+        name: str,
+        shocks: Union[Dict[str, float], pd.Series, np.ndarray]
+    ) -> "ScenarioLibrary":
+        """逐資產衝擊向量，如 {"AAPL": -0.15, "MSFT": -0.10}"""
+        return self._append([name], "asset", self._vector(shocks))
+
+    def add_factor_shock(
+        self,
+        name: str,
+        factor_shocks: Dict[str, float],
+        exposures: pd.DataFrame
+    ) -> "ScenarioLibrary":
+        """
+        因子衝擊：資產衝擊 = 因子暴露 × 因子衝擊
+
+        Args:
+            factor_shocks: {因子: 衝擊}，如 {"mkt": -0.20, "hml": 0.05}
+            exposures: 資產 × 因子 暴露矩陣（如 MultiFactorModel.factor_exposure 的結果）
+        """
+        factors = pd.Series(factor_shocks, dtype=np.float64)
+        exposures = exposures.reindex(index=self.assets, columns=factors.index).fillna(0.0)
+        return self._append([name], "factor", exposures.to_numpy() @ factors.to_numpy())
+
+    def add_sigma_shock(
+        self,
+        name: str,
+        returns: pd.DataFrame,
+        n_std: float
+    ) -> "ScenarioLibrary":
+        """標準差衝擊：各資產 mean + n_std × std"""
+        returns = returns.reindex(columns=self.assets)
+        return self._append([name], "sigma", (returns.mean() + n_std * returns.std()).to_numpy())
+
+    def add_historical(
+        self,
+        name: str,
+        returns: pd.DataFrame,
+        start: Optional[str] = None,
+        end: Optional[str] = None
+    ) -> "ScenarioLibrary":
+        """歷史窗口情境：各資產在 [start, end] 內的累計收益"""
+        window = returns.reindex(columns=self.assets).loc[start:end]
+        cumulative = np.expm1(np.log1p(window.fillna(0.0)).sum().to_numpy())
+        return self._append([name], "historical", cumulative)
+
+    def add_historical_windows(
+        self,
+        returns: pd.DataFrame,
+        window: int,
+        step: int = 1,
+        prefix: str = "hist"
+    ) -> "ScenarioLibrary":
+        """
+        批量添加滾動歷史窗口情境（對數收益累加一次，所有窗口向量化求值）
+
+        情境名為 "{prefix}:{窗口結束日期}"
+        """
+        log_returns = np.log1p(returns.reindex(columns=self.assets).fillna(0.0).to_numpy())
+        cumsum = np.vstack([np.zeros(len(self.assets)), np.cumsum(log_returns, axis=0)])
+
+        ends = np.arange(window, len(log_returns) + 1, step)
+        rows = np.expm1(cumsum[ends] - cumsum[ends - window])
+        labels = returns.index[ends - 1]
+        if isinstance(labels, pd.DatetimeIndex):
+            labels = labels.strftime("%Y-%m-%d")
+        names = [f"{prefix}:{label}" for label in labels]
+        return self._append(names, "historical", rows)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """情境 × 資產 衝擊矩陣"""
+        if self._matrix is None:
+            if self._rows:
+                self._matrix = np.vstack(self._rows)
+            else:
+                self._matrix = np.empty((0, len(self.assets)))
+        return self._matrix
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.matrix, index=self.names, columns=self.assets)
+
+
+class StressEngine:
+    """
+    壓力測試引擎
+
+    所有組合的持倉堆疊為 (組合 × 資產) 矩陣，
+    損失矩陣 = -(情境衝擊 @ 持倉.T)，一次矩陣乘法得到（情境 × 組合）結果
+    """
+
+    def __init__(self, library: ScenarioLibrary):
+        self.library = library
+
+    def _positions(self, positions: Union[pd.DataFrame, pd.Series, np.ndarray]) -> pd.DataFrame:
+        if isinstance(positions, pd.Series):
+            positions = positions.to_frame().T
+        elif isinstance(positions, np.ndarray):
+            positions = pd.DataFrame(np.atleast_2d(positions), columns=self.library.assets)
+
+        # 只在資產列不一致時對齊，情境外的資產衝擊為 0
+        if list(positions.columns) != self.library.assets:
+            unknown = set(positions.columns) - set(self.library.assets)
+            if unknown:
+                logger.warning(f"Positions in assets outside the scenario library: {sorted(unknown)}")
+            positions = positions.reindex(columns=self.library.assets).fillna(0.0)
+        return positions
+
+    def loss_matrix(
+        self,
+        positions: Union[pd.DataFrame, pd.Series, np.ndarray]
+    ) -> pd.DataFrame:
+        """
+        （情境 × 組合）損失矩陣
+
+        Args:
+            positions: 持倉市值，組合 × 資產（DataFrame 的 index 為組合名）；
+                       Series 或一維數組視為單個組合
+
+        Returns:
+            損失（正數為虧損）
+        """
+        positions = self._positions(positions)
+        losses = -(self.library.matrix @ positions.to_numpy(dtype=np.float64).T)
+        return pd.DataFrame(losses, index=self.library.names, columns=positions.index)
+
+    def run(
+        self,
+        positions: Union[pd.DataFrame, pd.Series, np.ndarray],
+        top_n: int = 5
+    ) -> Dict:
+        """
+        對所有組合跑全部情境
+
+        Returns:
+            {"losses": 損失矩陣, "summary": 每個組合的最大損失及對應情境, "worst": 每個組合最差的 top_n 個情境}
+        """
+        losses = self.loss_matrix(positions)
+        gross = self._positions(positions).abs().sum(axis=1).to_numpy()
+
+        values = losses.to_numpy()
+        worst_idx = np.argmax(values, axis=0)
+        max_loss = values[worst_idx, np.arange(values.shape[1])]
+
+        summary = pd.DataFrame({
+            "worst_scenario": np.asarray(self.library.names, dtype=object)[worst_idx],
+            "max_loss": max_loss,
+            "max_loss_pct": np.divide(max_loss, gross, out=np.full_like(max_loss, np.nan), where=gross > 0),
+            "mean_loss": values.mean(axis=0)
+        }, index=losses.columns)
+
+        worst = {
+            portfolio: losses[portfolio].nlargest(top_n)
+            for portfolio in losses.columns
+        }
+
+        return {"losses": losses, "summary": summary, "worst": worst}
+
+
+# 便捷函數
+def stress_portfolios(
+    returns: pd.DataFrame,
+    positions: Union[pd.DataFrame, pd.Series],
+    window: int = 20,
+    shocks: Optional[Dict[str, Dict[str, float]]] = None
+) -> Dict:
+    """
+    便捷函數：以滾動歷史窗口（及可選的自定義衝擊）壓力測試多個組合
+
+    Example:
+        >>> result = stress_portfolios(returns, books, window=10)
+        >>> result["summary"]
+    """
+    library = ScenarioLibrary(returns.columns).add_historical_windows(returns, window, step=window)
+    for name, shock in (shocks or {}).items():
+        library.add_shock(name, shock)
+
+    return StressEngine(library).run(positions)
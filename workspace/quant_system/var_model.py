@@ -1,16 +1,82 @@
 """
 VaR 風險管理模組
-支持：Historical VaR, Parametric VaR, Monte Carlo VaR, CVaR, Expected Shortfall
+支持：Historical VaR, Parametric VaR, Monte Carlo VaR, CVaR, Expected Shortfall,
+      滾動 VaR 回測（Kupiec / Christoffersen 檢驗）
 """
 
 import numpy as np
 import pandas as pd
-from typing import Dict, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
 from scipy import stats
+from scipy.special import xlogy
+from concurrent.futures import ProcessPoolExecutor
 import logging
+import os
+
+from .monte_carlo import MonteCarloEngine, TailTracker
+from .options import black_scholes_batch
+from .drawdown import drawdown_stats, max_drawdown
+from .distributions import DistributionFitter, GARCHPanel
+from .covariance import CovarianceEstimator
 
 logger = logging.getLogger(__name__)
 
+# 嘗試導入 Numba（滾動分位數核心），不可用時退化為純 Python 循環
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+
+def _tail_quantiles(
+    sorted_returns: np.ndarray,
+    n_valid: np.ndarray,
+    tail_probs: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    由已排序收益一次性得到多個尾部概率的分位數和尾部均值
+
+    Args:
+        sorted_returns: 沿 axis 0 升序排序的收益 (T, A)，NaN 排在末尾
+        n_valid: 每列有效觀測數 (A,)
+        tail_probs: 尾部概率 (C,)，如 0.05 對應 95% 置信度
+
+    Returns:
+        (quantiles, tail_means)，形狀均為 (C, A)；分位數與 np.percentile 線性插值一致
+    """
+    n_obs, n_assets = sorted_returns.shape
+    cumsum = np.cumsum(np.nan_to_num(sorted_returns), axis=0)
+    cols = np.arange(n_assets)
+
+    position = np.maximum(n_valid - 1, 0)[None, :] * tail_probs[:, None]
+    lo = np.floor(position).astype(np.int64)
+    hi = np.minimum(lo + 1, np.maximum(n_valid - 1, 0)[None, :])
+    frac = position - lo
+
+    x_lo = sorted_returns[lo, cols]
+    x_hi = sorted_returns[hi, cols]
+    quantiles = x_lo + frac * (x_hi - x_lo)
+
+    # 不超過分位數的觀測數（含所有取等的觀測，與 returns <= VaR 的定義一致）
+    empty = n_valid == 0
+    count = np.ones_like(lo)
+    for col in np.flatnonzero(~empty):
+        count[:, col] = np.searchsorted(
+            sorted_returns[:n_valid[col], col], quantiles[:, col], side="right"
+        )
+    tail_means = cumsum[count - 1, cols] / count
+
+    quantiles[:, empty] = np.nan
+    tail_means[:, empty] = np.nan
+
+    return quantiles, tail_means
+
 
 class VaRCalculator:
     """
@@ -20,66 +86,201 @@ class VaRCalculator:
     def __init__(
         self,
         confidence_level: float = 0.95,
-        time_horizon: int = 1
+        time_horizon: int = 1,
+        fitter: Optional[DistributionFitter] = None,
+        covariance_estimator: Optional[CovarianceEstimator] = None
     ):
         """
         Args:
             confidence_level: 置信度 (0.95 = 95%)
             time_horizon: 時間範圍（天）
+            fitter: 分佈擬合器（可在多個計算器間共享緩存）
+            covariance_estimator: 協方差估計器（Monte Carlo / VaR 分解共用，默認樣本協方差）
         """
         self.confidence_level = confidence_level
         self.time_horizon = time_horizon
+        self.fitter = fitter if fitter is not None else DistributionFitter()
+        self.covariance_estimator = covariance_estimator or CovarianceEstimator()
+        self.garch_panels: Dict[Tuple, GARCHPanel] = {}
+    
+    def var_es_table(
+        self,
+        returns: Union[pd.Series, pd.DataFrame, np.ndarray],
+        confidence_levels: Optional[Sequence[float]] = None,
+        time_horizons: Optional[Sequence[int]] = None,
+        portfolio_value: float = 1.0
+    ) -> Dict:
+        """
+        批量歷史 VaR / Expected Shortfall
+        
+        每列收益只排序一次，同時得到所有置信度和時間範圍的結果
+        
+        Args:
+            returns: 收益率（Series 或 時間 × 資產 矩陣）
+            confidence_levels: 置信度列表，默認為當前 confidence_level
+            time_horizons: 時間範圍列表（天），默認為當前 time_horizon
+        
+        Returns:
+            {"var": (置信度 × 時間範圍 × 資產), "es": 同形狀, "confidence_levels", "time_horizons", "assets"}
+        """
+        if isinstance(returns, pd.Series):
+            assets = [returns.name]
+        elif isinstance(returns, pd.DataFrame):
+            assets = list(returns.columns)
+        else:
+            assets = None
+        
+        values = np.asarray(returns, dtype=np.float64)
+        if values.ndim == 1:
+            values = values[:, None]
+        
+        confidence_levels = np.atleast_1d(
+            self.confidence_level if confidence_levels is None else confidence_levels
+        ).astype(np.float64)
+        time_horizons = np.atleast_1d(
+            self.time_horizon if time_horizons is None else time_horizons
+        ).astype(np.float64)
+        
+        sorted_returns = np.sort(values, axis=0)
+        n_valid = (~np.isnan(values)).sum(axis=0)
+        quantiles, tail_means = _tail_quantiles(
+            sorted_returns, n_valid, 1 - confidence_levels
+        )
+        
+        # 平方根法則縮放到各時間範圍
+        scale = np.sqrt(time_horizons)[None, :, None] * portfolio_value
+        
+        return {
+            "var": np.abs(quantiles)[:, None, :] * scale,
+            "es": -tail_means[:, None, :] * scale,
+            "confidence_levels": confidence_levels,
+            "time_horizons": time_horizons,
+            "assets": assets
+        }
     
     def historical_var(
         self,
         returns: pd.Series,
-        portfolio_value: float = 1.0
+        portfolio_value: float = 1.0,
+        filtered: bool = False
     ) -> float:
         """
         歷史 VaR
         
         基於歷史收益率分佈
+        
+        Args:
+            filtered: True 時使用 GARCH 過濾歷史模擬（見 filtered_var_table）
         """
-        # 調整時間範圍
-        if self.time_horizon > 1:
-            returns = returns * np.sqrt(self.time_horizon)
+        if filtered:
+            table = self.filtered_var_table(returns, portfolio_value=portfolio_value)
+        else:
+            table = self.var_es_table(returns, portfolio_value=portfolio_value)
+        return table["var"][0, 0, 0]
+    
+    def filtered_var_table(
+        self,
+        returns: Union[pd.Series, pd.DataFrame],
+        weights: Optional[np.ndarray] = None,
+        confidence_levels: Optional[Sequence[float]] = None,
+        time_horizons: Optional[Sequence[int]] = None,
+        portfolio_value: float = 1.0,
+        refit_every: Optional[int] = None
+    ) -> Dict:
+        """
+        過濾歷史模擬（FHS）VaR / ES
         
-        # 計算 VaR
-        var = np.percentile(returns, (1 - self.confidence_level) * 100)
+        每個資產擬合 GARCH(1,1)，標準化殘差按當前條件波動率重新縮放後
+        作為歷史情境；同一日期的殘差保持在一起，保留資產間的相關結構。
+        GARCH 參數按資產集合緩存，收益表只是追加了新行時增量更新
         
-        return abs(var) * portfolio_value
+        Args:
+            returns: 收益率（Series 或 時間 × 資產 矩陣）
+            weights: 組合權重，給定時返回組合的 VaR / ES
+            refit_every: 增量更新多少根後重新擬合（僅首次創建模型時生效）
+        
+        Returns:
+            同 var_es_table，另含 "volatility"（各資產當前條件波動率）
+        """
+        frame = returns.to_frame() if isinstance(returns, pd.Series) else returns
+        
+        key = tuple(frame.columns)
+        panel = self.garch_panels.get(key)
+        if panel is None:
+            panel = self.garch_panels[key] = GARCHPanel(refit_every=refit_every)
+        panel.sync(frame)
+        
+        scenarios = panel.scenarios()
+        if weights is not None:
+            scenarios = pd.Series(scenarios @ np.asarray(weights, dtype=np.float64), name="portfolio")
+        else:
+            scenarios = pd.DataFrame(scenarios, columns=frame.columns)
+        
+        table = self.var_es_table(
+            scenarios,
+            confidence_levels=confidence_levels,
+            time_horizons=time_horizons,
+            portfolio_value=portfolio_value
+        )
+        table["volatility"] = panel.current_volatility()
+        return table
     
     def parametric_var(
         self,
         returns: pd.Series,
         portfolio_value: float = 1.0,
-        method: str = "normal"
+        method: str = "normal",
+        window: Optional[int] = None,
+        key: Optional[str] = None
     ) -> float:
         """
         參數 VaR
         
         Args:
-            method: "normal", "t", "skew_normal"
+            method: "normal", "t", "skew_normal", "skew_t", "garch_t"
+            window: 只用最後 window 個觀測擬合
+            key: 數據流標識，滾動調用時以上一窗口的參數熱啟動
         """
-        mu = returns.mean()
-        sigma = returns.std()
-        
         if method == "normal":
-            z = stats.norm.ppf(1 - self.confidence_level)
-        elif method == "t":
-            # t 分佈
-            df, loc, scale = stats.t.fit(returns)
-            z = stats.t.ppf(1 - self.confidence_level, df, loc, scale)
+            values = returns if window is None else returns.iloc[-window:]
+            center = values.mean()
+            quantile = center + stats.norm.ppf(1 - self.confidence_level) * values.std()
         else:
-            z = stats.norm.ppf(1 - self.confidence_level)
+            params = self.fitter.fit(returns, method, window=window, key=key)
+            quantile = self.fitter.quantile(params, 1 - self.confidence_level, method)
+            center = self.fitter.center(params, method)
         
-        if self.time_horizon > 1:
-            mu = mu * self.time_horizon
-            sigma = sigma * np.sqrt(self.time_horizon)
-        
-        var = -(mu + z * sigma)
+        return self._scale_quantile(quantile, center) * portfolio_value
+    
+    def parametric_var_many(
+        self,
+        returns: pd.DataFrame,
+        portfolio_value: float = 1.0,
+        method: str = "t",
+        window: Optional[int] = None
+    ) -> pd.Series:
+        """
+        多資產參數 VaR（各列並行擬合，結果進入共享緩存）
+        """
+        if method == "normal":
+            return returns.apply(
+                lambda col: self.parametric_var(col, portfolio_value, "normal", window)
+            )
         
-        return var * portfolio_value
+        params = self.fitter.fit_many(returns, method, window=window)
+        prob = 1 - self.confidence_level
+        return pd.Series({
+            col: self._scale_quantile(
+                self.fitter.quantile(row, prob, method),
+                self.fitter.center(row, method)
+            ) * portfolio_value
+            for col, row in params.to_dict(orient="index").items()
+        })
+    
+    def _scale_quantile(self, quantile: float, center: float) -> float:
+        """單日分位數縮放到 time_horizon：漂移線性、偏離中心的部分按平方根"""
+        horizon = self.time_horizon
+        return -(center * horizon + (quantile - center) * np.sqrt(horizon))
     
     def monte_carlo_var(
         self,
@@ -114,19 +315,7 @@ class VaRCalculator:
         
         超過 VaR 的平均損失
         """
-        var_threshold = -self.historical_var(returns, 1.0)
-        
-        tail_losses = returns[returns <= var_threshold]
-        
-        if len(tail_losses) == 0:
-            return var_threshold * portfolio_value
-        
-        cvar = -tail_losses.mean()
-        
-        if self.time_horizon > 1:
-            cvar = cvar * np.sqrt(self.time_horizon)
-        
-        return cvar * portfolio_value
+        return self.var_es_table(returns, portfolio_value=portfolio_value)["es"][0, 0, 0]
     
     def portfolio_var(
         self,
@@ -141,12 +330,21 @@ class VaRCalculator:
         """
         # 組合收益率
         portfolio_returns = (returns * weights).sum(axis=1)
+        table = self.var_es_table(portfolio_returns, portfolio_value=portfolio_value)
+        
+        # Monte Carlo 模擬相關的資產收益，而非組合收益序列本身
+        engine = MonteCarloEngine(
+            confidence_level=self.confidence_level,
+            time_horizon=self.time_horizon,
+            covariance_estimator=self.covariance_estimator
+        ).fit(returns)
+        mc = engine.run(weights, n_scenarios=10000, portfolio_value=portfolio_value)
         
         return {
-            "historical_var": self.historical_var(portfolio_returns, portfolio_value),
+            "historical_var": table["var"][0, 0, 0],
             "parametric_var": self.parametric_var(portfolio_returns, portfolio_value),
-            "monte_carlo_var": self.monte_carlo_var(portfolio_returns, portfolio_value),
-            "cvar": self.cvar(portfolio_returns, portfolio_value)
+            "monte_carlo_var": mc["var"],
+            "cvar": table["es"][0, 0, 0]
         }
     
     def stress_test(
@@ -155,7 +353,7 @@ class VaRCalculator:
         scenarios: Dict[str, float]
     ) -> pd.DataFrame:
         """
-        壓力測試
+        壓力測試（單一收益序列的標準差衝擊；多資產、多組合情境庫見 stress.StressEngine）
         
         Args:
             scenarios: 情境字典 {"scenario_name": shock_percentage}
@@ -163,25 +361,821 @@ class VaRCalculator:
         Returns:
             壓力測試結果
         """
-        results = []
-        
         current_value = 1.0
         
-        for name, shock in scenarios.items():
-            stressed_return = returns.mean() + shock * returns.std()
-            stressed_value = current_value * (1 + stressed_return)
-            loss = current_value - stressed_value
+        # 均值、標準差只算一次，所有情境向量化
+        shocks = np.fromiter(scenarios.values(), dtype=np.float64, count=len(scenarios))
+        stressed_return = returns.mean() + shocks * returns.std()
+        stressed_value = current_value * (1 + stressed_return)
+        loss = current_value - stressed_value
+        
+        return pd.DataFrame({
+            "scenario": list(scenarios.keys()),
+            "shock_std": shocks,
+            "stressed_return": stressed_return,
+            "portfolio_value": stressed_value,
+            "loss": loss,
+            "loss_pct": loss / current_value
+        })
+
+
+@njit(cache=True)
+def _rolling_quantile_kernel(ranks, sorted_values, window, prob):
+    """
+    Fenwick 樹維護窗口內的秩計數，每步插入/刪除/查第 k 小均為 O(log n)
+
+    ranks: 每個觀測在全樣本中的秩 (0..n-1)
+    sorted_values: 全樣本升序值
+    """
+    n = len(ranks)
+    tree = np.zeros(n + 1, dtype=np.int64)
+    out = np.full(n, np.nan)
+
+    top = 1
+    while top * 2 <= n:
+        top *= 2
+
+    position = (window - 1) * prob
+    k_lo = int(np.floor(position))
+    frac = position - k_lo
+
+    for t in range(n):
+        i = ranks[t] + 1
+        while i <= n:
+            tree[i] += 1
+            i += i & (-i)
+
+        if t >= window:
+            i = ranks[t - window] + 1
+            while i <= n:
+                tree[i] -= 1
+                i += i & (-i)
+
+        if t >= window - 1:
+            values = np.empty(2)
+            for m in range(2):
+                # 第 k 小（從 1 開始）
+                k = k_lo + 1 + m
+                if k > window:
+                    k = window
+                pos = 0
+                step = top
+                while step > 0:
+                    nxt = pos + step
+                    if nxt <= n and tree[nxt] < k:
+                        pos = nxt
+                        k -= tree[nxt]
+                    step //= 2
+                values[m] = sorted_values[pos]
+            out[t] = values[0] + frac * (values[1] - values[0])
+
+    return out
+
+
+def rolling_quantile(values: np.ndarray, window: int, prob: float) -> np.ndarray:
+    """
+    滾動分位數（與 np.percentile 線性插值一致），總複雜度 O(n log n)
+
+    窗口未滿的位置為 NaN；輸入不應含 NaN
+    """
+    values = np.asarray(values, dtype=np.float64)
+    order = np.argsort(values, kind="stable")
+    ranks = np.empty(len(values), dtype=np.int64)
+    ranks[order] = np.arange(len(values))
+    return _rolling_quantile_kernel(ranks, values[order], window, prob)
+
+
+def kupiec_test(exceedances: np.ndarray, confidence_level: float) -> Dict:
+    """Kupiec 失敗比例 (POF) 檢驗：突破次數是否與置信度一致"""
+    n = len(exceedances)
+    x = int(np.sum(exceedances))
+    p = 1 - confidence_level
+    rate = x / n if n > 0 else 0.0
+
+    lr = -2 * (
+        xlogy(n - x, 1 - p) + xlogy(x, p)
+        - xlogy(n - x, 1 - rate) - xlogy(x, rate)
+    )
+
+    return {
+        "lr_pof": lr,
+        "p_value_pof": stats.chi2.sf(lr, 1)
+    }
+
+
+def christoffersen_test(exceedances: np.ndarray, confidence_level: float) -> Dict:
+    """Christoffersen 獨立性檢驗與條件覆蓋檢驗（POF + 獨立性）"""
+    hits = np.asarray(exceedances, dtype=np.int8)
+    prev, curr = hits[:-1], hits[1:]
+
+    n00 = int(np.sum((prev == 0) & (curr == 0)))
+    n01 = int(np.sum((prev == 0) & (curr == 1)))
+    n10 = int(np.sum((prev == 1) & (curr == 0)))
+    n11 = int(np.sum((prev == 1) & (curr == 1)))
+
+    pi0 = n01 / (n00 + n01) if n00 + n01 > 0 else 0.0
+    pi1 = n11 / (n10 + n11) if n10 + n11 > 0 else 0.0
+    pi = (n01 + n11) / max(n00 + n01 + n10 + n11, 1)
+
+    lr_ind = -2 * (
+        xlogy(n00 + n10, 1 - pi) + xlogy(n01 + n11, pi)
+        - xlogy(n00, 1 - pi0) - xlogy(n01, pi0)
+        - xlogy(n10, 1 - pi1) - xlogy(n11, pi1)
+    )
+    lr_cc = kupiec_test(hits, confidence_level)["lr_pof"] + lr_ind
+
+    return {
+        "lr_ind": lr_ind,
+        "p_value_ind": stats.chi2.sf(lr_ind, 1),
+        "lr_cc": lr_cc,
+        "p_value_cc": stats.chi2.sf(lr_cc, 2)
+    }
+
+
+def _backtest_asset(
+    returns: np.ndarray,
+    window: int,
+    confidence_level: float,
+    n_simulations: int,
+    seed: Optional[int]
+) -> Dict[str, np.ndarray]:
+    """
+    單一資產的滾動 VaR 序列（第 t 個值用截至 t 的窗口估計，預測 t+1）
+    """
+    tail = 1 - confidence_level
+    series = pd.Series(returns)
+    rolling = series.rolling(window=window)
+    mu = rolling.mean().values
+    sigma = rolling.std().values
+
+    # Monte Carlo：所有窗口共用同一組標準正態抽樣（共同隨機數），
+    # 等價於每個窗口按 N(mu_t, sigma_t) 模擬 n_simulations 次
+    draws = np.random.default_rng(seed).standard_normal(n_simulations)
+    mc_quantile = np.percentile(draws, tail * 100)
+
+    return {
+        "historical": -rolling_quantile(returns, window, tail),
+        "parametric": -(mu + stats.norm.ppf(tail) * sigma),
+        "monte_carlo": -(mu + mc_quantile * sigma)
+    }
+
+
+class VaRBacktester:
+    """
+    滾動 VaR 回測引擎
+
+    在移動窗口上生成歷史、參數、Monte Carlo VaR 序列，
+    統計突破次數並計算 Kupiec / Christoffersen 檢驗，多資產可並行
+    """
+
+    METHODS = ("historical", "parametric", "monte_carlo")
+
+    def __init__(
+        self,
+        confidence_level: float = 0.99,
+        window: int = 250,
+        n_simulations: int = 10000,
+        n_jobs: Optional[int] = 1,
+        seed: Optional[int] = None
+    ):
+        """
+        Args:
+            confidence_level: 置信度
+            window: 估計窗口（天）
+            n_simulations: Monte Carlo 模擬次數
+            n_jobs: 並行進程數，None 為 CPU 核數
+            seed: 隨機種子
+        """
+        self.confidence_level = confidence_level
+        self.window = window
+        self.n_simulations = n_simulations
+        self.n_jobs = n_jobs
+        self.seed = seed
+
+    def run(self, returns: Union[pd.Series, pd.DataFrame]) -> Dict:
+        """
+        回測一日 VaR
+
+        Args:
+            returns: 日收益率（Series 或 時間 × 資產）
+
+        Returns:
+            {"summary": 每個 資產 × 方法 一行的檢驗結果,
+             "forecasts": {資產: DataFrame(各方法 VaR 預測, 實際收益, 是否突破)}}
+        """
+        if isinstance(returns, pd.Series):
+            returns = returns.to_frame(name=returns.name or "portfolio")
+
+        columns = [returns[col].dropna() for col in returns.columns]
+        args = [
+            (col.values.astype(np.float64), self.window, self.confidence_level,
+             self.n_simulations, self.seed)
+            for col in columns
+        ]
+
+        n_jobs = self.n_jobs or os.cpu_count() or 1
+        if n_jobs == 1 or len(args) <= 1:
+            var_series = [_backtest_asset(*a) for a in args]
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                var_series = list(executor.map(_backtest_asset, *zip(*args)))
+
+        rows = []
+        forecasts = {}
+
+        for name, col, series in zip(returns.columns, columns, var_series):
+            # 第 t 天的 VaR 預測第 t+1 天的損失
+            frame = pd.DataFrame(
+                {method: series[method][:-1] for method in self.METHODS},
+                index=col.index[1:]
+            )
+            frame["realized"] = col.values[1:]
+            frame = frame.iloc[self.window - 1:]
+
+            for method in self.METHODS:
+                exceed = (-frame["realized"] > frame[method]).values
+                frame[f"{method}_exceed"] = exceed
+
+                rows.append({
+                    "asset": name,
+                    "method": method,
+                    "n_obs": len(exceed),
+                    "exceedances": int(exceed.sum()),
+                    "expected": len(exceed) * (1 - self.confidence_level),
+                    "exceedance_rate": exceed.mean() if len(exceed) else np.nan,
+                    **kupiec_test(exceed, self.confidence_level),
+                    **christoffersen_test(exceed, self.confidence_level)
+                })
+
+            forecasts[name] = frame
+
+        return {
+            "summary": pd.DataFrame(rows).set_index(["asset", "method"]),
+            "forecasts": forecasts
+        }
+
+
+class VaRDecomposition:
+    """
+    組合 VaR 分解：邊際 VaR、成分 VaR、增量 VaR
+    
+    一次性對所有持倉計算，無需逐個剔除資產重算組合 VaR
+    - parametric: 基於協方差矩陣的 delta-normal 解析式（歐拉分解，成分之和等於組合 VaR）
+    - historical: 基於情境矩陣；邊際 VaR 取 VaR 分位數附近情境的條件均值，
+                  增量 VaR 對「剔除各資產」的 N 條組合收益一次排序精確計算
+    
+    decompose 後緩存 Σw（或組合情境收益），what_if 對稀疏交易增量計算
+    """
+    
+    def __init__(
+        self,
+        confidence_level: float = 0.95,
+        time_horizon: int = 1,
+        method: str = "parametric",
+        neighbours: Optional[int] = None,
+        covariance_estimator: Optional[CovarianceEstimator] = None
+    ):
+        """
+        Args:
+            method: "parametric" 或 "historical"
+            neighbours: historical 模式下 VaR 分位數兩側各取多少個情境估計邊際 VaR，
+                        默認為情境數的 1%
+            covariance_estimator: parametric 模式的協方差估計器（默認樣本協方差）
+        """
+        if method not in ("parametric", "historical"):
+            raise ValueError(f"Unknown decomposition method: {method}")
+        
+        self.confidence_level = confidence_level
+        self.time_horizon = time_horizon
+        self.method = method
+        self.neighbours = neighbours
+        self.calculator = VaRCalculator(
+            confidence_level, time_horizon, covariance_estimator=covariance_estimator
+        )
+        self.weights = None
+    
+    def fit(self, returns: pd.DataFrame) -> "VaRDecomposition":
+        """估計均值、協方差並保存情境矩陣"""
+        self.columns = list(returns.columns)
+        self.scenarios = returns.dropna().to_numpy(dtype=np.float64)
+        self.mu = self.scenarios.mean(axis=0)
+        self.cov = np.atleast_2d(self.calculator.covariance_estimator.estimate(self.scenarios))
+        self.z = stats.norm.ppf(self.confidence_level)
+        return self
+    
+    def _parametric_var(self, mean: np.ndarray, variance: np.ndarray) -> np.ndarray:
+        horizon = self.time_horizon
+        return -mean * horizon + self.z * np.sqrt(horizon * np.maximum(variance, 0.0))
+    
+    def _historical_var(self, portfolio_returns: np.ndarray) -> np.ndarray:
+        return self.calculator.var_es_table(portfolio_returns)["var"][0, 0]
+    
+    def _as_weights(self, weights: Union[np.ndarray, Dict[str, float]]) -> np.ndarray:
+        if isinstance(weights, dict):
+            vector = np.zeros(len(self.columns))
+            for name, w in weights.items():
+                vector[self.columns.index(name)] = w
+            return vector
+        return np.asarray(weights, dtype=np.float64)
+    
+    def decompose(
+        self,
+        weights: Union[np.ndarray, Dict[str, float]],
+        portfolio_value: float = 1.0
+    ) -> Dict:
+        """
+        對所有持倉同時計算邊際、成分、增量 VaR
+        
+        Returns:
+            {"var": 組合 VaR, "positions": DataFrame（weight, marginal_var, component_var,
+             component_pct, incremental_var）}
+        """
+        w = self._as_weights(weights)
+        self.weights = w
+        
+        if self.method == "parametric":
+            self.cov_w = self.cov @ w
+            self.variance = w @ self.cov_w
+            sigma = np.sqrt(self.variance)
+            var = self._parametric_var(w @ self.mu, self.variance)[()]
+            
+            marginal = (
+                -self.mu * self.time_horizon
+                + self.z * np.sqrt(self.time_horizon) * self.cov_w / sigma
+            )
+            component = w * marginal
+            
+            # 剔除第 i 個資產：σ² - 2 w_i (Σw)_i + w_i² Σ_ii
+            variance_without = self.variance - 2 * w * self.cov_w + w ** 2 * np.diag(self.cov)
+            var_without = self._parametric_var(w @ self.mu - w * self.mu, variance_without)
+        else:
+            self.portfolio_returns = self.scenarios @ w
+            var = self._historical_var(self.portfolio_returns)[0]
+            
+            n_scenarios = len(self.portfolio_returns)
+            order = np.argsort(self.portfolio_returns)
+            k = self.neighbours or max(1, n_scenarios // 100)
+            center = int((1 - self.confidence_level) * (n_scenarios - 1))
+            window = order[max(center - k, 0):center + k + 1]
+            
+            marginal = -self.scenarios[window].mean(axis=0) * np.sqrt(self.time_horizon)
+            component = w * marginal
+            
+            # 條件均值估計的成分之和只近似等於 VaR，按比例校正使其可加
+            total = component.sum()
+            if total != 0:
+                marginal = marginal * var / total
+                component = component * var / total
             
-            results.append({
-                "scenario": name,
-                "shock_std": shock,
-                "stressed_return": stressed_return,
-                "portfolio_value": stressed_value,
-                "loss": loss,
-                "loss_pct": loss / current_value
-            })
+            without = self.portfolio_returns[:, None] - self.scenarios * w
+            var_without = self._historical_var(without)
         
-        return pd.DataFrame(results)
+        positions = pd.DataFrame({
+            "weight": w,
+            "marginal_var": marginal * portfolio_value,
+            "component_var": component * portfolio_value,
+            "component_pct": component / var if var != 0 else np.nan,
+            "incremental_var": (var - var_without) * portfolio_value
+        }, index=self.columns)
+        
+        return {"var": var * portfolio_value, "positions": positions}
+    
+    def what_if(
+        self,
+        trade: Union[np.ndarray, Dict[str, float]],
+        portfolio_value: float = 1.0
+    ) -> Dict:
+        """
+        交易前假設分析：在 decompose 的權重上疊加權重變化後的組合 VaR
+        
+        只觸及交易涉及的資產：parametric 為 O(k²)，historical 為 O(T·k)
+        
+        Args:
+            trade: 權重變化（數組或 {資產: 變化量}）
+        """
+        if self.weights is None:
+            raise ValueError("Call decompose before what_if")
+        
+        delta = self._as_weights(trade)
+        idx = np.flatnonzero(delta)
+        dw = delta[idx]
+        
+        if self.method == "parametric":
+            var_before = self._parametric_var(self.weights @ self.mu, self.variance)[()]
+            variance = (
+                self.variance
+                + 2 * dw @ self.cov_w[idx]
+                + dw @ self.cov[np.ix_(idx, idx)] @ dw
+            )
+            var_after = self._parametric_var((self.weights + delta) @ self.mu, variance)[()]
+        else:
+            var_before = self._historical_var(self.portfolio_returns)[0]
+            shifted = self.portfolio_returns + self.scenarios[:, idx] @ dw
+            var_after = self._historical_var(shifted)[0]
+        
+        return {
+            "var_before": var_before * portfolio_value,
+            "var_after": var_after * portfolio_value,
+            "delta_var": (var_after - var_before) * portfolio_value,
+            "weights": self.weights + delta
+        }
+
+
+class OptionPortfolioVaR:
+    """
+    期權組合情境 VaR
+    
+    模擬標的對數收益與隱含波動率對數變化的聯合情境（MonteCarloEngine），
+    再對所有持倉在所有情境下重新定價：
+    - full: 全重估，(持倉 × 情境) 數組上一次向量化 Black-Scholes
+    - delta_gamma: Delta-Gamma-Vega-Theta 近似，只需當前 Greeks，速度更快
+    
+    持倉表列：underlying, option_type（"call" / "put" / "stock"）, quantity,
+    以及期權所需的 strike, expiry（年）, sigma（隱含波動率）
+    """
+    
+    METHODS = ("full", "delta_gamma")
+    
+    def __init__(
+        self,
+        confidence_level: float = 0.99,
+        time_horizon: int = 1,
+        method: str = "full",
+        n_scenarios: int = 10000,
+        vol_of_vol: float = 0.0,
+        trading_days: int = 252,
+        seed: Optional[int] = None,
+        **engine_kwargs
+    ):
+        """
+        Args:
+            method: "full" 或 "delta_gamma"
+            n_scenarios: 情境數
+            vol_of_vol: 未提供隱含波動率歷史時，每日波動率對數變化的標準差（獨立於標的）
+            trading_days: 年化天數，用於到期時間的衰減
+            engine_kwargs: 傳給 MonteCarloEngine 的其他參數（innovations, sampling, chunk_size 等）
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown revaluation method: {method}")
+        
+        self.confidence_level = confidence_level
+        self.time_horizon = time_horizon
+        self.method = method
+        self.n_scenarios = n_scenarios
+        self.vol_of_vol = vol_of_vol
+        self.trading_days = trading_days
+        self.seed = seed
+        self.engine = MonteCarloEngine(
+            confidence_level=confidence_level,
+            time_horizon=time_horizon,
+            **engine_kwargs
+        )
+        self.underlyings = None
+    
+    def fit(
+        self,
+        returns: pd.DataFrame,
+        vol_changes: Optional[pd.DataFrame] = None
+    ) -> "OptionPortfolioVaR":
+        """
+        Args:
+            returns: 標的簡單收益率（列為標的）
+            vol_changes: 隱含波動率對數變化（列為標的，可只含部分標的）
+        """
+        self.underlyings = list(returns.columns)
+        factors = np.log1p(returns)
+        
+        if vol_changes is not None:
+            self.vol_underlyings = [c for c in vol_changes.columns if c in self.underlyings]
+            factors = pd.concat(
+                [factors, vol_changes[self.vol_underlyings].add_suffix(":vol")], axis=1
+            )
+        else:
+            self.vol_underlyings = []
+        
+        self.engine.fit(factors)
+        return self
+    
+    def _contracts(self, positions: pd.DataFrame, spots: Union[Dict, pd.Series]) -> Dict:
+        """
+        把持倉表整理成 (持倉, 1) 的合約參數數組
+        
+        校驗每個標的都有有限現價、option_type 為 call / put / stock、
+        期權行的 strike, expiry, sigma 有限（strike, sigma 為正），否則拋出 ValueError，
+        避免缺失參數的持倉以 NaN 損益被悄悄排除在 VaR 之外
+        """
+        spots = pd.Series(spots, dtype=np.float64)
+        missing = set(positions["underlying"]) - set(self.underlyings)
+        if missing:
+            raise ValueError(f"No return history for underlyings: {sorted(missing)}")
+        
+        spot = spots.reindex(positions["underlying"]).to_numpy()
+        if not np.isfinite(spot).all():
+            bad = sorted(set(positions["underlying"][~np.isfinite(spot)]))
+            raise ValueError(f"Missing or invalid spot prices for underlyings: {bad}")
+        
+        option_type = positions["option_type"].str.lower().to_numpy()
+        unknown = set(option_type) - {"call", "put", "stock"}
+        if unknown:
+            raise ValueError(f"Unknown option types: {sorted(map(str, unknown))}")
+        is_stock = option_type == "stock"
+        
+        quantity = positions["quantity"].to_numpy(dtype=np.float64)
+        if not np.isfinite(quantity).all():
+            raise ValueError("Quantities must be finite")
+        
+        def column(name: str) -> np.ndarray:
+            values = positions[name].to_numpy(dtype=np.float64) if name in positions else np.full(len(positions), np.nan)
+            option_rows = ~is_stock
+            invalid = ~np.isfinite(values)
+            if name != "expiry":
+                invalid |= ~(values > 0)
+            if (invalid & option_rows).any():
+                rows = positions.index[invalid & option_rows].tolist()
+                raise ValueError(f"Option positions need a valid {name} (rows {rows})")
+            # 股票行不用期權參數，填佔位值使向量化定價保持有限
+            return np.where(is_stock, 1.0, values)[:, None]
+        
+        vol_index = {u: i for i, u in enumerate(self.vol_underlyings)}
+        
+        return {
+            "underlying": positions["underlying"].map(self.underlyings.index).to_numpy(),
+            "vol_factor": positions["underlying"].map(lambda u: vol_index.get(u, -1)).to_numpy(),
+            "spot": spot[:, None],
+            "quantity": quantity,
+            "is_stock": is_stock[:, None],
+            "is_call": (option_type == "call")[:, None],
+            "strike": column("strike"),
+            "expiry": column("expiry"),
+            "sigma": column("sigma")
+        }
+    
+    def _value(self, c: Dict, S: np.ndarray, sigma: np.ndarray, T: np.ndarray, r: float) -> np.ndarray:
+        option = black_scholes_batch(S, c["strike"], T, r, sigma, c["is_call"])["price"]
+        return np.where(c["is_stock"], S, option)
+    
+    def _shocks(self, c: Dict, rng: np.random.Generator, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(持倉, 情境) 的標的對數收益與波動率對數變化"""
+        factors = self.engine.simulate_chunk(rng, n)
+        n_assets = len(self.underlyings)
+        
+        log_returns = factors[:, c["underlying"]].T
+        vol_shocks = np.zeros_like(log_returns)
+        
+        has_vol = c["vol_factor"] >= 0
+        if has_vol.any():
+            vol_shocks[has_vol] = factors[:, n_assets + c["vol_factor"][has_vol]].T
+        if self.vol_of_vol > 0 and (~has_vol).any():
+            # 無歷史的標的：每個標的一條獨立的波動率衝擊
+            codes, inverse = np.unique(c["underlying"][~has_vol], return_inverse=True)
+            draws = rng.standard_normal((len(codes), n)) * self.vol_of_vol * np.sqrt(self.time_horizon)
+            vol_shocks[~has_vol] = draws[inverse]
+        
+        return log_returns, vol_shocks
+    
+    def run(
+        self,
+        positions: pd.DataFrame,
+        spots: Union[Dict[str, float], pd.Series],
+        r: float = 0.0
+    ) -> Dict:
+        """
+        計算期權組合 VaR / ES
+        
+        Args:
+            positions: 持倉表
+            spots: 標的現價 {標的: 價格}
+            r: 無風險利率
+        
+        Returns:
+            {"var", "es", "value", "method", "n_scenarios"}
+        """
+        if self.underlyings is None:
+            raise ValueError("Must fit before run")
+        
+        c = self._contracts(positions.reset_index(drop=True), spots)
+        dt = self.time_horizon / self.trading_days
+        T_after = c["expiry"] - dt
+        
+        base = black_scholes_batch(c["spot"], c["strike"], c["expiry"], r, c["sigma"], c["is_call"], greeks=True)
+        base_value = np.where(c["is_stock"], c["spot"], base["price"])
+        
+        if self.method == "delta_gamma":
+            # 股票：delta = 1，其他 Greeks 為 0
+            delta = np.where(c["is_stock"], 1.0, base["delta"])
+            gamma = np.where(c["is_stock"], 0.0, base["gamma"])
+            vega = np.where(c["is_stock"], 0.0, base["vega"])
+            carry = np.where(c["is_stock"], 0.0, base["theta"] * dt)
+        
+        tracker = TailTracker(self.n_scenarios, self.confidence_level)
+        chunk_size = self.engine.chunk_size
+        n_chunks = -(-self.n_scenarios // chunk_size)
+        seeds = np.random.SeedSequence(self.seed).spawn(n_chunks)
+        
+        for i, seed_seq in enumerate(seeds):
+            n = min(chunk_size, self.n_scenarios - i * chunk_size)
+            rng = np.random.default_rng(seed_seq)
+            log_returns, vol_shocks = self._shocks(c, rng, n)
+            
+            S = c["spot"] * np.exp(log_returns)
+            sigma = c["sigma"] * np.exp(vol_shocks)
+            
+            if self.method == "full":
+                change = self._value(c, S, sigma, T_after, r) - base_value
+            else:
+                dS = S - c["spot"]
+                change = delta * dS + 0.5 * gamma * dS ** 2 + vega * (sigma - c["sigma"]) + carry
+            
+            pnl = c["quantity"] @ change
+            tracker.update(-pnl)
+        
+        result = tracker.result()
+        return {
+            "var": result["var"][0],
+            "es": result["es"][0],
+            "value": float(c["quantity"] @ base_value[:, 0]),
+            "method": self.method,
+            "n_scenarios": self.n_scenarios
+        }
+
+
+class RiskMonitor:
+    """
+    實時增量風險監控
+    
+    維護持倉市值 v、Σv 與組合方差 vᵀΣv、淨值高水位和回撤；
+    每次價格跳動或成交只修改一個資產，狀態以 O(N) 更新：
+        Σv += Σ[:, i] · Δv_i,  σ² += 2 Δv_i (Σv)_i + Δv_i² Σ_ii
+    VaR 為 delta-normal（貨幣單位）。限額由未觸發變為觸發時調用回調（邊沿觸發），
+    恢復後可再次觸發；每 resync_every 次更新完整重算一次方差以消除累積誤差
+    
+    Example:
+        >>> monitor = RiskMonitor(returns.cov(), quantities, prices, callbacks=[print])
+        >>> monitor.on_price("AAPL", 189.3)
+        >>> monitor.on_fill("MSFT", -100, 410.2)
+    """
+    
+    def __init__(
+        self,
+        cov: Union[pd.DataFrame, np.ndarray],
+        quantities: Union[Dict[str, float], np.ndarray],
+        prices: Union[Dict[str, float], np.ndarray],
+        cash: float = 0.0,
+        confidence_level: float = 0.95,
+        time_horizon: int = 1,
+        max_var_pct: float = 0.05,
+        max_position_pct: float = 0.2,
+        max_drawdown_pct: Optional[float] = None,
+        callbacks: Optional[List[Callable[[Dict], None]]] = None,
+        resync_every: int = 10000
+    ):
+        """
+        Args:
+            cov: 資產收益協方差（DataFrame 時以其列名作為資產名）
+            quantities: 持倉數量
+            prices: 當前價格
+            cash: 現金
+            max_drawdown_pct: 最大回撤限額（正數，如 0.1），None 為不檢查
+            callbacks: 觸發限額時調用，參數為告警字典
+            resync_every: 多少次增量更新後完整重算方差
+        """
+        if isinstance(cov, pd.DataFrame):
+            self.assets = list(cov.columns)
+        else:
+            self.assets = list(range(len(cov)))
+        self.asset_index = {asset: i for i, asset in enumerate(self.assets)}
+        self.cov = np.asarray(cov, dtype=np.float64)
+        
+        self.quantities = self._vector(quantities)
+        self.prices = self._vector(prices)
+        self.cash = cash
+        
+        self.z = stats.norm.ppf(confidence_level) * np.sqrt(time_horizon)
+        self.max_var_pct = max_var_pct
+        self.max_position_pct = max_position_pct
+        self.max_drawdown_pct = max_drawdown_pct
+        self.callbacks = list(callbacks or [])
+        self.resync_every = resync_every
+        
+        self.active = set()
+        self.alerts: List[Dict] = []
+        self.resync()
+        self.high_water_mark = self.nav
+    
+    def _vector(self, values: Union[Dict[str, float], np.ndarray]) -> np.ndarray:
+        if isinstance(values, dict):
+            vector = np.zeros(len(self.assets))
+            for asset, x in values.items():
+                vector[self.asset_index[asset]] = x
+            return vector
+        return np.asarray(values, dtype=np.float64).copy()
+    
+    def resync(self):
+        """完整重算市值、Σv 和方差（O(N²)）"""
+        self.values = self.quantities * self.prices
+        self.cov_values = self.cov @ self.values
+        self.variance = self.values @ self.cov_values
+        self.nav = self.values.sum() + self.cash
+        self.n_updates = 0
+    
+    def add_callback(self, callback: Callable[[Dict], None]):
+        self.callbacks.append(callback)
+    
+    def _shift(self, i: int, delta_value: float):
+        """資產 i 的市值變化 Δv，O(N) 更新方差狀態"""
+        self.variance += 2 * delta_value * self.cov_values[i] + delta_value ** 2 * self.cov[i, i]
+        self.cov_values += self.cov[:, i] * delta_value
+        self.values[i] += delta_value
+        
+        self.n_updates += 1
+        if self.n_updates >= self.resync_every:
+            self.resync()
+    
+    def on_price(self, asset, price: float) -> List[Dict]:
+        """價格更新，返回新觸發的告警"""
+        i = self.asset_index[asset]
+        delta_value = self.quantities[i] * (price - self.prices[i])
+        self.prices[i] = price
+        self.nav += delta_value
+        self._shift(i, delta_value)
+        return self.check()
+    
+    def on_fill(self, asset, quantity: float, price: float) -> List[Dict]:
+        """成交（quantity 為帶符號的成交量），返回新觸發的告警"""
+        i = self.asset_index[asset]
+        # 先按成交價重估原有持倉，再計入新成交
+        delta_value = self.quantities[i] * (price - self.prices[i]) + quantity * price
+        self.nav += self.quantities[i] * (price - self.prices[i])
+        self.cash -= quantity * price
+        self.quantities[i] += quantity
+        self.prices[i] = price
+        self._shift(i, delta_value)
+        return self.check()
+    
+    @property
+    def var(self) -> float:
+        return self.z * np.sqrt(max(self.variance, 0.0))
+    
+    @property
+    def var_pct(self) -> float:
+        return self.var / self.nav if self.nav > 0 else np.inf
+    
+    @property
+    def drawdown(self) -> float:
+        return self.nav / self.high_water_mark - 1 if self.high_water_mark > 0 else 0.0
+    
+    def state(self) -> Dict:
+        """當前風險狀態快照"""
+        return {
+            "nav": self.nav,
+            "var": self.var,
+            "var_pct": self.var_pct,
+            "volatility": np.sqrt(max(self.variance, 0.0)),
+            "drawdown": self.drawdown,
+            "high_water_mark": self.high_water_mark,
+            "max_weight": self.values.max() / self.nav if self.nav > 0 else np.nan,
+            "breaches": sorted(self.active, key=str)
+        }
+    
+    def check(self) -> List[Dict]:
+        """評估全部限額（O(N)），對新觸發的限額調用回調"""
+        self.high_water_mark = max(self.high_water_mark, self.nav)
+        breaches = {}
+        
+        var_pct = self.var_pct
+        if var_pct > self.max_var_pct:
+            breaches["var"] = (
+                var_pct,
+                f"VaR ({var_pct:.2%}) 超過閾值 ({self.max_var_pct:.2%})，建議降低風險"
+            )
+        
+        if self.nav > 0:
+            weights = self.values / self.nav
+            for i in np.flatnonzero(weights > self.max_position_pct):
+                breaches[("position", self.assets[i])] = (
+                    weights[i],
+                    f"倉位超限: {self.assets[i]}: {weights[i]:.2%} > {self.max_position_pct:.2%}"
+                )
+        
+        if self.max_drawdown_pct is not None and -self.drawdown > self.max_drawdown_pct:
+            breaches["drawdown"] = (
+                self.drawdown,
+                f"回撤 ({-self.drawdown:.2%}) 超過閾值 ({self.max_drawdown_pct:.2%})，考慮減倉或對沖"
+            )
+        
+        new_alerts = [
+            {"limit": limit, "value": value, "message": message}
+            for limit, (value, message) in breaches.items()
+            if limit not in self.active
+        ]
+        self.active = set(breaches)
+        
+        for alert in new_alerts:
+            self.alerts.append(alert)
+            for callback in self.callbacks:
+                callback(alert)
+        
+        return new_alerts
 
 
 class RiskManager:
@@ -194,17 +1188,23 @@ class RiskManager:
         self,
         var_confidence: float = 0.95,
         max_var_pct: float = 0.05,
-        max_position_pct: float = 0.2
+        max_position_pct: float = 0.2,
+        covariance_estimator: Optional[CovarianceEstimator] = None
     ):
         """
         Args:
             var_confidence: VaR 置信度
             max_var_pct: 最大 VaR 百分比
             max_position_pct: 單一資產最大權重
+            covariance_estimator: 協方差估計器（VaR 分解、實時監控共用）
         """
-        self.var_calculator = VaRCalculator(confidence_level=var_confidence)
+        self.var_calculator = VaRCalculator(
+            confidence_level=var_confidence,
+            covariance_estimator=covariance_estimator
+        )
         self.max_var_pct = max_var_pct
         self.max_position_pct = max_position_pct
+        self.decomposition = None
     
     def calculate_risk_metrics(
         self,
@@ -218,7 +1218,7 @@ class RiskManager:
         cvar = self.var_calculator.cvar(returns, portfolio_value)
         
         # 其他風險指標
-        max_drawdown = self._max_drawdown(returns)
+        drawdowns = drawdown_stats(returns, scalars_only=True)
         volatility = returns.std() * np.sqrt(252)
         
         return {
@@ -227,20 +1227,116 @@ class RiskManager:
             "var_99": var_99,
             "cvar": cvar,
             "volatility_annual": volatility,
-            "max_drawdown": max_drawdown,
+            "max_drawdown": drawdowns["max_drawdown"],
+            "max_drawdown_duration": drawdowns["max_duration"],
+            "time_under_water": drawdowns["time_under_water"],
             "risk_level": self._assess_risk_level(var_95 / portfolio_value)
         }
     
+    def _metrics_matrix(
+        self,
+        pnl: np.ndarray,
+        portfolio_value: Union[float, np.ndarray] = 1.0
+    ) -> Dict[str, np.ndarray]:
+        """
+        對 (時間 × 組合) 收益矩陣一次性計算 calculate_risk_metrics 的全部指標
+        
+        VaR 與 CVaR 共用一次排序，均值 / 標準差 / 回撤為按列的向量化計算；缺失值忽略
+        """
+        calculator = self.var_calculator
+        table = calculator.var_es_table(pnl, portfolio_value=portfolio_value)
+        var = table["var"][0, 0]
+        cvar = table["es"][0, 0]
+        
+        horizon = calculator.time_horizon
+        mu = np.nanmean(pnl, axis=0)
+        sigma = np.nanstd(pnl, axis=0, ddof=1)
+        z = stats.norm.ppf(1 - calculator.confidence_level)
+        parametric = -(mu * horizon + z * sigma * np.sqrt(horizon)) * portfolio_value
+        
+        drawdowns = drawdown_stats(pnl, scalars_only=True)
+        
+        var_pct = var / portfolio_value
+        risk_level = np.select(
+            [var_pct < 0.02, var_pct < 0.05, var_pct < 0.10],
+            ["low", "medium", "high"],
+            "extreme"
+        )
+        
+        return {
+            "var_95": var,
+            "var_95_pct": var_pct,
+            "var_99": parametric,
+            "cvar": cvar,
+            "volatility_annual": sigma * np.sqrt(252),
+            "max_drawdown": drawdowns["max_drawdown"],
+            "max_drawdown_duration": drawdowns["max_duration"],
+            "time_under_water": drawdowns["time_under_water"],
+            "risk_level": risk_level
+        }
+    
+    def batch_risk_report(
+        self,
+        returns: pd.DataFrame,
+        weights: Union[pd.DataFrame, np.ndarray],
+        portfolio_value: Union[float, Sequence[float]] = 1000000,
+        chunk_size: int = 2048
+    ) -> pd.DataFrame:
+        """
+        批量風險報告：多個組合 / 賬戶一次計算
+        
+        所有組合的收益序列由一次矩陣乘法得到（按 chunk_size 個組合分塊以限制內存），
+        各指標在整個收益矩陣上按列向量化計算
+        
+        Args:
+            returns: 資產收益率（時間 × 資產）
+            weights: 組合權重（組合 × 資產），DataFrame 時按列名對齊資產
+            portfolio_value: 組合市值（標量或每個組合一個值）
+            chunk_size: 每塊組合數
+        
+        Returns:
+            DataFrame（每個組合一行）：calculate_risk_metrics 的全部指標，
+            以及倉位檢查（max_weight, min_weight, n_violations, position_valid）和 var_breach
+        """
+        if isinstance(weights, pd.DataFrame):
+            index = weights.index
+            weights = weights.reindex(columns=returns.columns).fillna(0.0).to_numpy(dtype=np.float64)
+        else:
+            weights = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+            index = pd.RangeIndex(len(weights))
+        
+        values = returns.fillna(0.0).to_numpy(dtype=np.float64)
+        portfolio_value = np.broadcast_to(
+            np.asarray(portfolio_value, dtype=np.float64), (len(weights),)
+        )
+        
+        chunks = []
+        for start in range(0, len(weights), chunk_size):
+            block = weights[start:start + chunk_size]
+            metrics = self._metrics_matrix(
+                values @ block.T, portfolio_value[start:start + chunk_size]
+            )
+            metrics["max_weight"] = block.max(axis=1)
+            metrics["min_weight"] = block.min(axis=1)
+            metrics["n_violations"] = (block > self.max_position_pct).sum(axis=1)
+            chunks.append(pd.DataFrame(metrics))
+        
+        report = pd.concat(chunks, ignore_index=True)
+        report.index = index
+        report["position_valid"] = report["n_violations"] == 0
+        report["var_breach"] = report["var_95_pct"] > self.max_var_pct
+        return report
+    
     def check_position_limits(
         self,
         weights: np.ndarray
     ) -> Dict:
         """檢查倉位限制"""
-        violations = []
-        
-        for i, w in enumerate(weights):
-            if w > self.max_position_pct:
-                violations.append(f"Asset {i}: {w:.2%} > {self.max_position_pct:.2%}")
+        weights = np.asarray(weights, dtype=np.float64)
+        violations = [
+            f"Asset {i}: {weights[i]:.2%} > {self.max_position_pct:.2%}"
+            for i in np.flatnonzero(weights > self.max_position_pct)
+        ]
         
         return {
             "valid": len(violations) == 0,
@@ -249,12 +1345,79 @@ class RiskManager:
             "min_weight": weights.min()
         }
     
+    def set_portfolio(
+        self,
+        returns: pd.DataFrame,
+        weights: np.ndarray,
+        method: str = "parametric"
+    ) -> Dict:
+        """
+        登記當前組合並分解 VaR（之後 pre_trade_check 基於此組合增量計算）
+        
+        Returns:
+            VaRDecomposition.decompose 的結果（VaR 為組合價值的百分比）
+        """
+        self.decomposition = VaRDecomposition(
+            confidence_level=self.var_calculator.confidence_level,
+            time_horizon=self.var_calculator.time_horizon,
+            method=method,
+            covariance_estimator=self.var_calculator.covariance_estimator
+        ).fit(returns)
+        return self.decomposition.decompose(weights)
+    
+    def pre_trade_check(
+        self,
+        trade: Union[np.ndarray, Dict[str, float]]
+    ) -> Dict:
+        """
+        交易前檢查：交易後 VaR 是否超過 max_var_pct，倉位是否超限
+        
+        已超限的組合上，降低 VaR 的交易仍然放行
+        
+        Args:
+            trade: 權重變化（數組或 {資產: 變化量}）
+        """
+        if self.decomposition is None:
+            raise ValueError("Call set_portfolio before pre_trade_check")
+        
+        result = self.decomposition.what_if(trade)
+        position_check = self.check_position_limits(result["weights"])
+        within_var = result["var_after"] <= self.max_var_pct or result["delta_var"] < 0
+        
+        return {
+            "approved": within_var and position_check["valid"],
+            "var_pct_before": result["var_before"],
+            "var_pct_after": result["var_after"],
+            "delta_var_pct": result["delta_var"],
+            "position_limits": position_check
+        }
+    
+    def monitor(
+        self,
+        returns: pd.DataFrame,
+        quantities: Union[Dict[str, float], np.ndarray],
+        prices: Union[Dict[str, float], np.ndarray],
+        cash: float = 0.0,
+        max_drawdown_pct: Optional[float] = None,
+        callbacks: Optional[List[Callable[[Dict], None]]] = None
+    ) -> "RiskMonitor":
+        """用本管理器的限額創建實時風險監控器（協方差由 returns 估計）"""
+        return RiskMonitor(
+            cov=self.var_calculator.covariance_estimator.estimate(returns),
+            quantities=quantities,
+            prices=prices,
+            cash=cash,
+            confidence_level=self.var_calculator.confidence_level,
+            time_horizon=self.var_calculator.time_horizon,
+            max_var_pct=self.max_var_pct,
+            max_position_pct=self.max_position_pct,
+            max_drawdown_pct=max_drawdown_pct,
+            callbacks=callbacks
+        )
+    
     def _max_drawdown(self, returns: pd.Series) -> float:
         """計算最大回撤"""
-        cumulative = (1 + returns).cumprod()
-        rolling_max = cumulative.cummax()
-        drawdown = (cumulative - rolling_max) / rolling_max
-        return drawdown.min()
+        return max_drawdown(returns)
     
     def _assess_risk_level(self, var_pct: float) -> str:
         """評估風險等級"""
@@ -280,14 +1443,21 @@ class RiskManager:
             portfolio_returns = (returns * weights).sum(axis=1)
             risk_metrics = self.calculate_risk_metrics(portfolio_returns, portfolio_value)
             position_check = self.check_position_limits(weights)
+            
+            # 各持倉對組合 VaR 的貢獻
+            risk_metrics["risk_contributions"] = VaRDecomposition(
+                confidence_level=self.var_calculator.confidence_level,
+                time_horizon=self.var_calculator.time_horizon,
+                covariance_estimator=self.var_calculator.covariance_estimator
+            ).fit(returns).decompose(weights, portfolio_value)["positions"]
         else:
-            # 單一資產風險
-            risk_metrics = {}
+            # 單一資產風險：每列視為一個組合，整表一次計算
             position_check = {"valid": True}
-            
-            for col in returns.columns:
-                r = returns[col]
-                risk_metrics[col] = self.calculate_risk_metrics(r, 1.0)
+            metrics = pd.DataFrame(
+                self._metrics_matrix(returns.to_numpy(dtype=np.float64)),
+                index=returns.columns
+            )
+            risk_metrics = metrics.to_dict(orient="index")
         
         return {
             "risk_metrics": risk_metrics,
@@ -0,0 +1,41 @@
+import numpy as np
+from scipy import stats
+
+from quant_system.distributions import DistributionFitter
+
+
+def test_skew_t_nests_t_on_symmetric_data():
+    """對稱 t(5) 樣本：偏 t 的似然不低於 t，1% 分位數與 t 一致"""
+    for seed in range(6):
+        values = stats.t(5).rvs(5000, random_state=seed) * 0.01
+        fitter = DistributionFitter()
+        t_params = fitter.fit(values, "t")
+        skew_params = fitter.fit(values, "skew_t")
+
+        t_loglik = stats.t.logpdf(values, t_params["df"], t_params["loc"], t_params["scale"]).sum()
+        skew_loglik = stats.jf_skew_t.logpdf(
+            values, skew_params["a"], skew_params["b"], skew_params["loc"], skew_params["scale"]
+        ).sum()
+        assert skew_loglik >= t_loglik - 1e-6
+
+        t_quantile = fitter.quantile(t_params, 0.01, "t")
+        skew_quantile = fitter.quantile(skew_params, 0.01, "skew_t")
+        assert abs(skew_quantile / t_quantile - 1) < 0.1
+
+
+def test_skew_t_warm_start_skips_t_fit(monkeypatch):
+    """熱啟動不再冷擬合 t 分佈，且似然不低於上一窗口參數"""
+    values = stats.jf_skew_t(3, 4).rvs(3000, random_state=0) * 0.01
+    fitter = DistributionFitter()
+    previous = fitter.fit(values[:2000], "skew_t", key="asset")
+
+    def cold_t_fit(*args, **kwargs):
+        raise AssertionError("warm-started skew_t fit should not refit t from scratch")
+
+    monkeypatch.setattr(stats.t, "fit", cold_t_fit)
+    current = fitter.fit(values[1000:], "skew_t", key="asset")
+
+    window = values[1000:]
+    loglik = stats.jf_skew_t.logpdf(window, current["a"], current["b"], current["loc"], current["scale"]).sum()
+    start = stats.jf_skew_t.logpdf(window, previous["a"], previous["b"], previous["loc"], previous["scale"]).sum()
+    assert loglik >= start
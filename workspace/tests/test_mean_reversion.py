@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from quant_system.mean_reversion import (
+    MeanReversionStrategy,
+    PairsScreener,
+    PairsTradingStrategy,
+    PanelMeanReversion
+)
+
+
+def _mixed_calendar_prices(n_days: int = 400, seed: int = 0) -> pd.DataFrame:
+    """外連接面板：BTC-USD 每天交易，股票只在工作日交易"""
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2023-01-01", periods=n_days, freq="D")
+    weekday = index.dayofweek < 5
+
+    prices = {}
+    for symbol, calendar in [("BTC-USD", np.ones(n_days, dtype=bool)), ("AAPL", weekday), ("MSFT", weekday)]:
+        path = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, calendar.sum())))
+        prices[symbol] = pd.Series(path, index=index[calendar])
+    return pd.DataFrame(prices)
+
+
+def test_panel_matches_per_symbol_on_mixed_calendar():
+    prices = _mixed_calendar_prices()
+    panel = PanelMeanReversion(lookback_period=60)
+    latest = panel.latest(prices)
+    signals = panel.generate_signals(prices)
+
+    assert latest[["mean", "std", "z_score"]].notna().all().all()
+
+    for symbol in prices.columns:
+        series = prices[symbol].dropna()
+        expected = MeanReversionStrategy(lookback_period=60).generate_signals(series)
+        np.testing.assert_allclose(latest.loc[symbol, "z_score"], expected["z_score"].iloc[-1])
+        assert latest.loc[symbol, "signal"] == expected["signal"].iloc[-1]
+        np.testing.assert_array_equal(signals[symbol].loc[series.index].to_numpy(), expected["signal"].to_numpy())
+
+    stateless = panel.latest(prices, stateful=False)
+    np.testing.assert_allclose(stateless["z_score"], latest["z_score"])
+
+
+def test_screener_matches_pairs_strategy_on_levels():
+    rng = np.random.default_rng(3)
+    n_days = 500
+    base = 100 + np.cumsum(rng.normal(0, 1, n_days))
+    noise = np.zeros(n_days)
+    for t in range(1, n_days):
+        noise[t] = 0.8 * noise[t - 1] + rng.normal(0, 1)
+    prices = pd.DataFrame({
+        "X": base,
+        "Y": 10 + 2 * base + noise,
+        "Z": 100 + np.cumsum(rng.normal(0, 1, n_days))
+    }, index=pd.bdate_range("2022-01-03", periods=n_days))
+
+    table = PairsScreener(min_correlation=0.0, n_jobs=1).screen(prices)
+    top = table.iloc[0]
+    assert {top["asset1"], top["asset2"]} == {"X", "Y"}
+
+    price1, price2 = prices[top["asset1"]], prices[top["asset2"]]
+    expected = PairsTradingStrategy().find_cointegration(price1, price2)
+    assert top["p_value"] == pytest.approx(expected["p_value"])
+    assert top["coint_score"] == pytest.approx(expected["cointegration_score"])
+    assert top["hedge_ratio"] == pytest.approx(np.polyfit(price2, price1, 1)[0])
+
+    log_table = PairsScreener(min_correlation=0.0, n_jobs=1, log_prices=True).screen(prices)
+    assert "log_hedge_ratio" in log_table.columns and "hedge_ratio" not in log_table.columns
+
+
+def test_z_score_refits_after_in_place_append():
+    rng = np.random.default_rng(5)
+    index = pd.bdate_range("2023-01-02", periods=120)
+    prices = pd.Series(100 + np.cumsum(rng.normal(0, 1, 120)), index=index)
+    strategy = MeanReversionStrategy(lookback_period=20)
+    strategy.calculate_z_score(prices)
+
+    # 實時數據流：在同一個 Series 上追加新 bar、修正最後一根
+    prices.loc[index[-1] + pd.offsets.BDay()] = prices.iloc[-1] + 3
+    prices.iloc[-2] += 1
+    z_score = strategy.calculate_z_score(prices)
+
+    expected = MeanReversionStrategy(lookback_period=20).calculate_z_score(prices.copy())
+    pd.testing.assert_series_equal(z_score, expected)
+    assert np.isfinite(z_score.iloc[-1])
@@ -0,0 +1,40 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from quant_system.portfolio import RiskParity
+
+
+def _factor_returns(n_assets: int = 200, n_days: int = 1000, seed: int = 0) -> pd.DataFrame:
+    """20 因子結構的收益率：資產高度相關，坐標下降線性收斂極慢"""
+    rng = np.random.default_rng(seed)
+    loadings = rng.normal(0, 1, (n_assets, 20)) * np.r_[1, rng.uniform(0.1, 0.5, 19)] * 0.1
+    specific = np.sqrt(rng.uniform(0.01, 0.09, n_assets) / 252)
+    returns = rng.normal(0, 1, (n_days, 20)) @ loadings.T / np.sqrt(252)
+    return pd.DataFrame(returns + rng.normal(0, 1, (n_days, n_assets)) * specific)
+
+
+def test_risk_parity_equalizes_risk_contributions():
+    returns = _factor_returns()
+    rp = RiskParity(tol=1e-10)
+    weights = rp.fit(returns)
+
+    cov = np.cov(returns.T.to_numpy()) * 252
+    contributions = weights * (cov @ weights)
+    assert rp.solve_info["converged"]
+    assert np.max(np.abs(contributions / contributions.mean() - 1)) < 1e-10
+
+    # 熱啟動重新擬合
+    rp.fit(returns)
+    assert rp.solve_info["converged"]
+    assert rp.solve_info["iterations"] <= 2
+
+
+def test_risk_parity_flags_non_convergence(caplog):
+    rp = RiskParity(tol=0.0)
+    with caplog.at_level(logging.WARNING, logger="quant_system.portfolio"):
+        rp.fit(_factor_returns(n_assets=20))
+
+    assert not rp.solve_info["converged"]
+    assert "did not converge" in caplog.text
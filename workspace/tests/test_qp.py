@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import sparse
+from scipy.optimize import minimize
+
+from quant_system.portfolio import LargeScaleOptimizer
+from quant_system.qp import HAS_OSQP, QPSolver, factor_portfolio_qp
+
+
+N_ASSETS = 30
+
+
+def _problem(case: str) -> dict:
+    rng = np.random.default_rng(7)
+    loadings = rng.normal(0, 0.1, (N_ASSETS, 3))
+    kwargs = {
+        "mean": rng.normal(0.08, 0.05, N_ASSETS),
+        "loadings": loadings,
+        "factor_cov": np.diag([0.04, 0.02, 0.01]),
+        "specific_var": rng.uniform(0.01, 0.05, N_ASSETS),
+        "risk_aversion": 4.0,
+        "upper": 0.1
+    }
+    if case in ("group", "turnover"):
+        kwargs["groups"] = [(np.arange(10), 0.4, 0.6), (np.arange(10, 20), 0.0, 0.2)]
+    if case == "turnover":
+        kwargs["previous_weights"] = np.full(N_ASSETS, 1 / N_ASSETS)
+        kwargs["max_turnover"] = 0.3
+    return factor_portfolio_qp(**kwargs)
+
+
+def _slsqp(problem: dict) -> np.ndarray:
+    """同一 QP 以 SLSQP 求解作為參照"""
+    P, q = problem["P"].toarray(), problem["q"]
+    A, l, u = problem["A"].toarray(), problem["l"], problem["u"]
+    equality = u - l < 1e-12
+    constraints = [{"type": "eq", "fun": lambda x: A[equality] @ x - u[equality]}]
+    for rows, bound, sign in [(np.isfinite(u) & ~equality, u, -1), (np.isfinite(l) & ~equality, l, 1)]:
+        constraints.append({
+            "type": "ineq",
+            "fun": lambda x, rows=rows, bound=bound, sign=sign: sign * (A[rows] @ x - bound[rows])
+        })
+    result = minimize(
+        lambda x: 0.5 * x @ P @ x + q @ x,
+        np.zeros(len(q)),
+        jac=lambda x: P @ x + q,
+        constraints=constraints,
+        method="SLSQP",
+        options={"ftol": 1e-12, "maxiter": 500}
+    )
+    assert result.success
+    return result.x
+
+
+@pytest.mark.parametrize("case", ["box", "group", "turnover"])
+def test_admm_matches_reference_solvers(case):
+    problem = _problem(case)
+    args = (problem["P"], problem["q"], problem["A"], problem["l"], problem["u"])
+    result = QPSolver("admm").setup(*args).solve()
+
+    assert result["status"] == "solved"
+    Ax = problem["A"] @ result["x"]
+    assert np.all(Ax >= problem["l"] - 1e-6) and np.all(Ax <= problem["u"] + 1e-6)
+
+    reference = _slsqp(problem)
+    P, q = problem["P"], problem["q"]
+    assert result["objective"] == pytest.approx(0.5 * reference @ (P @ reference) + q @ reference, abs=1e-7)
+    np.testing.assert_allclose(result["x"][:N_ASSETS], reference[:N_ASSETS], atol=1e-4)
+
+    if HAS_OSQP:
+        osqp_result = QPSolver("osqp", eps_abs=1e-8, eps_rel=1e-8).setup(*args).solve()
+        np.testing.assert_allclose(result["x"][:N_ASSETS], osqp_result["x"][:N_ASSETS], atol=1e-4)
+
+
+def test_admm_detects_infeasibility():
+    # x₁ + x₂ >= 1 與 x₁ + x₂ <= 0 矛盾
+    A = sparse.csc_matrix(np.array([[1.0, 1.0], [1.0, 1.0]]))
+    result = QPSolver("admm").setup(
+        sparse.identity(2), np.zeros(2), A, np.array([1.0, -np.inf]), np.array([np.inf, 0.0])
+    ).solve()
+    assert result["status"] == "primal infeasible"
+    assert result["iterations"] < 1000
+
+    # min -x₁ s.t. x₁ >= 0：目標無下界
+    result = QPSolver("admm").setup(
+        sparse.csc_matrix((2, 2)), np.array([-1.0, 0.0]), sparse.identity(2),
+        np.array([0.0, -1.0]), np.array([np.inf, 1.0])
+    ).solve()
+    assert result["status"] == "dual infeasible"
+
+
+@pytest.mark.parametrize("backend", ["admm", "osqp"])
+def test_large_scale_optimizer_rejects_infeasible_constraints(backend):
+    if backend == "osqp" and not HAS_OSQP:
+        pytest.skip("osqp is not installed")
+
+    rng = np.random.default_rng(1)
+    returns = pd.DataFrame(rng.normal(0.0005, 0.01, (500, 60)), columns=[f"A{i}" for i in range(60)])
+    # 10 個資產從 1/6 提到 0.3 至少需要 0.267 的換手
+    constraints = {
+        "previous_weights": np.full(60, 1 / 60),
+        "max_turnover": 0.2,
+        "groups": {"first": (list(returns.columns[:10]), 0.3, 1.0)}
+    }
+
+    for method in LargeScaleOptimizer.METHODS:
+        optimizer = LargeScaleOptimizer(optimization_method=method, backend=backend, n_factors=5)
+        with pytest.raises(ValueError, match="infeasible"):
+            optimizer.fit(returns, constraints)
+
+    optimizer = LargeScaleOptimizer(optimization_method="min_volatility", backend=backend, n_factors=5)
+    weights = optimizer.fit(returns, {**constraints, "max_turnover": 0.3})
+    assert optimizer.solve_info["status"] == "solved"
+    assert np.abs(weights - 1 / 60).sum() <= 0.3 + 1e-6
+    assert weights[:10].sum() >= 0.3 - 1e-6
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from quant_system.var_model import OptionPortfolioVaR, VaRCalculator
+
+
+@pytest.fixture
+def fitted():
+    rng = np.random.default_rng(0)
+    returns = pd.DataFrame(rng.normal(0, 0.01, (500, 2)), columns=["A", "B"])
+    positions = pd.DataFrame({
+        "underlying": ["A", "A", "B"],
+        "option_type": ["call", "stock", "put"],
+        "quantity": [10, 5, -3],
+        "strike": [100, np.nan, 50],
+        "expiry": [0.5, np.nan, 0.25],
+        "sigma": [0.2, np.nan, 0.3]
+    })
+    return returns, positions
+
+
+def test_option_var_rejects_incomplete_positions(fitted):
+    returns, positions = fitted
+    model = OptionPortfolioVaR(seed=1, n_scenarios=1000).fit(returns)
+
+    with pytest.raises(ValueError, match="spot"):
+        model.run(positions, {"A": 100})
+    with pytest.raises(ValueError, match="sigma"):
+        model.run(positions.assign(sigma=[0.2, np.nan, np.nan]), {"A": 100, "B": 55})
+    with pytest.raises(ValueError, match="option types"):
+        model.run(positions.assign(option_type=["call", "stock", "straddle"]), {"A": 100, "B": 55})
+
+
+def test_delta_gamma_keeps_stock_positions(fitted):
+    returns, positions = fitted
+    spots = {"A": 100, "B": 55}
+    full = OptionPortfolioVaR(method="full", seed=1, n_scenarios=5000).fit(returns).run(positions, spots)
+    approx = OptionPortfolioVaR(method="delta_gamma", seed=1, n_scenarios=5000).fit(returns).run(positions, spots)
+
+    assert np.isfinite(full["value"])
+    assert approx["var"] == pytest.approx(full["var"], rel=0.05)
+
+
+def test_expected_shortfall_counts_all_ties():
+    rng = np.random.default_rng(0)
+    returns = pd.DataFrame({
+        "rounded": np.round(rng.normal(0, 1, 1000)),
+        "ticks": np.round(rng.normal(0, 1, 1000), 1)
+    })
+    returns.iloc[:50, 1] = np.nan
+    levels = [0.9, 0.95, 0.99]
+    table = VaRCalculator().var_es_table(returns, confidence_levels=levels)
+
+    for j, column in enumerate(returns.columns):
+        values = returns[column].dropna()
+        for i, level in enumerate(levels):
+            threshold = np.percentile(values, (1 - level) * 100)
+            assert table["var"][i, 0, j] == pytest.approx(-threshold)
+            assert table["es"][i, 0, j] == pytest.approx(-values[values <= threshold].mean())